@@ -4,7 +4,127 @@
 系统配置管理
 """
 
-from typing import Dict, Any
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Tuple
+
+
+@dataclass(slots=True, frozen=True)
+class AgentProfile:
+    """代理画像（只读），运行期不可变，字段通过属性直接访问。"""
+    name: str                                   # 代理名称
+    description: str = ""                      # 代理描述
+    style: str = ""                            # 表达风格
+    type: str = "specialist"                   # 代理类型：orchestrator / specialist
+    expertise_keywords: Tuple[str, ...] = ()    # 专业领域关键词
+    expertise_keywords_lower: Tuple[str, ...] = ()  # 小写关键词，供匹配使用
+    collaborators: Tuple[str, ...] = ()         # 协作代理ID
+    instructions: str = ""                     # 内部执行手册
+    
+    @classmethod
+    def from_dict(cls, agent_id: str, raw: Dict[str, Any]) -> "AgentProfile":
+        """由原始配置字典构建代理画像。
+        
+        Args:
+            agent_id: 代理ID，缺少名称时作为默认名称
+            raw: 原始配置字典
+            
+        Returns:
+            AgentProfile实例
+        """
+        keywords = tuple(raw.get("expertise_keywords", ()))
+        return cls(
+            name=raw.get("name", agent_id),
+            description=raw.get("description", ""),
+            style=raw.get("style", ""),
+            type=raw.get("type", "specialist"),
+            expertise_keywords=keywords,
+            expertise_keywords_lower=tuple(keyword.lower() for keyword in keywords if keyword),
+            collaborators=tuple(raw.get("collaborators", ())),
+            instructions=raw.get("instructions", ""),
+        )
+
+
+# 代理原始配置：描述项目大脑与专家大脑的 persona、风格、关键词、协作链路
+_AGENT_PROFILE_DEFINITIONS: Dict[str, Dict[str, Any]] = {
+    "project_brain": {
+        "name": "项目大脑",
+        "description": "AI 项目管理总监，负责拆解需求、统筹资源、跟踪进度、整合专家意见。",
+        "style": "战略、条理清晰、强调依赖关系与风险、注重整体协调。",
+        "type": "orchestrator",
+        "expertise_keywords": ["项目", "排期", "资源", "里程碑", "协调", "整合", "管理"],
+        "collaborators": ["product_lead", "algo_scientist", "solution_architect"],
+        "instructions": (
+            "1. 分析项目需求并确定核心目标\n"
+            "2. 识别关键风险点和依赖关系\n"
+            "3. 根据需求特点选择合适的专家团队\n"
+            "4. 协调各专家提供专业意见\n"
+            "5. 整合所有输入形成结构化的项目方案\n"
+            "6. 明确责任分工和时间节点\n"
+            "7. 持续跟踪项目进展并及时调整策略\n"
+            "\n"
+            "作为项目大脑，你存储整个项目的所有记忆，并负责整合专家知识为用户提供全面解答。"
+        )
+    },
+    "product_lead": {
+        "name": "产品负责人",
+        "description": "专注于用户需求分析、产品规划、功能设计和用户体验优化的产品专家。",
+        "style": "以用户为中心，强调价值与交付范围，注重实用性和可落地性。",
+        "type": "specialist",
+        "expertise_keywords": ["需求", "用户", "功能", "体验", "交互", "产品规划", "市场", "价值"],
+        "collaborators": [],
+        "instructions": (
+            "1. 深入分析用户需求，识别核心价值点\n"
+            "2. 定义产品功能边界和优先级排序\n"
+            "3. 设计用户友好的交互流程和体验\n"
+            "4. 制定产品路线图和迭代计划\n"
+            "5. 明确成功指标和验收标准\n"
+            "6. 识别潜在的用户痛点和解决方案\n"
+            "7. 提供产品差异化建议和竞争优势分析\n"
+            "\n"
+            "作为产品专家，你专注于存储和应用产品相关知识，包括需求分析、用户研究、功能规划等领域的专业内容。"
+        )
+    },
+    "algo_scientist": {
+        "name": "算法专家",
+        "description": "精通机器学习、深度学习等AI技术，专注于算法选型、模型设计和性能优化的技术专家。",
+        "style": "严谨、逻辑清晰、注重技术可行性和性能指标，能够将复杂问题简化。",
+        "type": "specialist",
+        "expertise_keywords": ["模型", "算法", "训练", "数据", "评估", "优化", "AI", "机器学习"],
+        "collaborators": [],
+        "instructions": (
+            "1. 分析问题的技术本质和算法需求\n"
+            "2. 提供多种算法方案的比较和选型建议\n"
+            "3. 明确所需数据类型、规模和质量要求\n"
+            "4. 评估模型复杂度和算力需求\n"
+            "5. 预测性能瓶颈和优化方向\n"
+            "6. 设计实验方案和评估指标\n"
+            "7. 分析技术风险并提出缓解策略\n"
+            "\n"
+            "作为算法专家，你专注于存储和应用算法相关知识，包括各类算法原理、模型架构、训练方法、评估指标等专业内容。"
+        )
+    },
+    "solution_architect": {
+        "name": "解决方案架构师",
+        "description": "负责系统整体架构设计、技术选型、集成方案和落地路径规划的架构专家。",
+        "style": "注重全链路设计，强调接口、部署与运维，平衡技术先进性和落地可行性。",
+        "type": "specialist",
+        "expertise_keywords": ["架构", "集成", "交付", "部署", "API", "系统", "组件", "扩展性"],
+        "collaborators": [],
+        "instructions": (
+            "1. 设计端到端的技术架构和系统组件\n"
+            "2. 明确技术栈选型和各组件职责边界\n"
+            "3. 制定接口规范和集成策略\n"
+            "4. 规划部署架构和资源需求\n"
+            "5. 设计数据流转和存储方案\n"
+            "6. 评估系统性能、安全和扩展性\n"
+            "7. 提供成本估算和风险管控措施\n"
+            "\n"
+            "作为解决方案架构师，你专注于存储和应用架构相关知识，包括系统设计、技术选型、集成方案、部署规划等专业内容。"
+        )
+    }
+}
+
 
 class Config:
     """系统配置类"""
@@ -27,6 +147,13 @@ class Config:
         }
     }
     
+    # 向量标量量化（Qdrant 原生 int8）：量化向量常驻内存用于粗排，原始向量在磁盘上重打分
+    VECTOR_QUANTIZATION = {
+        "enabled": True,
+        "quantile": 0.99,    # 截断异常值的分位数
+        "always_ram": True   # 量化向量常驻内存
+    }
+    
     EMBEDDER_CONFIG = {
         "provider": "huggingface",
         "config": {
@@ -35,6 +162,15 @@ class Config:
         }
     }
     
+    # 向量化微批处理：时间窗口内的并发 embed 请求合并为一次批量调用，并缓存近期向量
+    EMBEDDING_BATCH = {
+        "enabled": True,
+        "max_batch_size": 32,  # 单批最大文本数
+        "window_ms": 10,       # 合并等待窗口（毫秒）
+        "cache_size": 512,     # 向量缓存条目数，0 表示关闭
+        "cache_ttl": 600       # 向量缓存有效期（秒）
+    }
+    
     LLM_CONFIG = {
         "provider": "vllm",
         "config": {
@@ -48,7 +184,27 @@ class Config:
     
     # 对话配置
     CONVERSATION_CACHE_SIZE = 5  # 对话缓存大小
+    CONVERSATION_CACHE_MAX_USERS = 1024        # 最多缓存多少个用户的对话，超出按 LRU 淘汰
+    CONVERSATION_CACHE_MAX_MESSAGES = 20000    # 所有用户缓存的消息总数上限
     MEMORY_SEARCH_LIMIT = 5      # 记忆搜索限制
+    MEMORY_SEARCH_WORKERS = 8    # 组合协作上下文时并发检索的线程数
+    MEMORY_BACKEND_COOLDOWN = 5.0  # 记忆后端失败后的冷却时间（秒），期间跳过备选重试
+    # 空范围索引：记录检索为空的 (用户, 代理, 会话, 过滤条件) 范围，该用户写入前直接返回空结果
+    MEMORY_EMPTY_SCOPE_INDEX = {
+        "enabled": True,
+        "size": 1024,  # 记录的范围数
+        "ttl": 60      # 有效期（秒），兜底其他进程写入同一向量库的情况
+    }
+    # 记忆上下文缓存：相同参数的格式化上下文在有效期内直接复用，用户写入后自动失效
+    MEMORY_CONTEXT_CACHE = {
+        "size": 256,  # 缓存条目数，0 表示关闭
+        "ttl": 30     # 有效期（秒）
+    }
+    # 检索结果缓存：search / get_all 的原始结果按 (用户, 代理, 会话, 过滤条件, 查询摘要) 缓存，用户写入后自动失效
+    MEMORY_RETRIEVAL_CACHE = {
+        "size": 512,  # 缓存条目数，0 表示关闭
+        "ttl": 30     # 有效期（秒）
+    }
     DEFAULT_USER_ID = "default_user"
     
     # 代理与上下文编排
@@ -56,100 +212,73 @@ class Config:
     DEFAULT_AGENT_ID = "project_brain"
     PROJECT_BRAIN_ID = "project_brain"
     DEFAULT_SESSION_ID = "default_session"
-    AGENT_PROFILES = {
-        "project_brain": {
-            "name": "项目大脑",
-            "description": "AI 项目管理总监，负责拆解需求、统筹资源、跟踪进度、整合专家意见。",
-            "style": "战略、条理清晰、强调依赖关系与风险、注重整体协调。",
-            "type": "orchestrator",
-            "expertise_keywords": ["项目", "排期", "资源", "里程碑", "协调", "整合", "管理"],
-            "collaborators": ["product_lead", "algo_scientist", "solution_architect"],
-            "instructions": (
-                "1. 分析项目需求并确定核心目标\n"
-                "2. 识别关键风险点和依赖关系\n"
-                "3. 根据需求特点选择合适的专家团队\n"
-                "4. 协调各专家提供专业意见\n"
-                "5. 整合所有输入形成结构化的项目方案\n"
-                "6. 明确责任分工和时间节点\n"
-                "7. 持续跟踪项目进展并及时调整策略\n"
-                "\n"
-                "作为项目大脑，你存储整个项目的所有记忆，并负责整合专家知识为用户提供全面解答。"
-            )
-        },
-        "product_lead": {
-            "name": "产品负责人",
-            "description": "专注于用户需求分析、产品规划、功能设计和用户体验优化的产品专家。",
-            "style": "以用户为中心，强调价值与交付范围，注重实用性和可落地性。",
-            "type": "specialist",
-            "expertise_keywords": ["需求", "用户", "功能", "体验", "交互", "产品规划", "市场", "价值"],
-            "collaborators": [],
-            "instructions": (
-                "1. 深入分析用户需求，识别核心价值点\n"
-                "2. 定义产品功能边界和优先级排序\n"
-                "3. 设计用户友好的交互流程和体验\n"
-                "4. 制定产品路线图和迭代计划\n"
-                "5. 明确成功指标和验收标准\n"
-                "6. 识别潜在的用户痛点和解决方案\n"
-                "7. 提供产品差异化建议和竞争优势分析\n"
-                "\n"
-                "作为产品专家，你专注于存储和应用产品相关知识，包括需求分析、用户研究、功能规划等领域的专业内容。"
-            )
-        },
-        "algo_scientist": {
-            "name": "算法专家",
-            "description": "精通机器学习、深度学习等AI技术，专注于算法选型、模型设计和性能优化的技术专家。",
-            "style": "严谨、逻辑清晰、注重技术可行性和性能指标，能够将复杂问题简化。",
-            "type": "specialist",
-            "expertise_keywords": ["模型", "算法", "训练", "数据", "评估", "优化", "AI", "机器学习"],
-            "collaborators": [],
-            "instructions": (
-                "1. 分析问题的技术本质和算法需求\n"
-                "2. 提供多种算法方案的比较和选型建议\n"
-                "3. 明确所需数据类型、规模和质量要求\n"
-                "4. 评估模型复杂度和算力需求\n"
-                "5. 预测性能瓶颈和优化方向\n"
-                "6. 设计实验方案和评估指标\n"
-                "7. 分析技术风险并提出缓解策略\n"
-                "\n"
-                "作为算法专家，你专注于存储和应用算法相关知识，包括各类算法原理、模型架构、训练方法、评估指标等专业内容。"
-            )
-        },
-        "solution_architect": {
-            "name": "解决方案架构师",
-            "description": "负责系统整体架构设计、技术选型、集成方案和落地路径规划的架构专家。",
-            "style": "注重全链路设计，强调接口、部署与运维，平衡技术先进性和落地可行性。",
-            "type": "specialist",
-            "expertise_keywords": ["架构", "集成", "交付", "部署", "API", "系统", "组件", "扩展性"],
-            "collaborators": [],
-            "instructions": (
-                "1. 设计端到端的技术架构和系统组件\n"
-                "2. 明确技术栈选型和各组件职责边界\n"
-                "3. 制定接口规范和集成策略\n"
-                "4. 规划部署架构和资源需求\n"
-                "5. 设计数据流转和存储方案\n"
-                "6. 评估系统性能、安全和扩展性\n"
-                "7. 提供成本估算和风险管控措施\n"
-                "\n"
-                "作为解决方案架构师，你专注于存储和应用架构相关知识，包括系统设计、技术选型、集成方案、部署规划等专业内容。"
-            )
-        }
-    }
+    # 代理画像：只读映射，值为 AgentProfile，新增角色请修改 _AGENT_PROFILE_DEFINITIONS
+    AGENT_PROFILES: Mapping[str, AgentProfile] = MappingProxyType({
+        agent_id: AgentProfile.from_dict(agent_id, raw)
+        for agent_id, raw in _AGENT_PROFILE_DEFINITIONS.items()
+    })
     
     CONTEXT_PIPELINE = {
         "max_history_messages": 8,
+        "max_history_tokens": 2000,  # 历史消息的估算 token 预算，按 token 而非条数淘汰
         "max_collaborators": 5,
         "include_dialogue_summary": True,
-        "max_specialists": 3
+        "max_specialists": 3,
+        "retrieval_workers": 8,  # 上下文构建时并发记忆检索的线程数
+        "async_memory_writes": True,  # 长期记忆在后台线程写入，不阻塞回复
+        "memory_write_workers": 4,    # 后台记忆写入线程数
+        "history_compaction": False,  # 超出缓存的旧消息增量合并为滚动摘要（额外的 LLM 调用，默认关闭，旧消息直接丢弃）
+        "compaction_batch": 10        # 每攒满多少条旧消息压缩一次
     }
     
     MULTI_AGENT_PIPELINE = {
         "max_specialists": 3,
-        "fallback_specialists": ["product_lead", "solution_architect"]
+        "fallback_specialists": ["product_lead", "solution_architect"],
+        "batch_specialists": False,  # 合并为一次 LLM 调用产出全部专家意见（JSON），复用共享提示前缀
+        "summary_cache_size": 512,   # 项目摘要缓存条目数，0 表示关闭
+        "summary_cache_ttl": 300,    # 项目摘要缓存有效期（秒）
+        "single_shot_on_fallback": True  # 无专家命中时跳过摘要与备选专家，由项目大脑单次作答
+    }
+    
+    # LLM HTTP 连接池配置（所有代理调用共享同一个 keep-alive / HTTP/2 连接池）
+    LLM_HTTP_POOL = {
+        "http2": True,                   # 启用 HTTP/2 多路复用
+        "max_connections": 32,           # 最大连接数
+        "max_keepalive_connections": 16, # 最大保活连接数
+        "retries": 2,                    # 建连失败重试次数
+        "timeout": 60,                   # 请求超时（秒）
+        "max_inflight": 16,              # 同时进行中的LLM请求上限
+        "throttle_retries": 4,           # 遇到 429/503 或传输错误时的最大重试次数
+        "backoff_base": 0.5,             # 指数退避的基础等待时间（秒）
+        "backoff_max": 30                # 单次退避的最长等待时间（秒）
     }
     
     # 数据库配置
     HISTORY_DB_PATH = "mem0_test.db"
     
+    # Web 服务配置：默认单进程，设置环境变量 DEV 时改为单进程热重载。
+    # 警告：对话历史、记忆缓存等状态保存在进程内，多进程（workers > 1 或环境变量 WEB_WORKERS）
+    # 只能在前端负载均衡按用户做粘性路由时开启，否则同一用户的请求会落到不同进程、看到不同的历史
+    WEB_SERVER = {
+        "host": "0.0.0.0",
+        "port": 8000,
+        "workers": 1,
+        "loop": "uvloop",      # 需要 uvloop（uvicorn[standard] 已包含）
+        "http": "httptools",   # 需要 httptools（uvicorn[standard] 已包含）
+        "log_level": "warning",
+        "access_log": False
+    }
+    
+    WEB_MAX_BODY_BYTES = 256 * 1024  # 请求体大小上限（字节），超出返回 413
+    WEB_SERIALIZE_OFFLOAD_CHARS = 64 * 1024  # 响应文本总长度超过该值时在线程中序列化
+    
+    # Web 模板配置：编译后的模板字节码缓存到目录，进程重启后跳过编译
+    WEB_TEMPLATE_CACHE = {
+        "bytecode_cache": True,
+        "directory": ".jinja_cache",  # 相对于 web 目录
+        "auto_reload": False          # 是否检测模板文件变更；设置环境变量 DEV 时自动打开
+    }
+    
     @classmethod
     def get_memory_config(cls) -> Dict[str, Any]:
         """获取记忆系统完整配置"""
@@ -10,14 +10,335 @@
 4. 协调多代理工作流并生成最终响应
 """
 
-from typing import Dict, List, Optional, Any
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Generator, List, Mapping, Optional, Any, Pattern, Tuple
 
 # 导入配置模块
-from config.settings import Config
+from config.settings import AgentProfile, Config
 # 导入聊天引擎
 from core.chat_engine import ChatEngine
 # 导入数据模型
 from models.data_models import MultiAgentResult, SpecialistResult, ChatResponse
+# 导入缓存工具
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+def _run_to_completion(generator: Generator[Any, None, Any]) -> Any:
+    """耗尽生成器并返回其返回值（非流式调用复用流式流程时使用）。"""
+    try:
+        while True:
+            next(generator)
+    except StopIteration as stop:
+        return stop.value
+
+
+# 提示词缓存容量：同一条用户输入在一次流程中会被多个构建器复用
+PROMPT_CACHE_SIZE = 512
+
+
+def _get_persona(agent_id: str, default_name: Optional[str] = None) -> AgentProfile:
+    """获取代理画像，未配置的代理返回默认值。"""
+    persona = Config.AGENT_PROFILES.get(agent_id)
+    if persona is None:
+        persona = AgentProfile(name=default_name or agent_id, style="专业、清晰")
+    return persona
+
+
+# 提示模板：固定文字预先拼好，构建时只需一次 str.format 填充
+_PROJECT_BRAIN_TEMPLATE = (
+    "你是 {name}，{description}\n"
+    "作为项目大脑，你需要整合所有专家意见，协调各方面资源。\n"
+    "请输出：\n"
+    "1. 项目目标摘要\n"
+    "2. 关键风险/依赖\n"
+    "3. 需要协调的专家领域\n"
+    "请使用分点形式，语言简练。\n\n"
+    "[内部执行手册]\n{instructions}\n\n"
+    "[用户输入]\n{user_message}"
+)
+
+_SINGLE_SHOT_TEMPLATE = (
+    "你是 {name}，{description}\n"
+    "作为项目大脑，请直接对用户给出结构化的项目方案。\n"
+    "请输出：\n"
+    "1. 项目目标摘要\n"
+    "2. 总体策略/路线\n"
+    "3. 按角色分配的行动项与里程碑\n"
+    "4. 风险与待澄清问题\n"
+    "请使用分点形式，必要时引用记忆来源。\n\n"
+    "[内部执行手册]\n{instructions}\n\n"
+    "[用户输入]\n{user_message}"
+)
+
+_DEFAULT_EXPERT_TEMPLATE = (
+    "你是 {name}，负责给出专业建议。\n"
+    "请结合项目大脑提供的摘要与用户需求，输出你的专业分析和建议。\n"
+    "表达风格：{style}\n\n"
+    "[专家工作守则]\n{instructions}\n\n"
+    "[项目大脑摘要]\n{project_summary}\n\n"
+    "[用户输入]\n{user_message}"
+)
+
+_PRODUCT_EXPERT_TEMPLATE = (
+    "你是 {name}，一位资深产品专家。\n"
+    "请基于用户需求和项目摘要，从产品角度进行深入分析并提供专业建议。\n"
+    "请重点关注：\n"
+    "1. 用户需求的核心价值点和潜在痛点\n"
+    "2. 功能范围界定和优先级排序\n"
+    "3. 用户体验设计和交互流程建议\n"
+    "4. 产品路线图和迭代计划\n"
+    "5. 成功指标和验收标准\n"
+    "表达风格：{style}\n\n"
+    "[产品专家工作指南]\n{instructions}\n\n"
+    "[项目概述]\n{project_summary}\n\n"
+    "[用户需求]\n{user_message}\n\n"
+    "请提供详细、可操作的产品建议，帮助团队明确产品方向和具体实现路径。"
+)
+
+_ALGO_EXPERT_TEMPLATE = (
+    "你是 {name}，一位资深算法专家。\n"
+    "请基于用户需求和项目摘要，从算法和技术角度进行深入分析并提供专业建议。\n"
+    "请重点关注：\n"
+    "1. 问题的算法本质和技术路径\n"
+    "2. 多种算法方案的比较和选型建议\n"
+    "3. 数据需求分析和质量要求\n"
+    "4. 模型复杂度和算力评估\n"
+    "5. 性能瓶颈预测和优化方向\n"
+    "6. 实验设计和评估指标\n"
+    "表达风格：{style}\n\n"
+    "[算法专家工作指南]\n{instructions}\n\n"
+    "[项目概述]\n{project_summary}\n\n"
+    "[用户需求]\n{user_message}\n\n"
+    "请提供严谨、科学的算法解决方案，包括技术选型依据和实施建议。"
+)
+
+_ARCHITECTURE_EXPERT_TEMPLATE = (
+    "你是 {name}，一位资深解决方案架构师。\n"
+    "请基于用户需求和项目摘要，从系统架构和技术实现角度进行深入分析并提供专业建议。\n"
+    "请重点关注：\n"
+    "1. 端到端系统架构设计\n"
+    "2. 技术栈选型和组件划分\n"
+    "3. 接口规范和集成策略\n"
+    "4. 部署架构和资源规划\n"
+    "5. 数据流转和存储方案\n"
+    "6. 性能、安全和扩展性评估\n"
+    "表达风格：{style}\n\n"
+    "[架构师工作指南]\n{instructions}\n\n"
+    "[项目概述]\n{project_summary}\n\n"
+    "[用户需求]\n{user_message}\n\n"
+    "请提供全面、可落地的架构方案，确保系统的可行性、可扩展性和可维护性。"
+)
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _build_project_brain_prompt(project_brain_id: str, user_message: str) -> str:
+    """构建项目大脑的提示信息。
+    
+    Args:
+        project_brain_id: 项目大脑的代理ID
+        user_message: 用户输入的消息内容
+        
+    Returns:
+        构建好的项目大脑提示信息
+    """
+    persona = _get_persona(project_brain_id, "项目大脑")
+    
+    # 构建项目大脑提示
+    return _PROJECT_BRAIN_TEMPLATE.format(
+        name=persona.name,
+        description=persona.description,
+        instructions=persona.instructions,
+        user_message=user_message
+    )
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _build_specialist_prompt(agent_id: str, user_message: str, project_summary: str) -> str:
+    """为特定专家构建专业prompt
+    
+    Args:
+        agent_id: 专家代理ID
+        user_message: 用户输入的消息内容
+        project_summary: 项目摘要
+        
+    Returns:
+        构建好的专家提示信息
+    """
+    persona = _get_persona(agent_id)
+    # 根据不同专家类型使用特定的prompt模板
+    builder = _EXPERT_PROMPT_BUILDERS.get(agent_id, _build_default_expert_prompt)
+    return builder(persona, project_summary, user_message)
+
+
+def _build_default_expert_prompt(persona: AgentProfile, project_summary: str, user_message: str) -> str:
+    """默认专家prompt模板"""
+    return _DEFAULT_EXPERT_TEMPLATE.format(
+        name=persona.name,
+        style=persona.style,
+        instructions=persona.instructions,
+        project_summary=project_summary,
+        user_message=user_message
+    )
+
+
+def _build_product_expert_prompt(persona: AgentProfile, project_summary: str, user_message: str) -> str:
+    """产品专家专属prompt模板
+    
+    Args:
+        persona: 专家常量（名称、指令、表达风格）
+        project_summary: 项目摘要
+        user_message: 用户输入的消息内容
+        
+    Returns:
+        构建好的产品专家提示信息
+    """
+    return _PRODUCT_EXPERT_TEMPLATE.format(
+        name=persona.name,
+        style=persona.style,
+        instructions=persona.instructions,
+        project_summary=project_summary,
+        user_message=user_message
+    )
+
+
+def _build_algo_expert_prompt(persona: AgentProfile, project_summary: str, user_message: str) -> str:
+    """算法专家专属prompt模板
+    
+    Args:
+        persona: 专家常量（名称、指令、表达风格）
+        project_summary: 项目摘要
+        user_message: 用户输入的消息内容
+        
+    Returns:
+        构建好的算法专家提示信息
+    """
+    return _ALGO_EXPERT_TEMPLATE.format(
+        name=persona.name,
+        style=persona.style,
+        instructions=persona.instructions,
+        project_summary=project_summary,
+        user_message=user_message
+    )
+
+
+def _build_architecture_expert_prompt(persona: AgentProfile, project_summary: str, user_message: str) -> str:
+    """架构师专属prompt模板
+    
+    Args:
+        persona: 专家常量（名称、指令、表达风格）
+        project_summary: 项目摘要
+        user_message: 用户输入的消息内容
+        
+    Returns:
+        构建好的架构师提示信息
+    """
+    return _ARCHITECTURE_EXPERT_TEMPLATE.format(
+        name=persona.name,
+        style=persona.style,
+        instructions=persona.instructions,
+        project_summary=project_summary,
+        user_message=user_message
+    )
+
+
+# 专家ID到专属prompt模板的映射，未列出的专家使用默认模板
+_EXPERT_PROMPT_BUILDERS = {
+    "product_lead": _build_product_expert_prompt,
+    "algo_scientist": _build_algo_expert_prompt,
+    "solution_architect": _build_architecture_expert_prompt,
+}
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _build_batched_specialist_prompt(
+    specialist_ids: Tuple[str, ...],
+    user_message: str,
+    project_summary: str
+) -> str:
+    """把多个专家的任务合并为一个提示，要求模型以 JSON 返回各自的意见。
+    
+    Args:
+        specialist_ids: 专家代理ID元组
+        user_message: 用户输入的消息内容
+        project_summary: 项目摘要
+        
+    Returns:
+        构建好的批量专家提示信息
+    """
+    expert_sections = "\n\n".join(
+        f"### {agent_id}（{persona.name}）\n"
+        f"表达风格：{persona.style}\n"
+        f"[专家工作守则]\n{persona.instructions}"
+        for agent_id, persona in ((agent_id, _get_persona(agent_id)) for agent_id in specialist_ids)
+    )
+    keys = ", ".join(f'"{agent_id}": "..."' for agent_id in specialist_ids)
+    return (
+        "请分别以下列每位专家的身份，结合项目大脑摘要与用户需求，给出各自的专业分析和建议。\n"
+        f"只输出一个 JSON 对象，格式为 {{{keys}}}，值为对应专家的完整回复文本，不要输出其他内容。\n\n"
+        f"[专家列表]\n{expert_sections}\n\n"
+        f"[项目大脑摘要]\n{project_summary}\n\n"
+        f"[用户输入]\n{user_message}"
+    )
+
+
+def _parse_batched_specialist_output(content: str, specialist_ids: List[str]) -> Optional[Dict[str, str]]:
+    """解析批量专家调用返回的 JSON，缺少任一专家或格式不合法时返回 None。"""
+    start, end = content.find("{"), content.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        parsed = json.loads(content[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    sections = {}
+    for agent_id in specialist_ids:
+        value = parsed.get(agent_id)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        sections[agent_id] = value
+    return sections
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _build_single_shot_prompt(project_brain_id: str, user_message: str) -> str:
+    """构建无需专家时的单次项目大脑提示，合并摘要与最终整合两个阶段。
+    
+    Args:
+        project_brain_id: 项目大脑的代理ID
+        user_message: 用户输入的消息内容
+        
+    Returns:
+        构建好的单次项目大脑提示信息
+    """
+    persona = _get_persona(project_brain_id, "项目大脑")
+    return _SINGLE_SHOT_TEMPLATE.format(
+        name=persona.name,
+        description=persona.description,
+        instructions=persona.instructions,
+        user_message=user_message
+    )
+
+
+@lru_cache(maxsize=None)
+def _build_final_prompt_header(project_brain_id: str) -> str:
+    """最终整合提示中与用户输入无关的固定头部，按项目大脑ID缓存。"""
+    persona = _get_persona(project_brain_id, "项目大脑")
+    return (
+        f"你是 {persona.name}，需要整合所有专家意见，对用户给出结构化的项目方案。\n"
+        "请输出：\n"
+        "1. 总体策略/路线\n"
+        "2. 按角色分配的行动项与里程碑\n"
+        "3. 风险与待澄清问题\n"
+        "必须引用具体专家结论或记忆来源。\n\n"
+    )
 
 
 class AgentSelector:
@@ -26,7 +347,7 @@ class AgentSelector:
     该类负责根据用户输入的关键词匹配，从专家列表中选择最合适的专家代理。
     """
     
-    def __init__(self, agent_profiles: Dict[str, Dict]):
+    def __init__(self, agent_profiles: Mapping[str, AgentProfile]):
         """初始化专家选择器。
         
         Args:
@@ -40,6 +361,65 @@ class AgentSelector:
         self.max_specialists = pipeline_conf.get("max_specialists", 3)
         # 设置备选专家列表，当没有匹配到专家时使用
         self.fallback_specialists = pipeline_conf.get("fallback_specialists", [])
+        # 配置在运行期不变：所有专家关键词编译为一个正则，单次线性扫描即可为全部专家计分
+        self._specialist_ids, self._keyword_pattern, self._keyword_owners = (
+            self._compile_keyword_index(agent_profiles)
+        )
+    
+    @staticmethod
+    def _compile_keyword_index(
+        agent_profiles: Mapping[str, AgentProfile]
+    ) -> Tuple[Tuple[str, ...], Optional[Pattern[str]], Dict[str, Tuple[str, ...]]]:
+        """预构建全部专家共享的关键词索引。
+        
+        Args:
+            agent_profiles: 所有代理的配置文件
+            
+        Returns:
+            (按配置顺序的专家ID, 全部关键词的联合正则, 关键词到所属专家的映射)；
+            没有任何关键词时正则为 None
+        """
+        specialist_ids: List[str] = []
+        owners: Dict[str, List[str]] = {}
+        for agent_id, profile in agent_profiles.items():
+            # 只处理类型为specialist的代理
+            if profile.type != "specialist":
+                continue
+            specialist_ids.append(agent_id)
+            # 关键词（已小写）去重，同一关键词可能属于多个专家
+            for keyword in dict.fromkeys(profile.expertise_keywords_lower):
+                owners.setdefault(keyword, []).append(agent_id)
+        # 长关键词优先，保证较长的词不会被其前缀抢先匹配
+        keywords = sorted(owners, key=len, reverse=True)
+        pattern = re.compile("|".join(map(re.escape, keywords))) if keywords else None
+        return (
+            tuple(specialist_ids),
+            pattern,
+            {keyword: tuple(agent_ids) for keyword, agent_ids in owners.items()}
+        )
+    
+    def match_specialists(self, message: str) -> List[str]:
+        """返回关键词命中的专家，不含备选专家。
+        
+        Args:
+            message: 用户输入的消息内容
+            
+        Returns:
+            命中的专家代理ID列表，按匹配度降序排列；没有命中时为空列表
+        """
+        # 专家ID到匹配分数，初始顺序即配置顺序（同分时保持该顺序）
+        scores: Dict[str, int] = dict.fromkeys(self._specialist_ids, 0)
+        
+        if self._keyword_pattern is not None:
+            # 单次扫描小写后的消息，把每个命中的关键词计入其所属专家
+            owners = self._keyword_owners
+            for keyword in self._keyword_pattern.findall(message.lower()):
+                for agent_id in owners[keyword]:
+                    scores[agent_id] += 1
+        
+        # 按分数降序排序，选择分数大于0的专家，并限制最大数量
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [agent_id for agent_id, score in ranked if score > 0][: self.max_specialists]
     
     def select_specialists(self, message: str) -> List[str]:
         """根据用户输入选择合适的专家代理。
@@ -50,33 +430,8 @@ class AgentSelector:
         Returns:
             选中的专家代理ID列表，按匹配度降序排列
         """
-        # 将用户消息转换为小写以便匹配
-        lowered = message.lower()
-        # 存储专家ID和对应的匹配分数
-        scored: List[tuple[str, int]] = []
-        
-        # 遍历所有代理配置
-        for agent_id, profile in self.agent_profiles.items():
-            # 只处理类型为specialist的代理
-            if profile.get("type") != "specialist":
-                continue
-            # 获取专家的专业领域关键词
-            keywords = profile.get("expertise_keywords", [])
-            # 计算消息中包含的关键词数量作为匹配分数
-            score = sum(lowered.count(keyword.lower()) for keyword in keywords)
-            # 添加到分数列表
-            scored.append((agent_id, score))
-        
-        # 按分数降序排序
-        scored.sort(key=lambda item: item[1], reverse=True)
-        # 选择分数大于0的专家，并限制最大数量
-        selected = [agent_id for agent_id, score in scored if score > 0][: self.max_specialists]
-        
         # 如果没有匹配到专家，使用备选专家列表
-        if not selected:
-            selected = self.fallback_specialists[: self.max_specialists]
-        
-        return selected
+        return self.match_specialists(message) or self.fallback_specialists[: self.max_specialists]
 
 
 class MultiAgentController:
@@ -101,6 +456,26 @@ class MultiAgentController:
         self.selector = AgentSelector(Config.AGENT_PROFILES)
         # 获取项目大脑的代理ID
         self.project_brain_id = Config.PROJECT_BRAIN_ID
+        # 是否把多个专家合并为一次 LLM 调用
+        self.batch_specialists = Config.MULTI_AGENT_PIPELINE.get("batch_specialists", False)
+        # 没有专家命中关键词时，是否跳过摘要与备选专家，直接单次调用项目大脑
+        self.single_shot_on_fallback = Config.MULTI_AGENT_PIPELINE.get("single_shot_on_fallback", True)
+        # 项目摘要短期缓存：同一用户重复提问时复用摘要，省去一次项目大脑调用
+        self._summary_cache = TTLCache(
+            maxsize=Config.MULTI_AGENT_PIPELINE.get("summary_cache_size", 512),
+            ttl=Config.MULTI_AGENT_PIPELINE.get("summary_cache_ttl", 300)
+        )
+        # 专家调用线程池，容量与单次最多选择的专家数一致
+        self._specialist_pool = ThreadPoolExecutor(
+            max_workers=max(1, self.selector.max_specialists),
+            thread_name_prefix="specialist"
+        )
+        # AGENT_PROFILES 运行期不变，代理信息与名称映射只构建一次
+        self._available_agents = self._build_available_agents()
+        self._agent_names: Dict[str, str] = {
+            agent_id: profile.name
+            for agent_id, profile in Config.AGENT_PROFILES.items()
+        }
     
     def process_user_message(
         self,
@@ -120,6 +495,39 @@ class MultiAgentController:
         Returns:
             MultiAgentResult对象，包含项目摘要、选中的代理、专家输出和最终响应
         """
+        return _run_to_completion(
+            self._run_pipeline(user_message, user_id, session_id, target_agent, stream=False)
+        )
+    
+    def process_user_message_stream(
+        self,
+        user_message: str,
+        user_id: str,
+        session_id: str,
+        target_agent: Optional[str] = None
+    ) -> Generator[str, None, MultiAgentResult]:
+        """流式执行消息处理流程，参数与 ``process_user_message`` 相同。
+        
+        项目摘要与专家意见仍按原流程生成，只有最终回复（直接调用的专家回复或项目大脑的整合回复）
+        逐片段产出；完整的 MultiAgentResult 作为生成器返回值（可通过 ``yield from`` 取得）。
+        
+        Yields:
+            最终回复的文本片段
+            
+        Returns:
+            MultiAgentResult对象，包含项目摘要、选中的代理、专家输出和最终响应
+        """
+        return (yield from self._run_pipeline(user_message, user_id, session_id, target_agent, stream=True))
+    
+    def _run_pipeline(
+        self,
+        user_message: str,
+        user_id: str,
+        session_id: str,
+        target_agent: Optional[str],
+        stream: bool
+    ) -> Generator[str, None, MultiAgentResult]:
+        """消息处理流程的公共实现；stream 为 False 时不产出任何片段。"""
         # 直接调用专家大脑模式
         if target_agent and target_agent != self.project_brain_id and target_agent in Config.AGENT_PROFILES:
             """直接调用专家大脑模式：当指定了具体的专家代理时使用"""
@@ -130,7 +538,8 @@ class MultiAgentController:
             prompt = self._build_specialist_prompt(target_agent, user_message, "")
             
             # 调用专家代理
-            response = self._call_agent(
+            response = yield from self._invoke_agent(
+                stream,
                 agent_id=target_agent,          # 专家代理ID
                 prompt=prompt,                  # 构建的提示信息
                 user_id=user_id,                # 用户ID
@@ -150,49 +559,67 @@ class MultiAgentController:
         
         # 默认使用项目大脑整合流程
         """项目大脑整合流程：默认模式，通过项目大脑协调多个专家"""
-        # 获取项目记忆上下文
-        project_memory_context = self._get_project_memory_context(user_id, self.project_brain_id)
-        
-        # 调用项目大脑生成项目摘要
-        project_summary_resp = self._call_agent(
-            agent_id=self.project_brain_id,                          # 项目大脑代理ID
-            prompt=self._build_project_brain_prompt(user_message),   # 项目大脑提示信息
-            user_id=user_id,                                        # 用户ID
-            session_id=session_id,                                  # 会话ID
-            persist_history=False,                                   # 不持久化此中间结果
-            extra_context=project_memory_context,                   # 项目记忆上下文
-            memory_type="project"                                  # 指定为项目记忆类型
+        # 先做专家路由：没有任何关键词命中时，摘要不会被专家使用，直接单次调用项目大脑作答
+        specialist_ids = self.selector.match_specialists(user_message)
+        if not specialist_ids:
+            if self.single_shot_on_fallback:
+                return (yield from self._single_shot_project_brain(user_message, user_id, session_id, stream))
+            specialist_ids = self.selector.fallback_specialists[: self.selector.max_specialists]
+        
+        # 命中摘要缓存时跳过项目记忆检索与项目大脑调用（缓存值为 (项目摘要, 项目记忆上下文)）；
+        # 键包含会话与对话历史代数，清空历史或切换会话后不会复用旧历史生成的摘要
+        summary_key = (
+            user_id, session_id, self.chat_engine.history_generation(user_id), user_message.strip().lower()
         )
-        # 提取项目摘要内容
-        project_summary = project_summary_resp.content
-        
-        # 选择合适的专家代理
-        specialist_ids = self.selector.select_specialists(user_message)
-        # 存储专家输出结果
-        specialist_outputs: List[SpecialistResult] = []
-        
-        # 遍历选中的专家代理
-        for agent_id in specialist_ids:
-            # 获取专家特定的记忆上下文
-            expert_memory_context = self._get_expert_memory_context(user_id, agent_id)
+        cached_summary = self._summary_cache.get(summary_key)
+        if cached_summary is not None:
+            project_summary, project_memory_context = cached_summary
+            # 与项目大脑调用写入的记忆保持一致（_call_agent 未指定记忆类型，按普通记忆存储）
+            self.chat_engine.submit_memory_write(
+                content=f"用户提问: {self._build_project_brain_prompt(user_message)}\n系统回复: {project_summary}",
+                user_id=user_id,
+                agent_id=self.project_brain_id,
+                session_id=session_id,
+                memory_type="user",
+                metadata={}
+            )
+        else:
+            # 获取项目记忆上下文
+            project_memory_context = self._get_project_memory_context(user_id, self.project_brain_id)
             
-            # 调用专家代理
-            specialist_resp = self._call_agent(
-                agent_id=agent_id,                                          # 专家代理ID
-                prompt=self._build_specialist_prompt(agent_id, user_message, project_summary),  # 专家提示信息
-                user_id=user_id,                                            # 用户ID
-                session_id=session_id,                                      # 会话ID
-                persist_history=False,                                       # 不持久化此中间结果
-                extra_context=f"{project_summary}\n{expert_memory_context}",  # 结合项目摘要和专家记忆上下文
-                memory_type="expert"                                       # 指定为专家记忆类型
+            # 调用项目大脑生成项目摘要
+            project_summary_resp = self._call_agent(
+                agent_id=self.project_brain_id,                          # 项目大脑代理ID
+                prompt=self._build_project_brain_prompt(user_message),   # 项目大脑提示信息
+                user_id=user_id,                                        # 用户ID
+                session_id=session_id,                                  # 会话ID
+                persist_history=False,                                   # 不持久化此中间结果
+                extra_context=project_memory_context,                   # 项目记忆上下文
+                memory_type="project"                                  # 指定为项目记忆类型
+            )
+            # 提取项目摘要内容，出错的结果不缓存
+            project_summary = project_summary_resp.content
+            if not project_summary_resp.error:
+                self._summary_cache.set(summary_key, (project_summary, project_memory_context))
+        
+        specialist_outputs: Optional[List[SpecialistResult]] = None
+        # 批量模式：一次请求产出全部专家意见，共享提示前缀；解析失败时回退到逐个调用
+        if self.batch_specialists and len(specialist_ids) > 1:
+            specialist_outputs = self._run_batched_specialists(
+                specialist_ids, user_message, project_summary, user_id, session_id
             )
-            # 添加专家输出到结果列表
-            specialist_outputs.append(SpecialistResult(agent_id=agent_id, content=specialist_resp.content))
+        if specialist_outputs is None:
+            # 专家之间互不依赖，并发调用以把等待时间从 N 次往返压缩到约 1 次；map 保持专家顺序
+            specialist_outputs = list(self._specialist_pool.map(
+                lambda agent_id: self._run_specialist(agent_id, user_message, project_summary, user_id, session_id),
+                specialist_ids
+            ))
         
         # 构建最终整合提示
         final_prompt = self._build_final_prompt(user_message, project_summary, specialist_outputs)
         # 调用项目大脑整合所有专家意见生成最终响应
-        final_response = self._call_agent(
+        final_response = yield from self._invoke_agent(
+            stream,
             agent_id=self.project_brain_id,                              # 项目大脑代理ID
             prompt=final_prompt,                                         # 最终整合提示
             user_id=user_id,                                            # 用户ID
@@ -210,11 +637,140 @@ class MultiAgentController:
             final_response=final_response           # 最终整合响应
         )
     
-    def get_available_agents(self) -> Dict[str, Dict[str, Any]]:
+    def _single_shot_project_brain(
+        self,
+        user_message: str,
+        user_id: str,
+        session_id: str,
+        stream: bool = False
+    ) -> Generator[str, None, MultiAgentResult]:
+        """无需专家参与时，由项目大脑一次调用直接给出最终方案。
+        
+        Args:
+            user_message: 用户输入的消息内容
+            user_id: 用户ID
+            session_id: 会话ID
+            stream: 是否逐片段产出回复
+            
+        Returns:
+            MultiAgentResult对象，项目摘要与专家输出为空
+        """
+        # 获取项目记忆上下文
+        project_memory_context = self._get_project_memory_context(user_id, self.project_brain_id)
+        final_response = yield from self._invoke_agent(
+            stream,
+            agent_id=self.project_brain_id,                                     # 项目大脑代理ID
+            prompt=_build_single_shot_prompt(self.project_brain_id, user_message),  # 合并后的提示
+            user_id=user_id,                                                   # 用户ID
+            session_id=session_id,                                             # 会话ID
+            persist_history=True,                                              # 持久化最终对话历史
+            extra_context=project_memory_context,                              # 项目记忆上下文
+            memory_type="project"                                             # 指定为项目记忆类型
+        )
+        return MultiAgentResult(
+            project_summary="",
+            selected_agents=[],
+            specialist_outputs=[],
+            final_response=final_response
+        )
+    
+    def _run_specialist(
+        self,
+        agent_id: str,
+        user_message: str,
+        project_summary: str,
+        user_id: str,
+        session_id: str
+    ) -> SpecialistResult:
+        """调用单个专家代理，供线程池并发执行。
+        
+        Args:
+            agent_id: 专家代理ID
+            user_message: 用户输入的消息内容
+            project_summary: 项目摘要
+            user_id: 用户ID
+            session_id: 会话ID
+            
+        Returns:
+            SpecialistResult对象，包含专家的输出内容
+        """
+        # 获取专家特定的记忆上下文
+        expert_memory_context = self._get_expert_memory_context(user_id, agent_id)
+        
+        # 调用专家代理
+        specialist_resp = self._call_agent(
+            agent_id=agent_id,                                          # 专家代理ID
+            prompt=self._build_specialist_prompt(agent_id, user_message, project_summary),  # 专家提示信息
+            user_id=user_id,                                            # 用户ID
+            session_id=session_id,                                      # 会话ID
+            persist_history=False,                                       # 不持久化此中间结果
+            extra_context=f"{project_summary}\n{expert_memory_context}",  # 结合项目摘要和专家记忆上下文
+            memory_type="expert"                                       # 指定为专家记忆类型
+        )
+        return SpecialistResult(agent_id=agent_id, content=specialist_resp.content)
+    
+    def _run_batched_specialists(
+        self,
+        specialist_ids: List[str],
+        user_message: str,
+        project_summary: str,
+        user_id: str,
+        session_id: str
+    ) -> Optional[List[SpecialistResult]]:
+        """用一次 LLM 调用生成所有专家的意见。
+        
+        Args:
+            specialist_ids: 选中的专家代理ID列表
+            user_message: 用户输入的消息内容
+            project_summary: 项目摘要
+            user_id: 用户ID
+            session_id: 会话ID
+            
+        Returns:
+            按 specialist_ids 顺序排列的专家输出；模型输出无法解析时返回 None
+        """
+        response = self._call_agent(
+            agent_id=self.project_brain_id,
+            prompt=_build_batched_specialist_prompt(tuple(specialist_ids), user_message, project_summary),
+            user_id=user_id,
+            session_id=session_id,
+            persist_history=False,
+            extra_context=project_summary,
+            store_memory=False  # 合并输出不直接入库，解析后按专家分别写入
+        )
+        if response.error:
+            return None
+        
+        sections = _parse_batched_specialist_output(response.content, specialist_ids)
+        if sections is None:
+            logger.warning("批量专家输出解析失败，回退为逐个调用")
+            return None
+        
+        # 按专家分别写入专家记忆，保持与逐个调用时相同的记忆归属
+        for agent_id in specialist_ids:
+            self.chat_engine.submit_memory_write(
+                content=f"用户提问: {user_message}\n专家回复: {sections[agent_id]}",
+                user_id=user_id,
+                agent_id=agent_id,
+                session_id=session_id,
+                memory_type="expert",
+                metadata={"memory_type": "expert", "expert_domain": agent_id}
+            )
+        return [SpecialistResult(agent_id=agent_id, content=sections[agent_id]) for agent_id in specialist_ids]
+    
+    def get_available_agents(self) -> Mapping[str, Dict[str, Any]]:
         """获取所有可用的专家代理信息。
         
         Returns:
-            字典，包含所有可用代理的详细信息，包括ID、名称、描述、专业领域等
+            只读映射，包含所有可用代理的详细信息，包括ID、名称、描述、专业领域等
+        """
+        return self._available_agents
+    
+    def _build_available_agents(self) -> Mapping[str, Dict[str, Any]]:
+        """根据代理配置构建可用代理信息（初始化时调用一次）。
+        
+        Returns:
+            只读映射，键为代理ID，值为代理信息字典
         """
         # 存储可用代理信息
         available_agents = {}
@@ -224,14 +780,14 @@ class MultiAgentController:
             # 构建代理信息字典
             available_agents[agent_id] = {
                 "id": agent_id,                                      # 代理ID
-                "name": profile.get("name", agent_id),              # 代理名称
-                "description": profile.get("description", ""),      # 代理描述
-                "expertise": profile.get("expertise_keywords", []),  # 专业领域关键词
+                "name": profile.name,                               # 代理名称
+                "description": profile.description,                 # 代理描述
+                "expertise": list(profile.expertise_keywords),      # 专业领域关键词
                 "is_project_brain": agent_id == self.project_brain_id,  # 是否为项目大脑
-                "type": profile.get("type", "specialist")          # 代理类型
+                "type": profile.type                                # 代理类型
             }
         
-        return available_agents
+        return MappingProxyType(available_agents)
     
     def _get_expert_memory_context(self, user_id: str, agent_id: str) -> str:
         """获取专家相关的记忆上下文。
@@ -268,7 +824,8 @@ class MultiAgentController:
         session_id: str,
         persist_history: bool,
         extra_context: Optional[str],
-        memory_type: Optional[str] = None
+        memory_type: Optional[str] = None,
+        store_memory: bool = True
     ) -> ChatResponse:
         """统一的代理调用封装，支持不同的记忆类型。
         
@@ -280,21 +837,17 @@ class MultiAgentController:
             persist_history: 是否持久化对话历史
             extra_context: 额外的上下文信息
             memory_type: 记忆类型，可选参数
+            store_memory: 是否把本次交互写入长期记忆，默认True
             
         Returns:
             ChatResponse对象，包含代理的响应内容
         """
         try:
             # 构建记忆元数据，标识记忆类型
-            memory_metadata = {}
-            if memory_type:
-                memory_metadata["memory_type"] = memory_type
-                # 如果是专家记忆，记录专家领域
-                memory_metadata["expert_domain"] = agent_id if memory_type == "expert" else None
+            memory_metadata = self._memory_metadata(agent_id, memory_type)
             
-            # 打印调用信息以调试
-            print(f"\n调试 - 调用代理: {agent_id}, 记忆类型: {memory_type}")
-            print(f"调试 - 提示内容: {prompt[:100]}...")
+            # 调试信息仅在开启 DEBUG 时输出，% 格式化延迟到真正写日志时
+            logger.debug("调用代理: %s, 记忆类型: %s, 提示内容: %.100s...", agent_id, memory_type, prompt)
             
             # 调用聊天引擎生成响应
             response = self.chat_engine.generate_response(
@@ -303,24 +856,16 @@ class MultiAgentController:
                 agent_id=agent_id,
                 session_id=session_id,
                 persist_history=persist_history,
+                store_memory=store_memory,
                 extra_context=extra_context,
                 memory_metadata=memory_metadata  # 传递记忆元数据
             )
             
-            # 不抛出异常，而是记录错误并返回响应，这样可以看到更多调试信息
-            if response.error:
-                print(f"警告 - 代理 {agent_id} 生成回复出错: {response.error}")
-                # 尝试为响应内容设置一个默认值，以便测试可以继续
-                if not response.content:
-                    response.content = f"[代理 {agent_id} 生成回复时出错: {response.error}]"
-            
-            return response
+            return self._check_response(agent_id, response)
             
         except Exception as e:
-            # 捕获所有异常并返回带有详细错误信息的响应
-            print(f"_call_agent执行异常: {str(e)}")
-            import traceback
-            print(f"异常堆栈: {traceback.format_exc()}")
+            # 捕获所有异常并返回带有详细错误信息的响应（堆栈由日志模块统一格式化）
+            logger.exception("_call_agent执行异常: %s", e)
             # 返回一个包含错误信息的响应，而不是抛出异常
             return ChatResponse(
                 content=f"[代理 {agent_id} 执行异常: {str(e)}]",
@@ -330,8 +875,78 @@ class MultiAgentController:
                 error=str(e)
             )
     
+    def _stream_agent(
+        self,
+        *,
+        agent_id: str,
+        prompt: str,
+        user_id: str,
+        session_id: str,
+        persist_history: bool,
+        extra_context: Optional[str],
+        memory_type: Optional[str] = None,
+        store_memory: bool = True
+    ) -> Generator[str, None, ChatResponse]:
+        """``_call_agent`` 的流式版本：逐片段产出回复，完整的 ChatResponse 作为返回值。
+        
+        参数与 ``_call_agent`` 相同。
+        """
+        try:
+            logger.debug("流式调用代理: %s, 记忆类型: %s, 提示内容: %.100s...", agent_id, memory_type, prompt)
+            response = yield from self.chat_engine.generate_response_stream(
+                prompt,
+                user_id=user_id,
+                agent_id=agent_id,
+                session_id=session_id,
+                persist_history=persist_history,
+                store_memory=store_memory,
+                extra_context=extra_context,
+                memory_metadata=self._memory_metadata(agent_id, memory_type)
+            )
+            return self._check_response(agent_id, response)
+            
+        except Exception as e:
+            # 引擎内部错误已由 generate_response_stream 兜底，这里只处理调用前后的意外异常
+            logger.exception("_stream_agent执行异常: %s", e)
+            content = f"[代理 {agent_id} 执行异常: {str(e)}]"
+            yield content
+            return ChatResponse(
+                content=content,
+                user_id=user_id,
+                agent_id=agent_id,
+                session_id=session_id,
+                error=str(e)
+            )
+    
+    def _invoke_agent(self, stream: bool, **kwargs) -> Generator[str, None, ChatResponse]:
+        """按 stream 选择流式或一次性调用代理，参数同 ``_call_agent``。"""
+        if stream:
+            return (yield from self._stream_agent(**kwargs))
+        return self._call_agent(**kwargs)
+    
+    @staticmethod
+    def _memory_metadata(agent_id: str, memory_type: Optional[str]) -> Dict[str, Any]:
+        """构建记忆元数据，标识记忆类型；专家记忆同时记录专家领域。"""
+        memory_metadata: Dict[str, Any] = {}
+        if memory_type:
+            memory_metadata["memory_type"] = memory_type
+            # 如果是专家记忆，记录专家领域
+            memory_metadata["expert_domain"] = agent_id if memory_type == "expert" else None
+        return memory_metadata
+    
+    @staticmethod
+    def _check_response(agent_id: str, response: ChatResponse) -> ChatResponse:
+        """记录代理回复中的错误，并为空内容补充默认提示。"""
+        # 不抛出异常，而是记录错误并返回响应，这样可以看到更多调试信息
+        if response.error:
+            logger.warning("代理 %s 生成回复出错: %s", agent_id, response.error)
+            # 尝试为响应内容设置一个默认值，以便测试可以继续
+            if not response.content:
+                response.content = f"[代理 {agent_id} 生成回复时出错: {response.error}]"
+        return response
+    
     def _build_project_brain_prompt(self, user_message: str) -> str:
-        """构建项目大脑的提示信息。
+        """构建项目大脑的提示信息（结果按用户输入缓存）。
         
         Args:
             user_message: 用户输入的消息内容
@@ -339,27 +954,7 @@ class MultiAgentController:
         Returns:
             构建好的项目大脑提示信息
         """
-        # 获取项目大脑的配置文件
-        profile = Config.AGENT_PROFILES.get(self.project_brain_id, {})
-        # 获取项目大脑的指令
-        instructions = profile.get("instructions", "")
-        # 获取项目大脑的名称
-        name = profile.get("name", "项目大脑")
-        # 获取项目大脑的描述
-        description = profile.get("description", "")
-        
-        # 构建项目大脑提示
-        return (
-            f"你是 {name}，{description}\n"
-            "作为项目大脑，你需要整合所有专家意见，协调各方面资源。\n"
-            "请输出：\n"
-            "1. 项目目标摘要\n"
-            "2. 关键风险/依赖\n"
-            "3. 需要协调的专家领域\n"
-            "请使用分点形式，语言简练。\n\n"
-            f"[内部执行手册]\n{instructions}\n\n"
-            f"[用户输入]\n{user_message}"
-        )
+        return _build_project_brain_prompt(self.project_brain_id, user_message)
     
     def _build_specialist_prompt(
         self,
@@ -367,7 +962,7 @@ class MultiAgentController:
         user_message: str,
         project_summary: str
     ) -> str:
-        """为特定专家构建专业prompt
+        """为特定专家构建专业prompt（结果按 agent_id/用户输入/项目摘要缓存）。
         
         Args:
             agent_id: 专家代理ID
@@ -377,121 +972,7 @@ class MultiAgentController:
         Returns:
             构建好的专家提示信息
         """
-        # 获取专家的配置文件
-        profile = Config.AGENT_PROFILES.get(agent_id, {})
-        # 获取专家的指令
-        instructions = profile.get("instructions", "")
-        # 获取专家的名称
-        name = profile.get("name", agent_id)
-        # 获取专家的表达风格
-        style = profile.get("style", "专业、清晰")
-        
-        # 根据不同专家类型使用特定的prompt模板
-        if agent_id == "product_lead":
-            return self._build_product_expert_prompt(name, instructions, style, project_summary, user_message)
-        elif agent_id == "algo_scientist":
-            return self._build_algo_expert_prompt(name, instructions, style, project_summary, user_message)
-        elif agent_id == "solution_architect":
-            return self._build_architecture_expert_prompt(name, instructions, style, project_summary, user_message)
-        else:
-            # 默认专家prompt模板
-            return (
-                f"你是 {name}，负责给出专业建议。\n"
-                "请结合项目大脑提供的摘要与用户需求，输出你的专业分析和建议。\n"
-                f"表达风格：{style}\n\n"
-                f"[专家工作守则]\n{instructions}\n\n"
-                f"[项目大脑摘要]\n{project_summary}\n\n"
-                f"[用户输入]\n{user_message}"
-            )
-            
-    def _build_product_expert_prompt(self, name, instructions, style, project_summary, user_message):
-        """产品专家专属prompt模板
-        
-        Args:
-            name: 专家名称
-            instructions: 专家指令
-            style: 表达风格
-            project_summary: 项目摘要
-            user_message: 用户输入的消息内容
-            
-        Returns:
-            构建好的产品专家提示信息
-        """
-        return (
-            f"你是 {name}，一位资深产品专家。\n"
-            "请基于用户需求和项目摘要，从产品角度进行深入分析并提供专业建议。\n"
-            "请重点关注：\n"
-            "1. 用户需求的核心价值点和潜在痛点\n"
-            "2. 功能范围界定和优先级排序\n"
-            "3. 用户体验设计和交互流程建议\n"
-            "4. 产品路线图和迭代计划\n"
-            "5. 成功指标和验收标准\n"
-            f"表达风格：{style}\n\n"
-            f"[产品专家工作指南]\n{instructions}\n\n"
-            f"[项目概述]\n{project_summary}\n\n"
-            f"[用户需求]\n{user_message}\n\n"
-            "请提供详细、可操作的产品建议，帮助团队明确产品方向和具体实现路径。"
-        )
-        
-    def _build_algo_expert_prompt(self, name, instructions, style, project_summary, user_message):
-        """算法专家专属prompt模板
-        
-        Args:
-            name: 专家名称
-            instructions: 专家指令
-            style: 表达风格
-            project_summary: 项目摘要
-            user_message: 用户输入的消息内容
-            
-        Returns:
-            构建好的算法专家提示信息
-        """
-        return (
-            f"你是 {name}，一位资深算法专家。\n"
-            "请基于用户需求和项目摘要，从算法和技术角度进行深入分析并提供专业建议。\n"
-            "请重点关注：\n"
-            "1. 问题的算法本质和技术路径\n"
-            "2. 多种算法方案的比较和选型建议\n"
-            "3. 数据需求分析和质量要求\n"
-            "4. 模型复杂度和算力评估\n"
-            "5. 性能瓶颈预测和优化方向\n"
-            "6. 实验设计和评估指标\n"
-            f"表达风格：{style}\n\n"
-            f"[算法专家工作指南]\n{instructions}\n\n"
-            f"[项目概述]\n{project_summary}\n\n"
-            f"[用户需求]\n{user_message}\n\n"
-            "请提供严谨、科学的算法解决方案，包括技术选型依据和实施建议。"
-        )
-        
-    def _build_architecture_expert_prompt(self, name, instructions, style, project_summary, user_message):
-        """架构师专属prompt模板
-        
-        Args:
-            name: 专家名称
-            instructions: 专家指令
-            style: 表达风格
-            project_summary: 项目摘要
-            user_message: 用户输入的消息内容
-            
-        Returns:
-            构建好的架构师提示信息
-        """
-        return (
-            f"你是 {name}，一位资深解决方案架构师。\n"
-            "请基于用户需求和项目摘要，从系统架构和技术实现角度进行深入分析并提供专业建议。\n"
-            "请重点关注：\n"
-            "1. 端到端系统架构设计\n"
-            "2. 技术栈选型和组件划分\n"
-            "3. 接口规范和集成策略\n"
-            "4. 部署架构和资源规划\n"
-            "5. 数据流转和存储方案\n"
-            "6. 性能、安全和扩展性评估\n"
-            f"表达风格：{style}\n\n"
-            f"[架构师工作指南]\n{instructions}\n\n"
-            f"[项目概述]\n{project_summary}\n\n"
-            f"[用户需求]\n{user_message}\n\n"
-            "请提供全面、可落地的架构方案，确保系统的可行性、可扩展性和可维护性。"
-        )
+        return _build_specialist_prompt(agent_id, user_message, project_summary)
     
     def _build_final_prompt(
         self,
@@ -501,6 +982,8 @@ class MultiAgentController:
     ) -> str:
         """构建最终整合提示信息。
         
+        专家输出不可哈希，因此这里不做整体缓存，只复用按代理缓存的固定头部。
+        
         Args:
             user_message: 用户输入的消息内容
             project_summary: 项目摘要
@@ -509,29 +992,22 @@ class MultiAgentController:
         Returns:
             构建好的最终整合提示信息
         """
-        # 构建专家反馈汇总部分
-        specialist_section = "\n\n".join(
-            f"- {self._get_agent_name(output.agent_id)} 专家反馈：{output.content}"
-            for output in specialist_outputs
-        ) or "暂无专家反馈。"
-        
-        # 获取项目大脑的配置文件
-        profile = Config.AGENT_PROFILES.get(self.project_brain_id, {})
-        # 获取项目大脑的名称
-        name = profile.get("name", "项目大脑")
-        
-        # 构建最终整合提示
-        return (
-            f"你是 {name}，需要整合所有专家意见，对用户给出结构化的项目方案。\n"
-            "请输出：\n"
-            "1. 总体策略/路线\n"
-            "2. 按角色分配的行动项与里程碑\n"
-            "3. 风险与待澄清问题\n"
-            "必须引用具体专家结论或记忆来源。\n\n"
-            f"[项目大脑摘要]\n{project_summary}\n\n"
-            f"[专家反馈汇总]\n{specialist_section}\n\n"
-            f"[用户输入]\n{user_message}"
-        )
+        # 所有片段收集到一个列表，最后只做一次拼接，避免专家长回复被多次复制
+        parts = [
+            _build_final_prompt_header(self.project_brain_id),
+            "[项目大脑摘要]\n", project_summary,
+            "\n\n[专家反馈汇总]\n",
+        ]
+        if specialist_outputs:
+            agent_name = self._agent_names.get
+            for index, output in enumerate(specialist_outputs):
+                if index:
+                    parts.append("\n\n")
+                parts += ("- ", agent_name(output.agent_id, output.agent_id), " 专家反馈：", output.content)
+        else:
+            parts.append("暂无专家反馈。")
+        parts += ("\n\n[用户输入]\n", user_message)
+        return "".join(parts)
     
     def _get_agent_name(self, agent_id: str) -> str:
         """获取代理的名称。
@@ -542,8 +1018,6 @@ class MultiAgentController:
         Returns:
             代理的名称
         """
-        # 获取代理的配置文件
-        profile = Config.AGENT_PROFILES.get(agent_id, {})
-        # 返回代理的名称，如果没有配置则返回代理ID
-        return profile.get("name", agent_id)
+        # 查预先构建的名称映射，没有配置则返回代理ID
+        return self._agent_names.get(agent_id, agent_id)
 
@@ -11,25 +11,85 @@
 5. 处理记忆的存储和检索
 """
 
-# 导入OpenAI客户端
-from openai import OpenAI as OpenAIClient
+# 导入JSON模块，解析流式响应
+import json
+# 导入退出钩子，进程退出前排空后台记忆写入
+import atexit
 # 导入日志模块
 import logging
+# 导入随机数与计时，用于限流重试的退避抖动
+import random
+import time
+# 导入线程锁，保证客户端只初始化一次
+import threading
+# 导入线程池，长期记忆写入在后台执行
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+# 导入缓存装饰器，复用已编码的消息
+from functools import lru_cache
 # 导入类型提示
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, List, Optional, Set
 
 # 导入配置模块
 from config.settings import Config
 # 导入数据模型
-from models.data_models import ChatMessage, ChatResponse, ConversationCache, SpecialistResult, MultiAgentResult
+from models.data_models import ChatMessage, ChatResponse, ContextPayload, ConversationCache, Msg, SpecialistResult, MultiAgentResult
 # 导入记忆管理器
 from core.memory_manager import MemoryManager
 # 导入上下文协调器
 from core.context_engine import ContextOrchestrator
 
+if TYPE_CHECKING:
+    # HTTP客户端仅在首次调用LLM时导入，缩短模块冷启动时间
+    import httpx
+
+try:
+    # orjson / msgspec 为可选依赖，安装任一即以 C 实现编码请求体，优先 orjson
+    import orjson
+
+    def _json_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # pragma: no cover - 未安装 orjson 时尝试 msgspec
+    try:
+        import msgspec
+
+        _msgspec_encode = msgspec.json.Encoder().encode
+
+        def _json_bytes(obj: Any) -> bytes:
+            return _msgspec_encode(obj)
+    except ImportError:  # 都未安装时使用标准库
+        def _json_bytes(obj: Any) -> bytes:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
 # 配置日志记录器
 logger = logging.getLogger(__name__)
 
+# 请求体使用预编码的 JSON 字节发送
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# 触发退避重试的限流/过载状态码
+_RETRYABLE_STATUS = frozenset({429, 503})
+
+
+@lru_cache(maxsize=1024)
+def _encode_message(role: str, content: str) -> bytes:
+    """编码单条消息并缓存。
+    
+    系统提示和历史消息在多轮对话中逐字重复，只需编码一次。
+    """
+    return _json_bytes({"role": role, "content": content})
+
+
+@lru_cache(maxsize=8)
+def _encode_body_prefix(model: str, stream: bool) -> bytes:
+    """编码请求体中除 messages 以外的固定字段，以 ``"messages":[`` 结尾。"""
+    fields: Dict[str, Any] = {
+        "model": model,          # 使用的模型名称
+        "temperature": 0.7,      # 温度参数，控制生成文本的随机性
+        "max_tokens": 1024       # 最大生成令牌数
+    }
+    if stream:
+        fields["stream"] = True
+    return _json_bytes(fields)[:-1] + b',"messages":['
+
 class ChatEngine:
     """聊天引擎
     
@@ -44,33 +104,97 @@ class ChatEngine:
         """
         # 存储记忆管理器实例
         self.memory_manager = memory_manager
-        # 初始化LLM客户端
-        self.llm_client = self._initialize_llm_client()
+        # LLM客户端延迟到首次调用时初始化，不访问LLM的代码路径无需加载HTTP依赖
+        self._llm_client: Optional["httpx.Client"] = None
+        self._llm_client_lock = threading.Lock()
         # 初始化对话缓存
-        self.conversation_cache = ConversationCache(Config.CONVERSATION_CACHE_SIZE)
+        self.conversation_cache = ConversationCache(
+            Config.CONVERSATION_CACHE_SIZE,
+            Config.CONTEXT_PIPELINE.get("max_history_tokens"),
+            max_users=Config.CONVERSATION_CACHE_MAX_USERS,
+            max_total_messages=Config.CONVERSATION_CACHE_MAX_MESSAGES,
+            on_evict=self._on_conversation_evicted,
+            compaction_batch=(
+                Config.CONTEXT_PIPELINE.get("compaction_batch", 10)
+                if Config.CONTEXT_PIPELINE.get("history_compaction", False) else None
+            )
+        )
         # 初始化上下文协调器
         self.context_orchestrator = ContextOrchestrator(memory_manager)
+        # 运行期不变的配置项只读取一次，避免每轮对话重复查找
+        self._max_history = Config.CONTEXT_PIPELINE.get("max_history_messages")
+        self._default_user = Config.DEFAULT_USER_ID
+        self._default_agent = Config.DEFAULT_AGENT_ID
+        self._default_session = Config.DEFAULT_SESSION_ID
+        self._llm_model = Config.LLM_MODEL_NAME
+        # 限制同时进行中的LLM请求数，并在限流时退避重试
+        pool_config = Config.LLM_HTTP_POOL
+        self._llm_slots = threading.BoundedSemaphore(pool_config.get("max_inflight", 16))
+        self._throttle_retries = pool_config.get("throttle_retries", 4)
+        self._backoff_base = pool_config.get("backoff_base", 0.5)
+        self._backoff_max = pool_config.get("backoff_max", 30)
+        # 长期记忆写入（向量化 + 入库）移出响应关键路径，交给后台线程池执行
+        self._async_memory_writes = Config.CONTEXT_PIPELINE.get("async_memory_writes", True)
+        self._write_pool: Optional[ThreadPoolExecutor] = None
+        self._pending_writes: Set[Future] = set()
+        self._pending_lock = threading.Lock()
+        # 用户对话历史代数：清空或淘汰对话缓存时递增，依赖历史的派生缓存（如项目摘要）以此失效
+        self._history_generations: Dict[str, int] = {}
+        self._generation_lock = threading.Lock()
+        if self._async_memory_writes:
+            self._write_pool = ThreadPoolExecutor(
+                max_workers=Config.CONTEXT_PIPELINE.get("memory_write_workers", 4),
+                thread_name_prefix="memory-write"
+            )
+            atexit.register(self.shutdown)
         # 记录初始化成功日志
         logger.info("聊天引擎初始化成功")
     
-    def _initialize_llm_client(self) -> OpenAIClient:
+    @property
+    def llm_client(self) -> "httpx.Client":
+        """LLM客户端，首次访问时创建（线程安全）。"""
+        client = self._llm_client
+        if client is None:
+            with self._llm_client_lock:
+                if self._llm_client is None:
+                    self._llm_client = self._initialize_llm_client()
+                client = self._llm_client
+        return client
+    
+    def _initialize_llm_client(self) -> "httpx.Client":
         """初始化LLM客户端。
         
+        直接使用 httpx 请求 vLLM 的 OpenAI 兼容接口，省去 SDK 每次调用的模型校验与封装开销。
+        
         Returns:
-            OpenAIClient实例，用于与大语言模型交互
+            httpx.Client实例，用于与大语言模型交互
             
         Raises:
             Exception: 当LLM客户端初始化失败时抛出
         """
         try:
-            # 使用配置文件中的参数初始化OpenAI客户端
-            return OpenAIClient(
+            import httpx
+            
+            # 共享的 keep-alive 连接池；启用 HTTP/2 后并发的专家调用复用同一条 TCP 连接
+            pool = Config.LLM_HTTP_POOL
+            transport = httpx.HTTPTransport(
+                http2=pool.get("http2", True),
+                retries=pool.get("retries", 2),
+                limits=httpx.Limits(
+                    max_connections=pool.get("max_connections", 32),
+                    max_keepalive_connections=pool.get("max_keepalive_connections", 16)
+                )
+            )
+            # 使用配置文件中的参数初始化HTTP客户端
+            return httpx.Client(
                 base_url=Config.LLM_BASE_URL,  # LLM服务的基础URL
-                api_key=Config.API_KEY          # API密钥
+                headers={"Authorization": f"Bearer {Config.API_KEY}"},  # API密钥
+                timeout=pool.get("timeout", 60),
+                transport=transport
             )
         except Exception as e:
             # 记录错误日志并重新抛出异常
-            logger.error(f"LLM客户端初始化失败: {e}")
+            logger.error("LLM客户端初始化失败: %s", e)
             raise
     
     def generate_response(
@@ -83,7 +207,7 @@ class ChatEngine:
         persist_history: bool = True,
         store_memory: bool = True,
         extra_context: Optional[str] = None,
-        cached_messages_override: Optional[List[Dict[str, str]]] = None,
+        cached_messages_override: Optional[List[Any]] = None,
         memory_type: Optional[str] = None,  # 新增参数
         memory_metadata: Optional[Dict] = None  # 新增参数
     ) -> ChatResponse:
@@ -107,27 +231,14 @@ class ChatEngine:
         Returns:
             ChatResponse对象，包含生成的回复内容和相关元数据
         """
-        user_id = user_id or Config.DEFAULT_USER_ID
-        agent_id = agent_id or Config.DEFAULT_AGENT_ID
-        session_id = session_id or Config.DEFAULT_SESSION_ID
+        user_id = user_id or self._default_user
+        agent_id = agent_id or self._default_agent
+        session_id = session_id or self._default_session
         
         try:
-            if cached_messages_override is not None:
-                cached_messages = cached_messages_override
-            else:
-                cached_messages = self.conversation_cache.get_recent_messages(
-                    user_id,
-                    Config.CONTEXT_PIPELINE.get("max_history_messages")
-                )
-            context_payload = self.context_orchestrator.build_payload(
-                user_id=user_id,
-                agent_id=agent_id,
-                session_id=session_id,
-                user_message=message,
-                cached_messages=cached_messages,
-                extra_context=extra_context,
-                memory_type=memory_type,  # 传递记忆类型
-                memory_metadata=memory_metadata  # 传递记忆元数据
+            context_payload = self._build_context(
+                message, user_id, agent_id, session_id,
+                extra_context, cached_messages_override, memory_type, memory_metadata
             )
             
             assistant_response = self._call_llm(context_payload.messages)
@@ -155,7 +266,7 @@ class ChatEngine:
             )
             
         except Exception as e:
-            logger.error(f"生成回复失败: {e}")
+            logger.error("生成回复失败: %s", e)
             return ChatResponse(
                 content="抱歉，我现在无法处理您的请求，请稍后再试。",
                 user_id=user_id,
@@ -164,62 +275,268 @@ class ChatEngine:
                 session_id=session_id
             )
     
-    def _call_llm(self, messages: List[Dict[str, str]]) -> str:
-        """调用LLM生成回复。
+    def generate_response_stream(
+        self,
+        message: str,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        *,
+        persist_history: bool = True,
+        store_memory: bool = True,
+        extra_context: Optional[str] = None,
+        cached_messages_override: Optional[List[Any]] = None,
+        memory_type: Optional[str] = None,
+        memory_metadata: Optional[Dict] = None
+    ) -> Generator[str, None, ChatResponse]:
+        """流式生成智能回复。
         
-        Args:
-            messages: 消息列表，每个消息包含role和content字段
+        参数与 ``generate_response`` 相同。回复片段到达即产出，首个片段的等待时间约等于首 token 延迟；
+        流结束后才更新对话缓存、写入长期记忆，并把完整的 ChatResponse 作为生成器返回值
+        （可通过 ``yield from`` 取得）。
+        
+        Yields:
+            回复文本片段
             
         Returns:
-            大语言模型生成的回复内容
+            ChatResponse对象，包含完整回复内容和相关元数据
         """
+        user_id = user_id or self._default_user
+        agent_id = agent_id or self._default_agent
+        session_id = session_id or self._default_session
+        
+        parts: List[str] = []
         try:
-            # 打印调试信息
-            print(f"调试 - 输入_call_llm的消息数量: {len(messages)}")
+            context_payload = self._build_context(
+                message, user_id, agent_id, session_id,
+                extra_context, cached_messages_override, memory_type, memory_metadata
+            )
+            
+            for delta in self._stream_llm(context_payload.messages):
+                parts.append(delta)
+                yield delta
+            assistant_response = "".join(parts)
             
-            # 验证并修复消息格式
-            valid_messages = []
-            for i, msg in enumerate(messages):
-                # 检查是否为字典类型
-                if not isinstance(msg, dict):
-                    print(f"错误 - 消息 {i} 不是字典: {type(msg)}")
-                    # 尝试转换为字典
-                    valid_messages.append({'role': 'system', 'content': str(msg)})
-                    continue
-                
-                # 检查必需字段
-                if 'role' not in msg:
-                    print(f"错误 - 消息 {i} 缺少'role'字段: {msg}")
-                    msg = msg.copy()
-                    msg['role'] = 'system'
-                
-                if 'content' not in msg:
-                    print(f"错误 - 消息 {i} 缺少'content'字段: {msg}")
-                    msg = msg.copy()
-                    msg['content'] = ''
-                
-                valid_messages.append(msg)
+            self._finalize_interaction(
+                message,
+                assistant_response,
+                user_id,
+                agent_id,
+                session_id,
+                persist_history,
+                store_memory,
+                memory_type=memory_type,
+                memory_metadata=memory_metadata
+            )
             
-            # 打印修复后的消息信息
-            for i, msg in enumerate(valid_messages):
-                print(f"修复后消息 {i}: role={msg.get('role')}, content长度={len(str(msg.get('content', '')))} ")
+            return ChatResponse(
+                content=assistant_response,
+                user_id=user_id,
+                agent_id=agent_id,
+                session_id=session_id,
+                memory_used=context_payload.memory_used,
+                memories_count=context_payload.memories_count,
+                collaborators=context_payload.collaborators
+            )
             
-            # 调用大语言模型生成回复
-            response = self.llm_client.chat.completions.create(
-                model=Config.LLM_MODEL_NAME,  # 使用的模型名称
-                messages=valid_messages,       # 消息列表
-                temperature=0.7,               # 温度参数，控制生成文本的随机性
-                max_tokens=1024                # 最大生成令牌数
+        except Exception as e:
+            logger.exception("流式生成回复失败: %s", e)
+            fallback = "抱歉，我现在无法处理您的请求，请稍后再试。"
+            # 尚未输出任何内容时补一条提示，避免调用方拿到空回复
+            if not parts:
+                yield fallback
+            return ChatResponse(
+                content="".join(parts) or fallback,
+                user_id=user_id,
+                error=str(e),
+                agent_id=agent_id,
+                session_id=session_id
+            )
+    
+    def _build_context(
+        self,
+        message: str,
+        user_id: str,
+        agent_id: str,
+        session_id: str,
+        extra_context: Optional[str],
+        cached_messages_override: Optional[List[Any]],
+        memory_type: Optional[str],
+        memory_metadata: Optional[Dict]
+    ) -> ContextPayload:
+        """读取对话缓存并构建发送给LLM的上下文载体。"""
+        if cached_messages_override is not None:
+            # 外部传入的历史消息在入口统一转换为 Msg，下游不再逐条校验
+            cached_messages = self._to_msgs(cached_messages_override)
+        else:
+            cached_messages = self.conversation_cache.get_recent_messages(
+                user_id,
+                self._max_history
             )
+            # 已淘汰的早期对话以滚动摘要的形式放在历史最前面
+            summary = self.conversation_cache.get_summary(user_id)
+            if summary:
+                cached_messages.insert(0, Msg("system", f"此前对话摘要：{summary}"))
+        return self.context_orchestrator.build_payload(
+            user_id=user_id,
+            agent_id=agent_id,
+            session_id=session_id,
+            user_message=message,
+            cached_messages=cached_messages,
+            extra_context=extra_context,
+            memory_type=memory_type,  # 传递记忆类型
+            memory_metadata=memory_metadata  # 传递记忆元数据
+        )
+    
+    @staticmethod
+    def _to_msgs(messages: List[Any]) -> List[Msg]:
+        """将外部传入的消息（Msg 或 role/content 字典）转换为 Msg 列表，忽略格式错误的消息。"""
+        result = []
+        for message in messages:
+            if isinstance(message, Msg):
+                result.append(message)
+            elif isinstance(message, dict) and isinstance(message.get("content"), str):
+                result.append(Msg(message.get("role") or "system", message["content"]))
+            else:
+                logger.warning("忽略格式错误的历史消息: %s", message)
+        return result
+    
+    def _completion_body(self, messages: List[Msg], stream: bool = False) -> bytes:
+        """构建 chat/completions 请求体（已编码的 JSON 字节）。
+        
+        固定字段和每条消息分别缓存编码结果，发送时只做字节拼接。
+        """
+        return (
+            _encode_body_prefix(self._llm_model, stream)
+            + b",".join([_encode_message(msg.role, msg.content) for msg in messages])
+            + b"]}"
+        )
+    
+    def _stream_llm(self, messages: List[Msg]) -> Generator[str, None, None]:
+        """以流式方式调用LLM，逐个产出回复片段。
+        
+        与 ``_call_llm`` 不同，异常直接抛给调用方，由 ``generate_response_stream`` 统一处理。
+        
+        Args:
+            messages: Msg 消息列表
             
-            # 返回生成的回复内容
-            return response.choices[0].message.content
+        Yields:
+            大语言模型生成的回复片段
+        """
+        with self._llm_slots:
+            response = self._send_llm_request(messages, stream=True)
+            try:
+                # 解析 OpenAI 兼容的 SSE 流：每行 "data: {...}"，以 "data: [DONE]" 结束
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices")
+                    if not choices:
+                        continue
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+            finally:
+                response.close()
+    
+    def _send_llm_request(self, messages: List[Msg], stream: bool = False) -> "httpx.Response":
+        """发送 chat/completions 请求，遇到 429/503 或传输错误时指数退避后重试。
+        
+        等待时间优先遵循响应的 Retry-After，否则为 ``backoff_base * 2^n`` 并加随机抖动。
+        
+        Args:
+            messages: Msg 消息列表
+            stream: 是否以流式方式读取响应
+            
+        Returns:
+            状态码正常的响应；流式响应需由调用方关闭
+            
+        Raises:
+            httpx.HTTPStatusError: 重试耗尽或遇到其他错误状态码时抛出
+            httpx.TransportError: 传输错误重试耗尽时抛出
+        """
+        import httpx
+        
+        client = self.llm_client
+        request = client.build_request(
+            "POST",
+            "chat/completions",
+            content=self._completion_body(messages, stream=stream),
+            headers=_JSON_HEADERS
+        )
+        attempt = 0
+        while True:
+            try:
+                response = client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                # 连接失败、超时等瞬时传输错误与限流同样退避重试
+                if attempt >= self._throttle_retries:
+                    raise
+                delay = self._retry_delay(None, attempt)
+                attempt += 1
+                logger.warning("LLM请求失败(%s)，%.2f秒后第%d次重试", e.__class__.__name__, delay, attempt)
+                time.sleep(delay)
+                continue
+            if response.status_code in _RETRYABLE_STATUS and attempt < self._throttle_retries:
+                delay = self._retry_delay(response, attempt)
+                response.close()
+                attempt += 1
+                logger.warning("LLM服务限流(%d)，%.2f秒后第%d次重试", response.status_code, delay, attempt)
+                time.sleep(delay)
+                continue
+            try:
+                response.raise_for_status()
+            except Exception:
+                response.close()
+                raise
+            return response
+    
+    def _retry_delay(self, response: Optional["httpx.Response"], attempt: int) -> float:
+        """计算第 attempt 次重试前的等待时间（秒）；response 为 None 表示传输错误。"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self._backoff_max)
+            except ValueError:
+                pass  # HTTP 日期格式的 Retry-After 按指数退避处理
+        return min(self._backoff_base * (2 ** attempt) * random.uniform(0.5, 1.5), self._backoff_max)
+    
+    def _call_llm(self, messages: List[Msg]) -> str:
+        """调用LLM生成回复。
+        
+        消息格式由 ``ContextOrchestrator.build_payload`` 保证，这里不再逐条校验和复制。
+        
+        Args:
+            messages: Msg 消息列表
+            
+        Returns:
+            大语言模型生成的回复内容
+        """
+        try:
+            # 调试信息合并为一条日志，且仅在开启 DEBUG 时才格式化
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "输入_call_llm的消息数量: %d\n%s",
+                    len(messages),
+                    "\n".join(
+                        f"消息 {i}: role={msg.role}, content长度={len(msg.content)}"
+                        for i, msg in enumerate(messages)
+                    )
+                )
+            
+            # 调用大语言模型生成回复（受并发上限约束，限流时自动退避重试）
+            with self._llm_slots:
+                response = self._send_llm_request(messages)
+            
+            # 返回生成的回复内容；仅有工具调用或被过滤时 content 为 null，按空回复处理
+            return response.json()["choices"][0]["message"]["content"] or ""
             
         except Exception as e:
-            # 捕获并打印详细错误信息
-            print(f"调用LLM时发生异常: {str(e)}")
-            import traceback
-            print(f"异常堆栈: {traceback.format_exc()}")
+            # 记录详细错误信息（堆栈由日志模块统一格式化）
+            logger.exception("调用LLM时发生异常: %s", e)
             # 尝试返回一个简单的错误响应
             return f"生成回复时发生错误: {str(e)}"
     
@@ -242,6 +559,8 @@ class ChatEngine:
         2. 将交互内容存储到长期记忆
         3. 根据记忆类型和元数据进行分类存储
         
+        对话缓存同步更新，保证下一轮可见；长期记忆写入提交到后台线程池，不阻塞回复。
+        
         Args:
             user_message: 用户消息
             assistant_response: 助手回复
@@ -262,40 +581,116 @@ class ChatEngine:
             # 添加到对话缓存
             self.conversation_cache.add_message(user_id, user_msg)
             self.conversation_cache.add_message(user_id, assistant_msg)
+            # 旧消息攒满一批后在后台合并进滚动摘要
+            if self.conversation_cache.needs_compaction(user_id):
+                self._run_in_background(self._compact_history, user_id)
         
         # 存储到长期记忆
         if store_memory:
-            # 根据不同的记忆类型进行分类存储
+            # 先确定分类参数，再统一调用一次存储：
+            # 专家记忆需带元数据；项目记忆的代理ID固定为project_brain；其余按普通用户记忆存储
             if memory_type == "expert" and memory_metadata:
-                """专家记忆：存储专家代理的交互内容"""
-                self.memory_manager.store_memory(
-                    content=f"用户提问: {user_message}\n专家回复: {assistant_response}",
-                    user_id=user_id,
-                    agent_id=agent_id,
-                    session_id=session_id,
-                    memory_type=memory_type,
-                    metadata=memory_metadata
-                )
+                reply_label, effective_agent, effective_type = "专家回复", agent_id, memory_type
             elif memory_type == "project":
-                """项目记忆：存储项目相关的交互内容"""
-                self.memory_manager.store_memory(
-                    content=f"用户提问: {user_message}\n系统回复: {assistant_response}",
-                    user_id=user_id,
-                    agent_id="project_brain",  # 项目记忆的代理ID固定为project_brain
-                    session_id=session_id,
-                    memory_type=memory_type,
-                    metadata=memory_metadata or {}
-                )
+                reply_label, effective_agent, effective_type = "系统回复", "project_brain", memory_type
             else:
-                """默认用户记忆：存储普通用户交互内容"""
-                self.memory_manager.store_memory(
-                    content=f"用户提问: {user_message}\n系统回复: {assistant_response}",
-                    user_id=user_id,
-                    agent_id=agent_id,
-                    session_id=session_id,
-                    memory_type="user",  # 默认记忆类型为user
-                    metadata={}
-                )
+                reply_label, effective_agent, effective_type = "系统回复", agent_id, "user"
+                memory_metadata = None
+            
+            self.submit_memory_write(
+                content=f"用户提问: {user_message}\n{reply_label}: {assistant_response}",
+                user_id=user_id,
+                agent_id=effective_agent,
+                session_id=session_id,
+                memory_type=effective_type,
+                metadata=memory_metadata or {}
+            )
+    
+    def submit_memory_write(self, **kwargs):
+        """提交一次长期记忆写入。
+        
+        启用异步写入时提交到后台线程池并立即返回，否则同步写入。
+        参数与 MemoryManager.store_memory 相同。
+        """
+        self._run_in_background(self.memory_manager.store_memory, **kwargs)
+    
+    def _run_in_background(self, fn: Callable[..., Any], *args, **kwargs):
+        """在后台写入线程池中执行任务；未启用异步写入或线程池已关闭时同步执行。"""
+        if self._write_pool is None:
+            fn(*args, **kwargs)
+            return
+        try:
+            future = self._write_pool.submit(fn, *args, **kwargs)
+        except RuntimeError:
+            # 线程池已关闭（进程退出阶段），退化为同步执行
+            fn(*args, **kwargs)
+            return
+        with self._pending_lock:
+            self._pending_writes.add(future)
+        future.add_done_callback(self._on_write_done)
+    
+    def _on_write_done(self, future: Future):
+        """后台任务完成回调：移出待完成集合并记录异常。"""
+        with self._pending_lock:
+            self._pending_writes.discard(future)
+        if future.exception() is not None:
+            logger.error("后台记忆写入失败: %s", future.exception())
+    
+    def _compact_history(self, user_id: str):
+        """把用户已淘汰的旧消息增量合并进滚动摘要，失败时保留消息等待下次压缩。"""
+        try:
+            if self.conversation_cache.compact(user_id, self._summarize_history):
+                logger.debug("用户 %s 的对话历史已增量压缩", user_id)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("对话历史压缩失败 (%s): %s", user_id, exc)
+    
+    def _summarize_history(self, previous_summary: Optional[str], messages: List[Msg]) -> str:
+        """以上一次的摘要为基础，合并一批新淘汰的消息，生成新的滚动摘要。
+        
+        Args:
+            previous_summary: 上一次的摘要，首次压缩时为None
+            messages: 本批新淘汰的消息
+            
+        Returns:
+            新摘要文本
+        """
+        dialogue = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+        prompt = (
+            f"[已有摘要]\n{previous_summary or '无'}\n\n"
+            f"[新增对话]\n{dialogue}\n\n"
+            "请在已有摘要的基础上合并新增对话，保留用户目标、关键事实、已做出的决定和待办事项，"
+            "输出一段不超过300字的中文摘要，不要添加其他内容。"
+        )
+        with self._llm_slots:
+            response = self._send_llm_request([
+                Msg("system", "你负责压缩对话历史，只输出摘要本身。"),
+                Msg("user", prompt)
+            ])
+        summary = (response.json()["choices"][0]["message"]["content"] or "").strip()
+        if not summary:
+            raise ValueError("LLM 返回了空摘要")
+        return summary
+    
+    def flush_memory_writes(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的后台记忆写入完成。
+        
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待
+            
+        Returns:
+            全部写入在超时前完成时返回True
+        """
+        with self._pending_lock:
+            pending = list(self._pending_writes)
+        if not pending:
+            return True
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+    
+    def shutdown(self):
+        """排空后台记忆写入并关闭线程池，可重复调用。"""
+        if self._write_pool is not None:
+            self._write_pool.shutdown(wait=True)
     
     def clear_conversation_cache(self, user_id: str):
         """清空指定用户的对话缓存。
@@ -304,7 +699,31 @@ class ChatEngine:
             user_id: 用户ID
         """
         self.conversation_cache.clear(user_id)
-        logger.info(f"用户 {user_id} 的对话缓存已清空")
+        self._bump_history_generation(user_id)
+        # 同时作废该用户的记忆检索缓存，之后的对话重新从向量库检索
+        self.memory_manager.invalidate_user_cache(user_id)
+        logger.info("用户 %s 的对话缓存已清空", user_id)
+    
+    def history_generation(self, user_id: str) -> int:
+        """返回用户对话历史的代数，历史被清空或淘汰后递增。
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            当前代数
+        """
+        return self._history_generations.get(user_id, 0)
+    
+    def _bump_history_generation(self, user_id: str):
+        """用户对话历史被丢弃，递增其代数。"""
+        with self._generation_lock:
+            self._history_generations[user_id] = self._history_generations.get(user_id, 0) + 1
+    
+    def _on_conversation_evicted(self, user_id: str):
+        """对话缓存按 LRU 淘汰某个用户时的回调；长期记忆不受影响，下次对话从记忆中恢复上下文。"""
+        self._bump_history_generation(user_id)
+        logger.debug("用户 %s 的对话缓存已被淘汰", user_id)
     
     def get_conversation_stats(self, user_id: str) -> Dict[str, any]:
         """获取指定用户的对话统计信息。
@@ -316,4 +735,4 @@ class ChatEngine:
             包含对话统计信息的字典
         """
         # 获取对话统计并转换为字典格式返回
-        return self.conversation_cache.get_stats(user_id).__dict__
\ No newline at end of file
+        return self.conversation_cache.get_stats(user_id).to_dict()
\ No newline at end of file
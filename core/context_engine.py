@@ -4,12 +4,119 @@
 上下文编排器：负责将长期记忆、协作代理洞见以及近期对话组合成统一提示。
 """
 
-from typing import List, Dict, Optional
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, NamedTuple, Optional, Tuple
 
-from config.settings import Config
-from models.data_models import ContextPayload
+from config.settings import AgentProfile, Config
+from models.data_models import ContextPayload, Msg, estimate_tokens
 from core.memory_manager import MemoryManager
 
+logger = logging.getLogger(__name__)
+
+# 系统提示中代理的默认角色与未配置代理的通用指令
+_DEFAULT_AGENT_ROLE = "智能助手"
+_DEFAULT_AGENT_INSTRUCTION = "你是一个专业的AI助手，帮助用户解决问题。"
+
+
+# 各专家领域的回复准则，键为领域关键字（小写）
+_DOMAIN_GUIDELINES: Dict[str, Tuple[str, ...]] = {
+    "product": (
+        "\n## 回复准则",
+        "- 注重用户体验和产品价值",
+        "- 提供具体、可落地的产品建议",
+        "- 考虑市场和商业价值",
+    ),
+    "algorithm": (
+        "\n## 回复准则",
+        "- 注重算法的可行性和效率",
+        "- 提供技术细节和实现思路",
+        "- 考虑计算资源和性能优化",
+    ),
+    "architecture": (
+        "\n## 回复准则",
+        "- 注重系统的可扩展性和稳定性",
+        "- 提供整体架构设计和组件划分",
+        "- 考虑技术栈选型和集成方案",
+    ),
+}
+
+# 按记忆类型追加的记忆访问说明
+_MEMORY_ACCESS_BLOCKS: Dict[str, Tuple[str, ...]] = {
+    "expert": ("\n## 记忆访问", "你可以访问特定领域的专家记忆，这些记忆可以帮助你提供更专业的回答。"),
+    "project": ("\n## 记忆访问", "你可以访问项目相关记忆，了解项目历史和上下文。"),
+}
+
+# 通用回复格式要求，所有系统提示都以此结尾
+_REPLY_FORMAT_BLOCK: Tuple[str, ...] = ("\n## 回复格式", "请提供结构化、条理清晰的回复，使用适当的标题和列表。")
+
+# 领域关键字编译为单个正则，一次扫描即可定位命中的领域，关键字增多时无需逐个子串查找
+_DOMAIN_RE = re.compile("|".join(map(re.escape, _DOMAIN_GUIDELINES)), re.IGNORECASE)
+
+
+class ResolvedProfile(NamedTuple):
+    """预先解析好的代理配置，构建上下文时按字段直接读取。"""
+    profile: Optional[AgentProfile]   # 代理画像，未配置的代理为 None
+    collaborators: Tuple[str, ...]    # 按 max_collaborators 截断后的协作代理
+    sibling_agents: Tuple[str, ...]   # 除自身外的全部已配置代理（项目大脑的协作范围）
+
+
+@lru_cache(maxsize=128)
+def _resolve_agent_profile(agent_id: str, max_collaborators: int = 0) -> ResolvedProfile:
+    """解析并缓存代理配置；代理画像只读，结果在进程内保持不变。
+    
+    Args:
+        agent_id: 代理ID
+        max_collaborators: 协作代理数量上限，<=0 表示不限制
+        
+    Returns:
+        ResolvedProfile 实例
+    """
+    profile = Config.AGENT_PROFILES.get(agent_id)
+    collaborators = profile.collaborators if profile else ()
+    if max_collaborators > 0:
+        collaborators = collaborators[:max_collaborators]
+    siblings = tuple(agent for agent in Config.AGENT_PROFILES if agent != agent_id)
+    return ResolvedProfile(profile, collaborators, siblings)
+
+
+@lru_cache(maxsize=256)
+def _build_system_prompt(agent_id: str, expert_domain: Optional[str], memory_type: Optional[str]) -> str:
+    """按 (代理ID, 专家领域, 记忆类型) 生成系统提示并缓存。
+    
+    结果只依赖这三个参数和只读的代理配置；每轮发送完全相同的字节，也便于 LLM 服务端命中前缀缓存。
+    
+    Args:
+        agent_id: 智能体ID
+        expert_domain: 专家领域
+        memory_type: 记忆元数据中的记忆类型
+        
+    Returns:
+        系统提示字符串
+    """
+    agent_config = Config.AGENT_PROFILES.get(agent_id)
+    
+    # 基本信息：未配置的代理使用ID作为名称，并补充通用助手指令
+    agent_name = agent_config.name if agent_config else agent_id
+    system_prompt = [f"你是{agent_name}，{_DEFAULT_AGENT_ROLE}"]
+    if agent_config is None:
+        system_prompt.append(_DEFAULT_AGENT_INSTRUCTION)
+    
+    # 添加专家领域相关信息，并按专家类型追加回复准则（取领域名中最先出现的领域关键字）
+    if expert_domain:
+        system_prompt.extend(("\n## 专业领域", f"你专注于{expert_domain}领域的专业知识。"))
+        match = _DOMAIN_RE.search(expert_domain)
+        if match:
+            system_prompt.extend(_DOMAIN_GUIDELINES[match.group(0).lower()])
+    
+    # 添加记忆相关信息与通用回复格式要求
+    system_prompt.extend(_MEMORY_ACCESS_BLOCKS.get(memory_type, ()))
+    system_prompt.extend(_REPLY_FORMAT_BLOCK)
+    
+    return "\n".join(system_prompt)
+
 
 class ContextOrchestrator:
     """负责上下文工程的核心类。"""
@@ -20,11 +127,18 @@ class ContextOrchestrator:
             "max_history_messages",
             Config.CONVERSATION_CACHE_SIZE
         )
+        # 历史消息的 token 预算，None 表示只按条数裁剪
+        self.max_history_tokens = Config.CONTEXT_PIPELINE.get("max_history_tokens")
         self.include_summary = Config.CONTEXT_PIPELINE.get(
             "include_dialogue_summary",
             True
         )
         self.max_collaborators = Config.CONTEXT_PIPELINE.get("max_collaborators", 0)
+        # 记忆检索线程池：用户记忆、专家/项目记忆、协作上下文并发检索
+        self._retrieval_pool = ThreadPoolExecutor(
+            max_workers=Config.CONTEXT_PIPELINE.get("retrieval_workers", 8),
+            thread_name_prefix="context-retrieval"
+        )
     
     def build_payload(
         self,
@@ -32,7 +146,7 @@ class ContextOrchestrator:
         agent_id: str,
         session_id: str,
         user_message: str,
-        cached_messages: List[Dict[str, str]],
+        cached_messages: List[Msg],
         extra_context: Optional[str] = None,
         memory_type: Optional[str] = None,  # 新增参数
         memory_metadata: Optional[Dict] = None,  # 新增参数
@@ -56,12 +170,7 @@ class ContextOrchestrator:
             上下文载体对象
         """
         try:
-            # 打印调试信息
-            print(f"调试 - 构建上下文: agent_id={agent_id}, memory_type={memory_type}")
-            
-            # 获取代理配置以确定专家领域
-            agent_config = self._get_agent_config(agent_id)
-            expert_domain = expert_domain or agent_config.get("domain")
+            logger.debug("构建上下文: agent_id=%s, memory_type=%s", agent_id, memory_type)
             
             # 构建系统提示
             system_prompt = self._compose_system_prompt(
@@ -72,50 +181,31 @@ class ContextOrchestrator:
                 memory_metadata=memory_metadata
             )
             
-            # 获取代理配置
-            agent_profile = Config.AGENT_PROFILES.get(agent_id, {"name": agent_id})
-            expert_domain = expert_domain or agent_profile.get("expert_domain")
-            collaborators = agent_profile.get("collaborators", [])
-            
-            if self.max_collaborators > 0:
-                collaborators = collaborators[: self.max_collaborators]
-            
-            # 组合记忆上下文
-            memory_context = ""
-            
-            # 获取用户记忆上下文
-            user_memory_context = self._get_user_memory_context(user_id, user_message)
-            if user_memory_context:
-                memory_context += f"用户记忆信息:\n{user_memory_context}\n\n"
+            # 获取预解析的代理配置（代理画像不含专家领域字段，expert_domain 仅来自调用方）
+            resolved = _resolve_agent_profile(agent_id, self.max_collaborators)
+            # 项目大脑与除自身外的全部代理协作，其余代理使用配置的协作链路
+            is_project_brain = agent_id == "project_brain"
+            collaborators = list(resolved.sibling_agents if is_project_brain else resolved.collaborators)
             
-            # 根据记忆类型获取不同的记忆上下文
+            # 用户记忆与专家/项目记忆合并为一次检索（查询只向量化一次），与协作上下文检索并发执行
+            pool = self._retrieval_pool
+            scopes = {"user": {"memory_type": "user"}}
+            scoped_label = ""
             if memory_type == "expert" and expert_domain:
-                # 获取专家特定记忆
-                expert_memory_context = self._get_expert_memory_context(
-                    user_id=user_id,
-                    agent_id=agent_id,
-                    query=user_message,
-                    expert_domain=expert_domain,
-                    memory_metadata=memory_metadata
-                )
-                if expert_memory_context:
-                    memory_context += f"专家领域相关记忆:\n{expert_memory_context}\n\n"
+                # 专家特定记忆
+                scopes["scoped"] = {"memory_type": "expert", "agent_id": agent_id, "expert_domain": expert_domain}
+                scoped_label = "专家领域相关记忆"
             elif memory_type == "project":
-                # 获取项目记忆
-                project_memory_context = self._get_project_memory_context(
-                    user_id=user_id,
-                    session_id=session_id,
-                    query=user_message
-                )
-                if project_memory_context:
-                    memory_context += f"项目相关记忆:\n{project_memory_context}\n\n"
+                # 项目记忆
+                scopes["scoped"] = {"memory_type": "project", "agent_id": "project_brain"}
+                scoped_label = "项目相关记忆"
+            memory_future = pool.submit(self._get_memory_contexts, user_id, user_message, scopes)
             
             # 获取协作上下文（仅对项目大脑）
-            collaborative_context = ""
-            if agent_id == "project_brain":
-                collaborators = [agent for agent in Config.AGENT_PROFILES.keys() 
-                               if agent != "project_brain"]
-                collaborative_context = self._get_collaborative_context(
+            collaborative_future = None
+            if is_project_brain:
+                collaborative_future = pool.submit(
+                    self._get_collaborative_context,
                     query=user_message,
                     user_id=user_id,
                     agent_id=agent_id,
@@ -124,74 +214,60 @@ class ContextOrchestrator:
                     expert_domain=expert_domain
                 )
             
-            # 裁剪对话历史并验证消息格式
-            trimmed_history = self._trim_history(cached_messages)
-            
-            # 构建消息列表
-            messages = []
-            
-            # 系统提示消息
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
+            # 组合记忆上下文：先收集 (标题, 内容) 块，最后一次性拼接
+            memory_blocks = []
             
-            # 如果有记忆上下文，添加到消息中
-            if memory_context:
-                messages.append({"role": "system", "content": f"<记忆上下文>\n{memory_context}</记忆上下文>"})
+            memory_contexts = memory_future.result()
+            if memory_contexts.get("user"):
+                memory_blocks.append(("用户记忆信息", memory_contexts["user"]))
+            if memory_contexts.get("scoped"):
+                memory_blocks.append((scoped_label, memory_contexts["scoped"]))
             
-            # 如果有协作上下文，添加到消息中
-            if collaborative_context:
-                messages.append({"role": "system", "content": f"<协作上下文>\n{collaborative_context}</协作上下文>"})
+            memory_context = "".join([f"{title}:\n{body}\n\n" for title, body in memory_blocks])
             
-            # 添加额外上下文
-            if extra_context:
-                messages.append({"role": "system", "content": extra_context})
+            collaborative_context = collaborative_future.result() if collaborative_future is not None else ""
             
-            # 添加裁剪后的历史消息（确保每条消息都有role字段）
-            for msg in trimmed_history:
-                if isinstance(msg, dict) and 'role' in msg and 'content' in msg:
-                    messages.append(msg)
-                else:
-                    print(f"警告 - 忽略格式错误的历史消息: {msg}")
-            
-            # 添加用户当前消息
-            messages.append({"role": "user", "content": user_message})
-            
-            # 验证所有消息格式
-            for i, msg in enumerate(messages):
-                if not isinstance(msg, dict):
-                    print(f"严重错误 - 消息 {i} 不是字典类型: {type(msg)}")
-                    # 替换为有效的消息
-                    messages[i] = {"role": "system", "content": str(msg)}
-                elif 'role' not in msg:
-                    print(f"严重错误 - 消息 {i} 缺少'role'字段: {msg}")
-                    # 修复消息
-                    messages[i] = {"role": "system", "content": msg.get('content', '')}
-                elif 'content' not in msg:
-                    print(f"严重错误 - 消息 {i} 缺少'content'字段: {msg}")
-                    # 修复消息
-                    messages[i]['content'] = ''
+            # 按条数与 token 预算裁剪对话历史
+            trimmed_history = self._trim_history(cached_messages)
             
-            print(f"调试 - 最终消息数量: {len(messages)}")
+            # 所有系统内容合并为一条系统消息：不变的系统提示在前，记忆/协作/额外上下文在后，
+            # 使每轮请求的前缀保持一致，便于 LLM 服务端命中前缀缓存；相同的相邻片段只保留一份
+            system_parts = []
+            for part in (
+                system_prompt,
+                f"<记忆上下文>\n{memory_context}</记忆上下文>" if memory_context else None,
+                f"<协作上下文>\n{collaborative_context}</协作上下文>" if collaborative_context else None,
+                extra_context
+            ):
+                if part and (not system_parts or system_parts[-1] != part):
+                    system_parts.append(part)
+            if logger.isEnabledFor(logging.DEBUG) and system_prompt:
+                logger.debug("系统提示前缀哈希: %016x", hash(system_prompt) & 0xFFFFFFFFFFFFFFFF)
+            
+            messages = [Msg("system", "\n\n".join(system_parts))] if system_parts else []
+            messages.extend(trimmed_history)
+            messages.append(Msg("user", user_message))
+            
+            # 系统/用户消息在此构造，历史消息已在裁剪时逐条检查，无需再次校验全部消息
+            logger.debug("最终消息数量: %d", len(messages))
             
             # 创建上下文载体
             return ContextPayload(
                 messages=messages,
                 memory_used=bool(memory_context),
-                memories_count=len(memory_context.split("\n\n")) if memory_context else 0,
+                memories_count=len(memory_blocks),
                 agent_id=agent_id,
                 session_id=session_id,
                 collaborators=collaborators
             )
         except Exception as e:
-            # 捕获所有异常并打印详细信息
-            print(f"构建上下文时发生异常: {str(e)}")
-            import traceback
-            print(f"异常堆栈: {traceback.format_exc()}")
+            # 记录异常及堆栈（堆栈由日志模块统一格式化）
+            logger.exception("构建上下文时发生异常: %s", e)
             
             # 返回一个最小化的有效上下文，以便系统可以继续运行
             minimal_messages = [
-                {"role": "system", "content": f"智能体 {agent_id} 的上下文构建失败，但仍需响应。"},
-                {"role": "user", "content": user_message}
+                Msg("system", f"智能体 {agent_id} 的上下文构建失败，但仍需响应。"),
+                Msg("user", user_message)
             ]
             
             return ContextPayload(
@@ -225,83 +301,37 @@ class ContextOrchestrator:
             系统提示字符串
         """
         try:
-            agent_config = self._get_agent_config(agent_id)
-            
-            # 基本信息 - 使用get方法安全访问字段
-            system_prompt = []
-            # 安全获取name和role字段，提供默认值
-            agent_name = agent_config.get('name', agent_id)
-            agent_role = agent_config.get('role', '智能助手')
-            system_prompt.append(f"你是{agent_name}，{agent_role}")
-            
-            # 安全获取instruction字段
-            if agent_config.get('instruction'):
-                system_prompt.append(agent_config.get('instruction'))
-            
-            # 添加专家领域相关信息
-            if expert_domain:
-                system_prompt.append(f"\n## 专业领域")
-                system_prompt.append(f"你专注于{expert_domain}领域的专业知识。")
-                
-                # 根据专家类型添加特定回复准则
-                if "product" in expert_domain.lower():
-                    system_prompt.append("\n## 回复准则")
-                    system_prompt.append("- 注重用户体验和产品价值")
-                    system_prompt.append("- 提供具体、可落地的产品建议")
-                    system_prompt.append("- 考虑市场和商业价值")
-                elif "algorithm" in expert_domain.lower():
-                    system_prompt.append("\n## 回复准则")
-                    system_prompt.append("- 注重算法的可行性和效率")
-                    system_prompt.append("- 提供技术细节和实现思路")
-                    system_prompt.append("- 考虑计算资源和性能优化")
-                elif "architecture" in expert_domain.lower():
-                    system_prompt.append("\n## 回复准则")
-                    system_prompt.append("- 注重系统的可扩展性和稳定性")
-                    system_prompt.append("- 提供整体架构设计和组件划分")
-                    system_prompt.append("- 考虑技术栈选型和集成方案")
-            
-            # 添加记忆相关信息
-            if memory_metadata:
-                memory_type = memory_metadata.get('memory_type')
-                if memory_type == 'expert':
-                    system_prompt.append("\n## 记忆访问")
-                    system_prompt.append("你可以访问特定领域的专家记忆，这些记忆可以帮助你提供更专业的回答。")
-                elif memory_type == 'project':
-                    system_prompt.append("\n## 记忆访问")
-                    system_prompt.append("你可以访问项目相关记忆，了解项目历史和上下文。")
-            
-            # 添加通用回复格式要求
-            system_prompt.append("\n## 回复格式")
-            system_prompt.append("请提供结构化、条理清晰的回复，使用适当的标题和列表。")
-            
-            return "\n".join(system_prompt)
+            memory_type = memory_metadata.get('memory_type') if memory_metadata else None
+            return _build_system_prompt(agent_id, expert_domain, memory_type)
         except Exception as e:
-            print(f"组合系统提示时发生异常: {str(e)}")
-            import traceback
-            print(f"异常堆栈: {traceback.format_exc()}")
+            logger.exception("组合系统提示时发生异常: %s", e)
             # 返回一个安全的默认系统提示
             return f"你是{agent_id}，一个智能助手。请根据用户的问题提供专业、有用的回答。"
     
-    def _trim_history(self, cached_messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
-        """裁剪对话历史，避免提示超限，并确保每条消息都有'role'字段。"""
+    def _trim_history(self, cached_messages: List[Msg]) -> List[Msg]:
+        """按条数上限与 token 预算裁剪对话历史，避免提示超限。
+        
+        消息均为创建时已校验的 Msg，这里只需截取：先按条数取最近的消息，
+        再从最新一条向前累计 token，超出预算处截断。
+        """
         if self.max_history <= 0:
             trimmed = cached_messages
         else:
             trimmed = cached_messages[-self.max_history :]
         
-        # 确保每条消息都有'role'字段
-        validated_messages = []
-        for message in trimmed:
-            if isinstance(message, dict):
-                if 'role' not in message:
-                    # 为缺少role字段的消息设置默认值
-                    message = message.copy()
-                    message['role'] = 'system'  # 默认设为system角色
-                validated_messages.append(message)
+        budget = self.max_history_tokens
+        if budget is None:
+            return list(trimmed)
         
-        return validated_messages
+        start = len(trimmed)
+        for message in reversed(trimmed):
+            budget -= estimate_tokens(message.content)
+            if budget < 0:
+                break
+            start -= 1
+        return list(trimmed[start:])
     
-    def _summarize_dialogue(self, cached_messages: List[Dict[str, str]]) -> str:
+    def _summarize_dialogue(self, cached_messages: List[Msg]) -> str:
         """将最近对话转换为要点，帮助 LLM 快速把握主题。"""
         if not cached_messages:
             return "暂无历史上下文。"
@@ -309,166 +339,74 @@ class ContextOrchestrator:
         recent = cached_messages[-self.max_history :]
         lines = []
         for message in recent:
-            role = "用户" if message.get("role") == "user" else "助手"
-            content = message.get("content", "").strip()
+            role = "用户" if message.role == "user" else "助手"
+            content = message.content.strip()
             if content:
                 lines.append(f"- {role}: {content}")
         return "\n".join(lines) if lines else "暂无历史上下文。"
     
-    def _get_agent_config(self, agent_id: str) -> Dict[str, str]:
-        """
-        获取代理配置
-        
-        Args:
-            agent_id: 代理ID
-            
-        Returns:
-            代理配置字典
-        """
-        return Config.AGENT_PROFILES.get(agent_id, {
-            "name": agent_id,
-            "role": "智能助手",
-            "instruction": """你是一个专业的AI助手，帮助用户解决问题。"""
-        })
-    
-    def _get_user_memory_context(self, user_id: str, query: str) -> str:
+    def _get_memory_contexts(
+        self,
+        user_id: str,
+        query: str,
+        scopes: Dict[str, Dict[str, str]]
+    ) -> Dict[str, str]:
         """
-        获取用户相关记忆上下文
+        一次检索获取多个范围的记忆并分别格式化
         
         Args:
             user_id: 用户ID
             query: 用户查询
+            scopes: 范围名 -> 过滤条件，"user" 为用户记忆，其余为专家/项目记忆
             
         Returns:
-            格式化的用户记忆上下文字符串
+            范围名 -> 格式化的记忆上下文字符串
         """
         try:
-            # 改回使用search_memories方法
-            user_memories = self.memory_manager.search_memories(
-                user_id=user_id,
+            grouped = self.memory_manager.multi_search(
                 query=query,
-                memory_type="user",
-                limit=Config.MEMORY_SEARCH_LIMIT
+                user_id=user_id,
+                scopes=scopes,
+                limit_per=Config.MEMORY_SEARCH_LIMIT
             )
-            
-            if not user_memories:
-                return ""
-            
-            # 检查user_memories类型并处理
-            memories_to_process = []
-            if isinstance(user_memories, dict):
-                # 如果是字典，提取其值作为记忆列表
-                memories_to_process = list(user_memories.values())
-            elif isinstance(user_memories, list):
-                # 如果是列表，直接使用
-                memories_to_process = user_memories
-            else:
-                # 其他类型，尝试转换为字符串列表
-                try:
-                    memories_to_process = [str(user_memories)]
-                except:
-                    print(f"警告: 无法处理的用户记忆类型: {type(user_memories)}")
-                    return ""
-            
-            # 格式化用户记忆，最多返回3条
-            memory_lines = []
-            for i, memory in enumerate(memories_to_process[:3], 1):  # 最多返回3条
-                # 确保memory是字典类型
-                if isinstance(memory, dict):
-                    content = memory.get('content', '')
-                    timestamp = memory.get('created_at', '')
-                    if content:
-                        memory_lines.append(f"{i}. {content}")
-                        if timestamp:
-                            memory_lines[-1] += f" (时间: {timestamp})"
-                else:
-                    # 如果不是字典，尝试将整个对象作为内容
-                    try:
-                        memory_lines.append(f"{i}. {str(memory)}")
-                    except:
-                        pass
-            
-            return "\n".join(memory_lines)
         except Exception as e:
-            print(f"获取用户记忆上下文时发生异常: {str(e)}")
-            import traceback
-            print(f"异常堆栈: {traceback.format_exc()}")
-            return ""
-    
-    def _get_expert_memory_context(
-        self,
-        user_id: str,
-        agent_id: str,
-        query: str,
-        expert_domain: str,
-        memory_metadata: Optional[Dict] = None
-    ) -> str:
-        """
-        获取专家领域相关记忆上下文
+            logger.exception("获取记忆上下文时发生异常: %s", e)
+            return {}
         
-        Args:
-            user_id: 用户ID
-            agent_id: 智能体ID
-            query: 查询内容
-            expert_domain: 专家领域
-            memory_metadata: 记忆元数据
-            
-        Returns:
-            格式化的专家记忆字符串
-        """
-        expert_memories = self.memory_manager.search_memories(
-            user_id=user_id,
-            query=query,
-            agent_id=agent_id,
-            memory_type="expert",
-            expert_domain=expert_domain,
-            metadata=memory_metadata,
-            limit=Config.MEMORY_SEARCH_LIMIT
-        )
-        
-        if not expert_memories:
-            return ""
-        
-        # 格式化专家记忆
-        memory_lines = []
-        for i, memory in enumerate(expert_memories[:5], 1):  # 最多返回5条
-            content = memory.get('content', '')
-            if content:
-                memory_lines.append(f"{i}. {content}")
-        
-        return "\n".join(memory_lines)
+        contexts = {}
+        for name, memories in grouped.items():
+            if name == "user":
+                # 用户记忆最多3条，附带时间
+                contexts[name] = self._format_memories(memories[:3], with_timestamp=True)
+            else:
+                # 专家/项目记忆最多5条
+                contexts[name] = self._format_memories(memories[:5])
+        return contexts
     
-    def _get_project_memory_context(self, user_id: str, session_id: str, query: str) -> str:
+    @staticmethod
+    def _format_memories(memories: List[Dict], with_timestamp: bool = False) -> str:
         """
-        获取项目相关记忆上下文
+        将记忆结果格式化为编号列表
         
         Args:
-            user_id: 用户ID
-            session_id: 会话ID
-            query: 查询内容
+            memories: 记忆结果列表
+            with_timestamp: 是否附带创建时间
             
         Returns:
-            格式化的项目记忆字符串
+            格式化的记忆字符串
         """
-        project_memories = self.memory_manager.search_memories(
-            user_id=user_id,
-            session_id=session_id,
-            query=query,
-            agent_id="project_brain",
-            memory_type="project",
-            limit=Config.MEMORY_SEARCH_LIMIT
-        )
-        
-        if not project_memories:
-            return ""
-        
-        # 格式化项目记忆
         memory_lines = []
-        for i, memory in enumerate(project_memories[:5], 1):  # 最多返回5条
-            content = memory.get('content', '')
-            if content:
-                memory_lines.append(f"{i}. {content}")
-        
+        for memory in memories:
+            if isinstance(memory, dict):
+                content = memory.get("memory") or memory.get("content", "")
+                timestamp = memory.get("created_at", "") if with_timestamp else ""
+            else:
+                # 如果不是字典，将整个对象作为内容
+                content, timestamp = str(memory), ""
+            if not content:
+                continue
+            line = f"{len(memory_lines) + 1}. {content}"
+            memory_lines.append(f"{line} (时间: {timestamp})" if timestamp else line)
         return "\n".join(memory_lines)
     
     def _get_collaborative_context(
@@ -494,24 +432,16 @@ class ContextOrchestrator:
         Returns:
             格式化的协作上下文字符串
         """
+        # 专家领域过滤由记忆管理器下推到向量检索，这里不再逐行筛选文本
         collaborative_data = self.memory_manager.get_collaborative_context(
             query=query,
             user_id=user_id,
             agent_id=agent_id,
             session_id=session_id,
             collaborators=collaborators,
-            limit=Config.MEMORY_SEARCH_LIMIT
+            limit=Config.MEMORY_SEARCH_LIMIT,
+            expert_domain=expert_domain
         )
         
-        # 如果指定了专家领域，过滤相关记忆
-        if expert_domain and collaborative_data.get('formatted'):
-            # 简单实现：过滤包含专家领域关键词的记忆
-            filtered_lines = []
-            keywords = expert_domain.lower().split()
-            for line in collaborative_data['formatted'].split('\n'):
-                if any(keyword in line.lower() for keyword in keywords):
-                    filtered_lines.append(line)
-            return '\n'.join(filtered_lines)
-        
         return collaborative_data.get('formatted', '')
 
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化请求微批处理
+
+并发的记忆写入/检索各自调用一次向量化接口，耗时主要在网络往返上。
+EmbeddingBatcher 包装 mem0 的 embedder：在很短的时间窗口内把到达的多个
+embed 请求合并成一次 ``input=[...]`` 批量调用，再把结果分发回各调用方；
+同一查询在多路检索中重复出现时，向量由 LRU 缓存直接返回，不再重复请求。
+"""
+# pylint: disable=broad-except
+
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """向量化微批处理器，可直接替换 mem0 Memory 的 ``embedding_model``。
+
+    未实现的属性全部转发给被包装的 embedder，因此对 mem0 透明。
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        max_batch_size: int = 32,
+        window_ms: float = 10.0,
+        cache_size: int = 512,
+        cache_ttl: float = 600.0
+    ):
+        """初始化微批处理器。
+
+        Args:
+            embedder: mem0 的 embedder 实例（需提供 ``embed(text, memory_action)``）
+            max_batch_size: 单次批量调用的最大文本数
+            window_ms: 首个请求到达后等待合并的时间窗口（毫秒）
+            cache_size: 向量缓存条目数，0 表示关闭缓存
+            cache_ttl: 向量缓存有效期（秒）
+        """
+        self._embedder = embedder
+        # (memory_action, 文本摘要) -> 向量；只存摘要，避免缓存长文本
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._max_batch_size = max(1, max_batch_size)
+        self._window = max(0.0, window_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[str, Optional[str], Future]]" = queue.Queue()
+        # 无法等价构造批量请求的 embedder 只使用向量缓存，不启动合并线程
+        self._batch_embed = self._resolve_batch_embed(embedder)
+        if self._batch_embed is None:
+            logger.info("embedder %s 不支持等价的批量调用，关闭向量化合并", type(embedder).__name__)
+        else:
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    def __getattr__(self, name: str) -> Any:
+        # 仅在常规属性查找失败时调用，转发 config 等属性给原 embedder
+        return getattr(self._embedder, name)
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        """提交一条文本并等待其向量，接口与 mem0 embedder 一致。
+
+        Args:
+            text: 待向量化的文本
+            memory_action: mem0 传入的动作类型（add/search/update）
+
+        Returns:
+            文本向量
+        """
+        key = (memory_action, hashlib.sha256(text.encode("utf-8")).digest())
+        vector = self._cache.get(key)
+        if vector is not None:
+            return vector
+        if self._batch_embed is None:
+            vector = self._embedder.embed(text, memory_action)
+        else:
+            future: Future = Future()
+            self._queue.put((text, memory_action, future))
+            vector = future.result()
+        self._cache.set(key, vector)
+        return vector
+
+    def _run(self):
+        """后台线程：收集一个时间窗口内的请求，按 memory_action 分组批量向量化。"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # 不同 memory_action 的请求可能对应不同的任务类型，分组分别调用
+            groups: Dict[Optional[str], List[Tuple[str, Future]]] = {}
+            for text, memory_action, future in batch:
+                groups.setdefault(memory_action, []).append((text, future))
+            for memory_action, items in groups.items():
+                self._dispatch(items, memory_action)
+
+    def _dispatch(self, items: List[Tuple[str, Future]], memory_action: Optional[str]):
+        """执行一组批量向量化并把结果写回各自的 Future，同一批内的重复文本只向量化一次。"""
+        texts = list(dict.fromkeys(text for text, _ in items))
+        try:
+            unique_vectors = self._embed_batch(texts, memory_action)
+            vectors = dict(zip(texts, unique_vectors))
+        except Exception as exc:
+            logger.warning("批量向量化失败，回退为逐条调用: %s", exc)
+            for text, future in items:
+                try:
+                    future.set_result(self._embedder.embed(text, memory_action))
+                except Exception as item_exc:
+                    future.set_exception(item_exc)
+            return
+        for text, future in items:
+            future.set_result(vectors[text])
+
+    def _embed_batch(self, texts: List[str], memory_action: Optional[str]) -> List[List[float]]:
+        """调用底层 embedder 的批量接口。
+
+        Args:
+            texts: 待向量化的文本列表
+            memory_action: mem0 传入的动作类型
+
+        Returns:
+            与 texts 顺序一致的向量列表
+        """
+        if len(texts) == 1:
+            return [self._embedder.embed(texts[0], memory_action)]
+        return self._batch_embed(texts, memory_action)
+
+    @staticmethod
+    def _resolve_batch_embed(embedder: Any) -> Optional[Callable[[List[str], Optional[str]], List[List[float]]]]:
+        """确定与 embedder 单条调用等价的批量调用方式。
+
+        新版 mem0 的 embedder 自带 ``embed_batch``，直接使用；旧版只对已知的 OpenAI /
+        HuggingFace 实现按其 ``embed`` 的参数构造批量请求。无法复现单条调用参数的
+        embedder 返回 None，此时不做批量合并。
+
+        Args:
+            embedder: mem0 的 embedder 实例
+
+        Returns:
+            批量向量化函数 ``(texts, memory_action) -> vectors``，不支持时为 None
+        """
+        embed_batch = getattr(embedder, "embed_batch", None)
+        if callable(embed_batch):
+            return embed_batch
+
+        config = getattr(embedder, "config", None)
+        client = getattr(embedder, "client", None)
+        kind = type(embedder).__name__
+        if config is None:
+            return None
+
+        def create(texts: List[str], **kwargs: Any) -> List[List[float]]:
+            # OpenAI 兼容接口：一次请求传入多条 input，按 index 还原顺序
+            data = sorted(client.embeddings.create(input=texts, **kwargs).data, key=lambda item: item.index)
+            if len(data) != len(texts):
+                raise ValueError(f"向量数量不匹配: {len(data)} != {len(texts)}")
+            return [item.embedding for item in data]
+
+        # 与 mem0 OpenAIEmbedding.embed 一致：替换换行，传 model 与 dimensions
+        if kind == "OpenAIEmbedding" and client is not None:
+            return lambda texts, memory_action: create(
+                [text.replace("\n", " ") for text in texts],
+                model=config.model,
+                dimensions=config.embedding_dims
+            )
+        if kind == "HuggingFaceEmbedding":
+            # TEI 服务：与 HuggingFaceEmbedding.embed 一致，model 缺省为 "tei" 并附带 model_kwargs
+            if getattr(config, "huggingface_base_url", None) and client is not None:
+                model_kwargs = getattr(config, "model_kwargs", None) or {}
+                return lambda texts, memory_action: create(
+                    list(texts), model=getattr(config, "model", None) or "tei", **model_kwargs
+                )
+            # 本地 sentence-transformers 模型：一次 encode 整批文本
+            model = getattr(embedder, "model", None)
+            if model is not None and hasattr(model, "encode"):
+                return lambda texts, memory_action: [
+                    vector.tolist() for vector in model.encode(texts, convert_to_numpy=True)
+                ]
+        return None
+
+def install_embedding_batcher(
+    memory: Any,
+    max_batch_size: int = 32,
+    window_ms: float = 10.0,
+    cache_size: int = 512,
+    cache_ttl: float = 600.0
+) -> bool:
+    """为 mem0 Memory 实例安装向量化微批处理器。
+
+    Args:
+        memory: mem0 Memory 实例
+        max_batch_size: 单次批量调用的最大文本数
+        window_ms: 合并等待窗口（毫秒）
+        cache_size: 向量缓存条目数，0 表示关闭缓存
+        cache_ttl: 向量缓存有效期（秒）
+
+    Returns:
+        是否安装成功
+    """
+    embedder = getattr(memory, "embedding_model", None)
+    if embedder is None or isinstance(embedder, EmbeddingBatcher):
+        return False
+    memory.embedding_model = EmbeddingBatcher(embedder, max_batch_size, window_ms, cache_size, cache_ttl)
+    return True
@@ -5,23 +5,225 @@
 """
 # pylint: disable=broad-except
 
+import hashlib
+import heapq
 import inspect
+import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from mem0 import Memory
-from typing import Dict, List, Any, Optional, Iterable, Tuple
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 from config.settings import Config
+from core.embeddings import install_embedding_batcher
+from models.data_models import MemoryMeta
+from utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+
+def _outage_error_types() -> Tuple[type, ...]:
+    """后端不可用（连接、超时、传输层）时可能抛出的异常类型；未安装的客户端库跳过。"""
+    error_types: List[type] = [ConnectionError, TimeoutError]
+    try:
+        import httpx
+        error_types.append(httpx.TransportError)
+    except ImportError:
+        pass
+    try:
+        import grpc
+        error_types.append(grpc.RpcError)
+    except ImportError:
+        pass
+    try:
+        # Qdrant 客户端把传输层错误包装为 ResponseHandlingException
+        from qdrant_client.http.exceptions import ResponseHandlingException
+        error_types.append(ResponseHandlingException)
+    except ImportError:
+        pass
+    try:
+        # 向量化调用经 OpenAI 兼容客户端，超时错误是 APIConnectionError 的子类
+        from openai import APIConnectionError
+        error_types.append(APIConnectionError)
+    except ImportError:
+        pass
+    return tuple(error_types)
+
+
+# 只有这些异常才视为后端故障并触发熔断冷却；过滤条件非法等确定性错误照常走备选重试
+_BACKEND_OUTAGE_ERRORS = _outage_error_types()
+
+class _AgentMeta(NamedTuple):
+    """代理在记忆系统中的静态属性。"""
+    memory_type: str               # 该代理默认的记忆类型
+    expert_domain: Optional[str]   # 专家领域，非专家代理为 None
+    display_name: str              # 协作上下文中的分组名称
+
+
+# 代理ID -> 记忆属性，导入时构建一次；已配置但未单独列出的代理按无领域专家处理
+_AGENT_META: Dict[str, _AgentMeta] = {
+    agent_id: _AgentMeta("expert", None, "其他专家") for agent_id in Config.AGENT_PROFILES
+}
+_AGENT_META.update({
+    "project_brain": _AgentMeta("project", None, "项目大脑"),
+    "product_lead": _AgentMeta("expert", "product", "产品专家"),
+    "algo_scientist": _AgentMeta("expert", "algorithm", "算法专家"),
+    "solution_architect": _AgentMeta("expert", "architecture", "架构师"),
+})
+# 未配置的代理（含用户级存储）的默认属性
+_DEFAULT_AGENT_META = _AgentMeta("user", None, "其他专家")
+
+# 协作记忆分组：领域与分组名称按下标平行存放，无领域的归入末尾的 general
+_DOMAIN_ORDER: Tuple[str, ...] = tuple(dict.fromkeys(
+    meta.expert_domain for meta in _AGENT_META.values() if meta.expert_domain
+)) + ("general",)
+_DOMAIN_NAMES: Tuple[str, ...] = tuple(
+    next((meta.display_name for meta in _AGENT_META.values() if meta.expert_domain == domain), "其他专家")
+    for domain in _DOMAIN_ORDER
+)
+_GENERAL_DOMAIN_INDEX = len(_DOMAIN_ORDER) - 1
+# 代理ID -> 分组下标，未列出的代理归入 general
+_AGENT_DOMAIN_INDEX: Dict[str, int] = {
+    agent_id: _DOMAIN_ORDER.index(meta.expert_domain)
+    for agent_id, meta in _AGENT_META.items() if meta.expert_domain
+}
+
+# 缺少 metadata 时复用的空字典，避免每条记录分配新对象（只读，不可修改）
+_EMPTY: Dict[str, Any] = {}
+
+
+def _entry_text(entry: Dict[str, Any]) -> str:
+    """获取记忆内容，尝试多种可能的字段名。"""
+    return entry.get("memory") or entry.get("content") or entry.get("text") or ""
+
+
+def _content_fingerprint(content: str) -> Any:
+    """记忆内容的去重指纹：折叠空白后，短文本直接使用，长文本取 8 字节 blake2b 摘要。
+    
+    仅空白/换行不同的重复内容得到相同指纹；去重集合的内存占用与内容长度无关。
+    """
+    normalized = " ".join(content.split())
+    if len(normalized) < 128:
+        return normalized
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+def _score_of(entry: Dict[str, Any]) -> float:
+    """排序用的相关度，缺失或非数值时视为 0。"""
+    score = entry.get("score")
+    return score if isinstance(score, (int, float)) else 0.0
+
+
+@lru_cache(maxsize=256)
+def _scored_entry_head(memory_type: Any, has_score: bool) -> str:
+    """带类型标签的行首，按 (memory_type, 是否有相关度) 缓存。"""
+    type_tag = f"[{memory_type}]" if memory_type != "general" else ""
+    return f"- {type_tag}{' ' if type_tag and has_score else ''}"
+
+
+def _render_scored_entry(entry: Dict[str, Any], memory_text: str) -> str:
+    """渲染带类型与相关度标签的记忆行。"""
+    memory_type = (entry.get("metadata") or _EMPTY).get("memory_type", "general")
+    score = entry.get("score", "")
+    score_tag = f"[相关度: {score:.2f}]" if score and isinstance(score, (int, float)) else ""
+    try:
+        head = _scored_entry_head(memory_type, bool(score_tag))
+    except TypeError:
+        # 元数据值不可哈希时不走缓存
+        head = _scored_entry_head.__wrapped__(memory_type, bool(score_tag))
+    return f"{head}{score_tag} {memory_text}"
+
+
+@lru_cache(maxsize=4096)
+def _tagged_entry_prefix(memory_type: Any, agent_info: Any, domain_info: Any) -> str:
+    """类型、代理、领域标签组成的行首；同一批记录的元数据组合很少，按组合缓存。"""
+    tags = ", ".join(filter(None, (
+        memory_type if memory_type != "general" else "",
+        f"agent:{agent_info}" if agent_info else "",
+        f"domain:{domain_info}" if domain_info else "",
+    )))
+    return f"- [{tags}] " if tags else "-  "
+
+
+def _render_tagged_entry(entry: Dict[str, Any]) -> str:
+    """渲染带类型、代理与领域标签的记忆行。"""
+    metadata = entry.get("metadata") or _EMPTY
+    key = (
+        metadata.get("memory_type", "general"),
+        metadata.get("agent_id", ""),
+        metadata.get("expert_domain", ""),
+    )
+    try:
+        prefix = _tagged_entry_prefix(*key)
+    except TypeError:
+        # 元数据值不可哈希时不走缓存
+        prefix = _tagged_entry_prefix.__wrapped__(*key)
+    return prefix + _entry_text(entry)
+
+
 class MemoryManager:
     """记忆系统管理器"""
     
     def __init__(self):
-        self.memory = self._initialize_memory()
-        self.capabilities = self._detect_capabilities()
+        # mem0 实例与能力探测延迟到首次使用时构建，不使用记忆的进程无需承担初始化开销
+        self._memory: Optional[Memory] = None
+        self._capabilities: Optional[Dict[str, bool]] = None
+        self._init_lock = threading.Lock()
+        # 组合协作上下文时的多路检索线程池；检索以网络/向量化等待为主，线程即可并发
+        self._search_pool = ThreadPoolExecutor(
+            max_workers=Config.MEMORY_SEARCH_WORKERS,
+            thread_name_prefix="memory-search"
+        )
+        # 简易熔断：读、写路径各自记录后端最近一次失败的时间戳，冷却期内跳过备选重试，避免超时叠加；
+        # 检索失败不影响写入
+        self._failure_ts = {"read": 0.0, "write": 0.0}
+        self._cooldown = Config.MEMORY_BACKEND_COOLDOWN
+        # 空范围索引：范围键 -> 检索开始时该用户的写入代数；用户每次写入代数递增，旧记录随之失效
+        scope_config = Config.MEMORY_EMPTY_SCOPE_INDEX
+        self._empty_scopes = TTLCache(
+            maxsize=scope_config.get("size", 1024) if scope_config.get("enabled", False) else 0,
+            ttl=scope_config.get("ttl", 60)
+        )
+        # 格式化记忆上下文缓存，键中包含用户写入代数，写入后旧条目不再命中
+        context_cache_config = Config.MEMORY_CONTEXT_CACHE
+        self._context_cache = TTLCache(
+            maxsize=context_cache_config.get("size", 256),
+            ttl=context_cache_config.get("ttl", 30)
+        )
+        # 检索结果缓存：连续轮次检索相同范围时不再访问向量库，键同样包含写入代数
+        retrieval_cache_config = Config.MEMORY_RETRIEVAL_CACHE
+        self._retrieval_cache = TTLCache(
+            maxsize=retrieval_cache_config.get("size", 512),
+            ttl=retrieval_cache_config.get("ttl", 30)
+        )
+        self._write_generations: Dict[str, int] = {}
+        self._generation_lock = threading.Lock()
         logger.info("记忆管理器初始化成功")
     
+    @property
+    def memory(self) -> Memory:
+        """mem0 实例，首次访问时初始化（线程安全），同时安装向量化批处理并探测能力。"""
+        if self._memory is None:
+            with self._init_lock:
+                if self._memory is None:
+                    memory = self._initialize_memory()
+                    self._install_embedding_batcher(memory)
+                    self._enable_vector_quantization(memory)
+                    self._capabilities = self._detect_capabilities(memory)
+                    # 最后发布实例：其他线程看到 memory 时能力探测已完成
+                    self._memory = memory
+        return self._memory
+    
+    @property
+    def capabilities(self) -> Dict[str, bool]:
+        """当前 mem0 版本支持的关键字参数，随 memory 一起延迟探测。"""
+        if self._capabilities is None:
+            self.memory  # noqa: B018 - 触发延迟初始化
+        return self._capabilities
+    
     def _initialize_memory(self) -> Memory:
         """初始化记忆系统"""
         try:
@@ -31,25 +233,132 @@ class MemoryManager:
             logger.error("记忆系统初始化失败: %s", exc)
             raise
     
-    def _detect_capabilities(self) -> Dict[str, bool]:
-        """探测当前 mem0 版本是否支持 agent/session 关键字。"""
+    def _install_embedding_batcher(self, memory: Memory):
+        """按配置为 mem0 的 embedder 启用微批处理与向量缓存，合并并发、去除重复的向量化请求。"""
+        batch_config = Config.EMBEDDING_BATCH
+        if not batch_config.get("enabled", False):
+            return
+        try:
+            if install_embedding_batcher(
+                memory,
+                max_batch_size=batch_config.get("max_batch_size", 32),
+                window_ms=batch_config.get("window_ms", 10),
+                cache_size=batch_config.get("cache_size", 512),
+                cache_ttl=batch_config.get("cache_ttl", 600)
+            ):
+                logger.info("向量化微批处理已启用")
+        except Exception as exc:  # noqa: BLE001 - 安装失败时保持原 embedder
+            logger.warning("向量化微批处理启用失败，使用原始 embedder: %s", exc)
+    
+    def _enable_vector_quantization(self, memory: Memory):
+        """为 Qdrant 集合开启 int8 标量量化，向量内存占用约为 float32 的 1/4。
+        
+        量化与重打分由 Qdrant 在服务端完成，写入与检索接口不变；非 Qdrant 后端或已开启时跳过。
+        """
+        quant_config = Config.VECTOR_QUANTIZATION
+        if not quant_config.get("enabled", False) or Config.VECTOR_STORE_CONFIG.get("provider") != "qdrant":
+            return
+        try:
+            from qdrant_client import models as qdrant_models
+        except ImportError:
+            logger.debug("未安装 qdrant_client，跳过向量量化")
+            return
+        try:
+            vector_store = memory.vector_store
+            collection = vector_store.client.get_collection(vector_store.collection_name)
+            if getattr(collection.config, "quantization_config", None) is not None:
+                return
+            vector_store.client.update_collection(
+                collection_name=vector_store.collection_name,
+                quantization_config=qdrant_models.ScalarQuantization(
+                    scalar=qdrant_models.ScalarQuantizationConfig(
+                        type=qdrant_models.ScalarType.INT8,
+                        quantile=quant_config.get("quantile", 0.99),
+                        always_ram=quant_config.get("always_ram", True)
+                    )
+                )
+            )
+            logger.info("向量集合 %s 已开启 int8 标量量化", vector_store.collection_name)
+        except Exception as exc:  # noqa: BLE001 - 量化失败时继续使用原始向量
+            logger.warning("开启向量量化失败，使用原始向量: %s", exc)
+    
+    def _backend_recently_failed(self, kind: str = "read") -> bool:
+        """后端的读（read）或写（write）路径是否仍处于上次失败后的冷却期内。"""
+        return time.monotonic() - self._failure_ts[kind] < self._cooldown
+    
+    def _write_generation(self, user_id: str) -> int:
+        """返回用户当前的写入代数。"""
+        return self._write_generations.get(user_id, 0)
+    
+    def _bump_write_generation(self, user_id: str):
+        """用户记忆发生写入，使该用户已记录的空范围全部失效。"""
+        with self._generation_lock:
+            self._write_generations[user_id] = self._write_generations.get(user_id, 0) + 1
+    
+    def invalidate_user_cache(self, user_id: str):
+        """使该用户的检索结果、上下文与空范围缓存全部失效（如清空对话或切换会话时）。
+        
+        Args:
+            user_id: 用户ID
+        """
+        self._bump_write_generation(user_id)
+    
+    @staticmethod
+    def _query_digest(query: str) -> bytes:
+        """查询文本的短摘要，用作缓存键，避免长查询常驻缓存。"""
+        return hashlib.blake2b(query.encode("utf-8"), digest_size=8).digest()
+    
+    @staticmethod
+    def _copy_results(results: Dict[str, Any]) -> Dict[str, Any]:
+        """返回结果字典及其列表的浅拷贝，调用方修改返回值不会影响缓存。"""
+        return {**results, "results": list(results["results"])}
+    
+    @staticmethod
+    def _scope_key(params: Dict[str, Any]) -> str:
+        """由检索参数（不含查询与数量）生成空范围索引的键。"""
+        scope = {key: value for key, value in params.items() if key not in ("query", "limit")}
+        return json.dumps(scope, sort_keys=True, ensure_ascii=False, default=str)
+    
+    def _record_backend_failure(self, exc: Exception, kind: str = "read") -> bool:
+        """记录一次后端失败；只有连接、超时等传输层错误才会开启冷却期。
+        
+        Args:
+            exc: 本次抛出的异常
+            kind: 失败所在路径，'read' 检索或 'write' 写入
+            
+        Returns:
+            记录前该路径是否已处于冷却期（True 时调用方应跳过备选重试）
+        """
+        if not isinstance(exc, _BACKEND_OUTAGE_ERRORS):
+            return False
+        in_cooldown = self._backend_recently_failed(kind)
+        self._failure_ts[kind] = time.monotonic()
+        return in_cooldown
+    
+    def _detect_capabilities(self, memory: Memory) -> Dict[str, bool]:
+        """探测当前 mem0 版本是否支持 agent/session/filters 关键字，初始化时只做一次签名检查。"""
+        # 每个方法只解析一次签名，再在参数集合上逐项判断
+        search_params = self._parameter_names(memory.search)
+        add_params = self._parameter_names(memory.add)
+        get_all_params = self._parameter_names(memory.get_all)
         return {
-            "search_agent": self._supports_parameter(self.memory.search, "agent_id"),
-            "search_session": self._supports_parameter(self.memory.search, "session_id"),
-            "add_agent": self._supports_parameter(self.memory.add, "agent_id"),
-            "add_session": self._supports_parameter(self.memory.add, "session_id"),
-            "get_all_agent": self._supports_parameter(self.memory.get_all, "agent_id"),
-            "get_all_session": self._supports_parameter(self.memory.get_all, "session_id")
+            "search_agent": "agent_id" in search_params,
+            "search_session": "session_id" in search_params,
+            "add_agent": "agent_id" in add_params,
+            "add_session": "session_id" in add_params,
+            "get_all_agent": "agent_id" in get_all_params,
+            "get_all_session": "session_id" in get_all_params,
+            "search_filters": "filters" in search_params,
+            "get_all_filters": "filters" in get_all_params
         }
     
     @staticmethod
-    def _supports_parameter(method, parameter_name: str) -> bool:
-        """检查方法签名中是否包含指定参数。"""
+    def _parameter_names(method) -> frozenset:
+        """返回方法签名中的参数名集合，无法解析签名时返回空集合。"""
         try:
-            signature = inspect.signature(method)
-            return parameter_name in signature.parameters
+            return frozenset(inspect.signature(method).parameters)
         except (ValueError, TypeError):
-            return False
+            return frozenset()
     
     def search_memories(
         self,
@@ -95,9 +404,19 @@ class MemoryManager:
                 filters["metadata.expert_domain"] = expert_domain
             
             # 添加过滤条件到params（如果支持）
-            if filters and hasattr(self.memory.search, '__code__') and 'filters' in inspect.signature(self.memory.search).parameters:
+            if filters and self.capabilities["search_filters"]:
                 params["filters"] = filters
             
+            # 第一级：已知该范围内没有任何记忆（且此后未写入）时，跳过向量检索
+            scope_key = self._scope_key(params)
+            generation = self._write_generation(user_id)
+            if self._empty_scopes.get(scope_key) == generation:
+                return {"results": []}
+            cache_key = ("search", self._query_digest(query), scope_key, limit, generation)
+            cached = self._retrieval_cache.get(cache_key)
+            if cached is not None:
+                return self._copy_results(cached)
+            
             search_results = self.memory.search(**params)
             
             # 检查返回结果格式，确保它是预期的字典格式
@@ -105,6 +424,10 @@ class MemoryManager:
                 # 确保results键存在且为列表
                 if "results" not in search_results:
                     search_results["results"] = []
+                if not search_results["results"]:
+                    # 未设置相似度阈值时检索为空即范围为空；记录开始时的代数，期间有写入则自动作废
+                    self._empty_scopes.set(scope_key, generation)
+                self._retrieval_cache.set(cache_key, self._copy_results(search_results))
                 return search_results
             else:
                 # 如果返回格式不是字典，转换为标准格式
@@ -116,6 +439,9 @@ class MemoryManager:
                 
         except Exception as exc:  # noqa: BLE001
             logger.error("记忆搜索失败: %s", exc)
+            if self._record_backend_failure(exc):
+                # 后端刚失败过，不再重试备选检索
+                return {"results": []}
             # 尝试使用备选搜索方法或参数
             try:
                 # 尝试简化查询参数
@@ -131,6 +457,35 @@ class MemoryManager:
                 logger.error("备选搜索也失败: %s", fallback_exc)
                 return {"results": []}
     
+    def multi_search(
+        self,
+        query: str,
+        user_id: str,
+        scopes: Dict[str, Dict[str, Any]],
+        limit_per: int = 5
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        并发检索多个记忆范围（如用户/专家/项目记忆），按范围分组返回
+        
+        每个范围各自调用 search_memories，提交到检索线程池并发执行，
+        因此同样经过失败冷却、空范围索引与检索结果缓存。
+        （mem0 的 OR 组合过滤在 Qdrant 后端上无法执行，不做合并查询。）
+        
+        Args:
+            query: 搜索查询
+            user_id: 用户ID
+            scopes: 范围名 -> 过滤条件，键可为 memory_type / agent_id / expert_domain
+            limit_per: 每个范围返回的结果数量上限
+            
+        Returns:
+            范围名 -> 记忆结果列表
+        """
+        futures = {
+            name: self._search_pool.submit(self.search_memories, query, user_id, limit_per, **scope)
+            for name, scope in scopes.items()
+        }
+        return {name: future.result().get("results", []) for name, future in futures.items()}
+    
     def add_conversation(
         self,
         messages: List[Dict[str, str]],
@@ -152,30 +507,26 @@ class MemoryManager:
         Returns:
             是否成功添加
         """
-        success = False
-        
         # 根据agent_id和memory_type自动确定记忆类型
         final_memory_type = memory_type
         if not final_memory_type:
-            if agent_id == "project_brain":
-                final_memory_type = "project"
-            elif agent_id in Config.AGENT_PROFILES:
-                final_memory_type = "expert"
-            else:
-                final_memory_type = "user"
+            final_memory_type = _AGENT_META.get(agent_id, _DEFAULT_AGENT_META).memory_type
         
         # 始终以“用户级”维度存储，确保记忆与代理解耦
-        success |= self._store_memory(messages, user_id=user_id, session_id=session_id, memory_type=final_memory_type)
+        success = self._store_memory(messages, user_id=user_id, session_id=session_id, memory_type=final_memory_type)
         
-        # 仅在底层支持、且明确指定代理时，再写入代理专属记忆
+        # 仅在底层支持、且明确指定代理时，再写入代理专属记忆；用户级写入失败说明后端不可用，跳过这次依赖写入
         if agent_id and self.capabilities["add_agent"]:
-            success |= self._store_memory(
-                messages,
-                user_id=user_id,
-                agent_id=agent_id,
-                session_id=session_id,
-                memory_type=final_memory_type
-            )
+            if success:
+                success |= self._store_memory(
+                    messages,
+                    user_id=user_id,
+                    agent_id=agent_id,
+                    session_id=session_id,
+                    memory_type=final_memory_type
+                )
+            else:
+                logger.warning("用户级记忆写入失败，跳过代理专属记忆写入 (agent=%s)", agent_id)
         return success
         
     def add_user_memory(self, messages: List[Dict[str, str]], user_id: str, session_id: Optional[str] = None) -> bool:
@@ -233,71 +584,136 @@ class MemoryManager:
     ) -> bool:
         """封装底层 add 调用，按需附加 agent/session 和记忆类型标识。"""
         try:
-            params = {"user_id": user_id}
-            if agent_id:
-                params["agent_id"] = agent_id
-            if session_id and self.capabilities["add_session"]:
-                params["session_id"] = session_id
-            
-            # 添加记忆类型标识和专家领域信息
-            metadata = {
-                "role": "user",  # 默认角色
-                "user_id": user_id,
-                "agent_id": agent_id,
-                "session_id": session_id,
-                "memory_type": memory_type
-            }
-            
-            # 根据不同的角色和记忆类型添加额外的metadata
-            if agent_id == "project_brain":
-                metadata["is_project_memory"] = True
-            elif agent_id in Config.AGENT_PROFILES:
-                metadata["is_expert_memory"] = True
-                # 记录专家类型
-                if agent_id == "product_lead":
-                    metadata["expert_domain"] = "product"
-                elif agent_id == "algo_scientist":
-                    metadata["expert_domain"] = "algorithm"
-                elif agent_id == "solution_architect":
-                    metadata["expert_domain"] = "architecture"
+            # 记忆类型标识和专家领域信息只构建一次，逐条消息仅替换 role
+            metadata = self._memory_meta(user_id, agent_id, session_id, memory_type)
             
             # 处理单个消息的情况，确保格式正确
             if len(messages) == 1 and isinstance(messages[0], dict):
                 # 对于单个消息，使用正确的格式以避免向量验证错误
-                memory_data = {
+                payload: Any = {
                     "text": messages[0].get("content", ""),
-                    "metadata": {**metadata, "role": messages[0].get("role", "user")}
+                    "metadata": metadata.to_dict(messages[0].get("role", "user"))
                 }
-                self.memory.add(memory_data, **params)
             else:
                 # 对于多条消息，为每条消息添加metadata
-                enriched_messages = []
-                for msg in messages:
-                    enriched_msg = {
-                        "text": msg.get("content", ""),
-                        "metadata": {**metadata, "role": msg.get("role", "user")}
-                    }
-                    enriched_messages.append(enriched_msg)
-                self.memory.add(enriched_messages, **params)
-            
-            scope = f"user={user_id}, agent={agent_id or 'user_scope'}, type={memory_type}"
-            logger.info("记忆已写入 (%s)", scope)
+                payload = [
+                    {"text": msg.get("content", ""), "metadata": metadata.to_dict(msg.get("role", "user"))}
+                    for msg in messages
+                ]
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("记忆消息格式无效 (%s): %s", agent_id or "user_scope", exc)
+            return False
+        
+        return self._write_memory(
+            payload,
+            # 跳过空内容，避免拼接出连续空格
+            lambda: " ".join([content for msg in messages if (content := msg.get("content"))]),
+            user_id=user_id,
+            agent_id=agent_id,
+            session_id=session_id,
+            memory_type=memory_type
+        )
+    
+    def _store_single_memory(
+        self,
+        content: str,
+        *,
+        user_id: str,
+        agent_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        memory_type: str = "general",
+        role: str = "assistant"
+    ) -> bool:
+        """单条文本的写入快速路径，直接构建 add 载荷，不经过消息列表。"""
+        metadata = self._memory_meta(user_id, agent_id, session_id, memory_type)
+        return self._write_memory(
+            {"text": content, "metadata": metadata.to_dict(role)},
+            lambda: content,
+            user_id=user_id,
+            agent_id=agent_id,
+            session_id=session_id,
+            memory_type=memory_type
+        )
+    
+    @staticmethod
+    def _memory_meta(
+        user_id: str,
+        agent_id: Optional[str],
+        session_id: Optional[str],
+        memory_type: str
+    ) -> MemoryMeta:
+        """按代理静态属性构建写入元数据。"""
+        agent_meta = _AGENT_META.get(agent_id, _DEFAULT_AGENT_META)
+        is_expert = agent_meta.memory_type == "expert"
+        return MemoryMeta(
+            memory_type=memory_type,
+            user_id=user_id,
+            agent_id=agent_id,
+            session_id=session_id,
+            is_project_memory=agent_meta.memory_type == "project",
+            is_expert_memory=is_expert,
+            expert_domain=agent_meta.expert_domain if is_expert else None
+        )
+    
+    def _write_memory(
+        self,
+        payload: Any,
+        fallback_text: Callable[[], str],
+        *,
+        user_id: str,
+        agent_id: Optional[str],
+        session_id: Optional[str],
+        memory_type: str
+    ) -> bool:
+        """执行实际的 add 调用，失败时按简化格式重试一次。
+        
+        Args:
+            payload: 传给 mem0 add 的载荷（单条字典或消息列表）
+            fallback_text: 生成简化格式文本的函数，仅在首次写入失败时调用
+            user_id: 用户ID
+            agent_id: 代理ID
+            session_id: 会话ID
+            memory_type: 记忆类型
+            
+        Returns:
+            是否成功写入
+        """
+        params = {"user_id": user_id}
+        if agent_id:
+            params["agent_id"] = agent_id
+        if session_id and self.capabilities["add_session"]:
+            params["session_id"] = session_id
+        
+        # 写入前后各递增一次代数：写入期间开始的检索即使返回空也不会被记为空范围
+        self._bump_write_generation(user_id)
+        try:
+            self.memory.add(payload, **params)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("记忆已写入 (user=%s, agent=%s, type=%s)", user_id, agent_id or "user_scope", memory_type)
             return True
         except Exception as exc:  # noqa: BLE001
             logger.warning("记忆保存失败 (%s): %s", agent_id or "user_scope", exc)
+            if self._record_backend_failure(exc, "write"):
+                # 后端刚失败过，跳过简化格式重试，避免再等待一次超时
+                return False
             # 尝试使用更简单的格式作为备选方案
             try:
                 # 尝试使用简化的格式
                 simple_memory = {
-                    "text": " ".join([msg.get("content", "") for msg in messages]),
+                    "text": fallback_text(),
                     "metadata": {"memory_type": memory_type, "agent_id": agent_id}
                 }
                 self.memory.add(simple_memory, **params)
-                logger.info("使用简化格式成功保存记忆 (%s)", scope)
+                logger.info(
+                    "使用简化格式成功保存记忆 (user=%s, agent=%s, type=%s)",
+                    user_id, agent_id or "user_scope", memory_type
+                )
                 return True
             except Exception as fallback_exc:
                 logger.error("备选方案也失败: %s", fallback_exc)
                 return False
+        finally:
+            self._bump_write_generation(user_id)
     
     def get_memory_context(
         self,
@@ -324,6 +740,14 @@ class MemoryManager:
         Returns:
             格式化的记忆上下文
         """
+        cache_key = (
+            query, user_id, limit, agent_id, session_id, memory_type, expert_domain,
+            self._write_generation(user_id)
+        )
+        cached = self._context_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         memories = self.search_memories(
             query=query,
             user_id=user_id,
@@ -335,30 +759,7 @@ class MemoryManager:
         )
         
         if memories["results"]:
-            memory_parts = []
-            for idx, entry in enumerate(memories["results"]):
-                # 尝试获取不同格式的记忆内容
-                content = entry.get("memory") or entry.get("content") or entry.get("text") or ""
-                
-                # 获取元数据信息
-                metadata = entry.get("metadata", {})
-                memory_type_str = metadata.get("memory_type", "general")
-                agent_info = metadata.get("agent_id", "")
-                domain_info = metadata.get("expert_domain", "")
-                
-                # 构建记忆标签
-                tags = []
-                if memory_type_str != "general":
-                    tags.append(memory_type_str)
-                if agent_info:
-                    tags.append(f"agent:{agent_info}")
-                if domain_info:
-                    tags.append(f"domain:{domain_info}")
-                
-                tag_str = f"[{', '.join(tags)}]" if tags else ""
-                memory_parts.append(f"- {tag_str} {content}")
-            
-            memories_str = "\n".join(memory_parts)
+            memories_str = "\n".join(_render_tagged_entry(entry) for entry in memories["results"])
             
             # 添加上下文标题
             context_title = "相关记忆"
@@ -367,9 +768,14 @@ class MemoryManager:
             if agent_id:
                 context_title += f" - {agent_id}"
             
-            return f"{context_title}：\n{memories_str}"
+            context = f"{context_title}：\n{memories_str}"
         else:
-            return "暂无相关记忆"
+            context = "暂无相关记忆"
+        
+        # 检索失败返回的空结果不缓存，避免后端恢复后仍返回旧的空上下文
+        if not self._backend_recently_failed():
+            self._context_cache.set(cache_key, context)
+        return context
             
     def get_user_memory_context(self, query: str, user_id: str, limit: int = 5) -> str:
         """
@@ -404,14 +810,8 @@ class MemoryManager:
             格式化的专家记忆上下文
         """
         # 根据专家ID确定领域
-        expert_domain = None
-        if expert_id == "product_lead":
-            expert_domain = "product"
-        elif expert_id == "algo_scientist":
-            expert_domain = "algorithm"
-        elif expert_id == "solution_architect":
-            expert_domain = "architecture"
-            
+        expert_domain = _AGENT_META.get(expert_id, _DEFAULT_AGENT_META).expert_domain
+        
         return self.get_memory_context(
             query=query,
             user_id=user_id,
@@ -480,9 +880,14 @@ class MemoryManager:
                 filters["metadata.expert_domain"] = expert_domain
             
             # 添加过滤条件到params（如果支持）
-            if filters and hasattr(self.memory.get_all, '__code__') and 'filters' in inspect.signature(self.memory.get_all).parameters:
+            if filters and self.capabilities["get_all_filters"]:
                 params["filters"] = filters
             
+            cache_key = ("get_all", self._scope_key(params), limit, self._write_generation(user_id))
+            cached = self._retrieval_cache.get(cache_key)
+            if cached is not None:
+                return self._copy_results(cached)
+            
             all_memories = self.memory.get_all(**params)
             
             # 检查返回结果格式，确保它是预期的字典格式
@@ -490,6 +895,7 @@ class MemoryManager:
                 # 确保results键存在且为列表
                 if "results" not in all_memories:
                     all_memories["results"] = []
+                self._retrieval_cache.set(cache_key, self._copy_results(all_memories))
                 return all_memories
             else:
                 # 如果返回格式不是字典，转换为标准格式
@@ -520,144 +926,146 @@ class MemoryManager:
         agent_id: str,
         session_id: Optional[str],
         collaborators: Optional[Iterable[str]],
-        limit: int
+        limit: int,
+        expert_domain: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         组合主代理与协作代理的记忆，用于上下文工程，支持按记忆类型组织。
+        
+        每个协作者的专家记忆各自检索一次（Qdrant 后端不支持 ``in`` 过滤），
+        指定 expert_domain 时在本地按领域关键词筛选。用户、主代理、各协作者与综合建议
+        的检索全部在线程池中并发执行。
         """
-        memory_sections: List[str] = []
+        # 所有章节的文本行平铺在一个列表中，章节之间以空行分隔，最终只做一次 join
+        memory_lines: List[str] = []
         total_hits = 0
+        pool = self._search_pool
         
-        # 先检索用户专属记忆
-        user_results = self.search_memories(query, user_id, limit, None, session_id, memory_type="user")
-        section_text, hits = self._format_memory_results("用户", user_results.get("results", []))
-        if hits:
-            memory_sections.append(section_text)
-            total_hits += hits
+        def add_section(section_lines: Iterable[str]):
+            if memory_lines:
+                memory_lines.append("")
+            memory_lines.extend(section_lines)
         
+        # 各路检索互不依赖：先全部提交到线程池，再按原顺序整理结果，耗时取决于最慢的一路
+        # 用户专属记忆
+        user_future = pool.submit(self.search_memories, query, user_id, limit, None, session_id, memory_type="user")
         # 主代理记忆（根据代理类型使用相应的记忆类型）
         memory_type = "project" if agent_id == "project_brain" else "expert"
-        primary_results = self.search_memories(query, user_id, limit, agent_id, session_id, memory_type=memory_type)
-        section_text, hits = self._format_memory_results(agent_id, primary_results.get("results", []))
+        primary_future = pool.submit(
+            self.search_memories, query, user_id, limit, agent_id, session_id, memory_type=memory_type
+        )
+        # 每个协作者的专家记忆（去重后各检索一次）
+        collaborator_futures = [
+            (collaborator, pool.submit(
+                self.search_memories, query, user_id, limit, collaborator, session_id, memory_type="expert"
+            ))
+            for collaborator in dict.fromkeys(collaborators or ())
+        ]
+        # 综合建议：不限制特定代理，获取更多结果用于综合
+        comprehensive_future = pool.submit(self.search_memories, query, user_id, limit * 2, None, session_id)
+        
+        user_results = user_future.result()
+        section_lines, hits = self._format_memory_results("用户", user_results.get("results", []), limit)
         if hits:
-            memory_sections.append(section_text)
+            add_section(section_lines)
+            total_hits += hits
+        
+        primary_results = primary_future.result()
+        section_lines, hits = self._format_memory_results(agent_id, primary_results.get("results", []), limit)
+        if hits:
+            add_section(section_lines)
             total_hits += hits
         
         # 按专家领域分组协作者记忆
-        domain_memories = {
-            "product": {"name": "产品专家", "results": []},
-            "algorithm": {"name": "算法专家", "results": []},
-            "architecture": {"name": "架构师", "results": []},
-            "general": {"name": "其他专家", "results": []}
-        }
+        results_per_domain: List[List[Dict[str, Any]]] = [[] for _ in _DOMAIN_ORDER]
         
-        if collaborators:
-            for collaborator in collaborators:
-                # 确定专家领域
-                domain = "general"
-                if collaborator == "product_lead":
-                    domain = "product"
-                elif collaborator == "algo_scientist":
-                    domain = "algorithm"
-                elif collaborator == "solution_architect":
-                    domain = "architecture"
-                
-                # 获取专家记忆
-                collaborator_results = self.search_memories(
-                    query,
-                    user_id,
-                    limit,
-                    collaborator,
-                    session_id,
-                    memory_type="expert"
-                )
-                
-                # 添加到对应领域
-                domain_memories[domain]["results"].extend(collaborator_results.get("results", []))
+        # 领域关键词只小写、切分一次，之后每条记录只做集合相交判断
+        domain_keywords = frozenset(expert_domain.lower().split()) if expert_domain else None
+        for collaborator, future in collaborator_futures:
+            domain_results = results_per_domain[_AGENT_DOMAIN_INDEX.get(collaborator, _GENERAL_DOMAIN_INDEX)]
+            for entry in future.result().get("results", []):
+                if domain_keywords is not None:
+                    metadata = entry.get("metadata") or {}
+                    entry_domain = metadata.get("expert_domain") or entry.get("expert_domain") or ""
+                    if domain_keywords.isdisjoint(str(entry_domain).lower().split()):
+                        continue
+                domain_results.append(entry)
         
         # 按领域格式化协作者记忆
         expert_sections = []
-        for domain, info in domain_memories.items():
-            if info["results"]:
-                section_text, hits = self._format_memory_results(info["name"], info["results"])
-                expert_sections.append(section_text)
+        for name, domain_results in zip(_DOMAIN_NAMES, results_per_domain):
+            if domain_results:
+                section_lines, hits = self._format_memory_results(name, domain_results, limit)
+                expert_sections.append(section_lines)
                 total_hits += hits
         
         # 添加专家部分到记忆章节
         if expert_sections:
-            memory_sections.append("### 专家见解汇总：")
-            memory_sections.extend(expert_sections)
+            add_section(("### 专家见解汇总：",))
+            for section_lines in expert_sections:
+                add_section(section_lines)
         
         # 生成综合建议
-        comprehensive_results = self.search_memories(
-            query,
-            user_id,
-            limit * 2,  # 获取更多结果用于综合
-            None,  # 不限制特定代理
-            session_id
-        )
+        comprehensive_results = comprehensive_future.result()
         
         if comprehensive_results.get("results", []):
             # 提取最相关的见解作为综合建议
             suggestions = []
-            seen_content = set()
+            seen_fingerprints = set()
             for entry in comprehensive_results["results"][:limit]:
                 content = entry.get("memory") or entry.get("content") or ""
-                if content and content not in seen_content:
-                    seen_content.add(content)
+                if not content:
+                    continue
+                fingerprint = _content_fingerprint(content)
+                if fingerprint not in seen_fingerprints:
+                    seen_fingerprints.add(fingerprint)
                     suggestions.append(content)
             
             if suggestions:
-                memory_sections.append("\n### 综合建议：")
-                memory_sections.extend([f"- {suggestion}" for suggestion in suggestions])
+                add_section(("\n### 综合建议：",))
+                for suggestion in suggestions:
+                    add_section((f"- {suggestion}",))
         
-        formatted = "\n\n".join(memory_sections) if memory_sections else "暂无相关记忆"
+        formatted = "\n".join(memory_lines) if memory_lines else "暂无相关记忆"
         return {
             "formatted": formatted,
             "memory_used": total_hits > 0,
             "memories_count": total_hits
         }
     
-    def _format_memory_results(self, agent_id: str, results: List[Dict[str, Any]]) -> Tuple[str, int]:
+    def _format_memory_results(
+        self,
+        agent_id: str,
+        results: List[Dict[str, Any]],
+        limit: Optional[int] = None
+    ) -> Tuple[List[str], int]:
         """
-        将指定代理的记忆结果格式化为文本块，增强元数据展示。
+        将指定代理的记忆结果格式化为文本行，增强元数据展示。
+        
+        Args:
+            agent_id: 代理ID或分组名称
+            results: 记忆结果列表
+            limit: 最多展示的条数，None 表示全部
+            
+        Returns:
+            (格式化文本行, 记忆条数)
         """
         if not results:
-            return "", 0
+            return [], 0
         
-        lines = [
-            f"### {agent_id} 的记忆片段："
-        ]
+        # 按相关性取前 limit 条（如果有score字段）：只需部分排序，O(N log k)；同分保持原顺序
+        if limit is not None and limit < len(results):
+            sorted_results = heapq.nlargest(limit, results, key=_score_of)
+        else:
+            sorted_results = sorted(results, key=_score_of, reverse=True)
         
-        # 按相关性排序（如果有score字段）
-        sorted_results = sorted(
-            results,
-            key=lambda x: x.get("score", 0),
-            reverse=True
+        lines = [f"### {agent_id} 的记忆片段："]
+        lines.extend(
+            _render_scored_entry(entry, memory_text)
+            for entry in sorted_results
+            if (memory_text := _entry_text(entry))
         )
-        
-        for entry in sorted_results:
-            # 获取记忆内容，尝试多种可能的字段名
-            memory_text = entry.get("memory") or entry.get("content") or entry.get("text") or ""
-            if not memory_text:
-                continue
-            
-            # 获取元数据信息
-            metadata = entry.get("metadata", {})
-            memory_type = metadata.get("memory_type", "general")
-            score = entry.get("score", "")
-            
-            # 构建标签
-            tags = []
-            if memory_type != "general":
-                tags.append(f"[{memory_type}]")
-            if score and isinstance(score, (int, float)):
-                tags.append(f"[相关度: {score:.2f}]")
-            
-            tag_str = " ".join(tags)
-            lines.append(f"- {tag_str} {memory_text}")
-            
-        return "\n".join(lines), len(results)
+        return lines, len(sorted_results)
 
     def store_memory(
         self,
@@ -683,15 +1091,9 @@ class MemoryManager:
             是否成功存储
         """
         try:
-            # 创建标准消息格式
-            message = {
-                "role": "assistant",  # 默认角色
-                "content": content
-            }
-            
-            # 调用私有方法_store_memory处理实际存储
-            result = self._store_memory(
-                messages=[message],
+            # 单条内容走快速路径，默认以 assistant 角色写入
+            result = self._store_single_memory(
+                content,
                 user_id=user_id,
                 agent_id=agent_id,
                 session_id=session_id,
@@ -704,7 +1106,5 @@ class MemoryManager:
             
             return result
         except Exception as e:
-            logger.error(f"调用store_memory时发生异常: {str(e)}")
-            import traceback
-            logger.error(f"异常堆栈: {traceback.format_exc()}")
+            logger.exception("调用store_memory时发生异常: %s", e)
             return False
\ No newline at end of file
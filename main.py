@@ -5,22 +5,43 @@
 """
 # pylint: disable=broad-except
 
+import importlib
 import sys
+import threading
+from typing import TYPE_CHECKING, List, Optional
 
 from config.settings import Config
-from core.memory_manager import MemoryManager
-from core.chat_engine import ChatEngine
-from core.agent_controller import MultiAgentController
-from models.data_models import MultiAgentResult
-from utils.helpers import setup_logging, print_banner, handle_user_input, setup_signal_handlers
+from utils.early_input import start_capturing_early_input
+from utils.helpers import setup_logging, print_banner, handle_user_input, setup_signal_handlers, spinner
+
+if TYPE_CHECKING:
+    from models.data_models import MultiAgentResult
 
 logger = setup_logging()
 
+# 记忆系统、LLM 客户端等重依赖模块：启动时在后台线程预先导入，与打印横幅等工作重叠
+_HEAVY_MODULES = ("core.memory_manager", "core.chat_engine", "core.agent_controller")
+
+
+def _preload_modules():
+    """后台导入重依赖模块；失败时忽略，由 ChatApplication 初始化时在主线程重新导入并报告错误"""
+    for module_name in _HEAVY_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception:  # noqa: BLE001
+            return
+
+
 class ChatApplication:
     """聊天应用程序"""
     
     def __init__(self):
         try:
+            # 延迟导入：模块可能已由后台线程加载完成，此处只是取出（或等待导入结束）
+            from core.memory_manager import MemoryManager
+            from core.chat_engine import ChatEngine
+            from core.agent_controller import MultiAgentController
+            
             self.memory_manager = MemoryManager()
             self.chat_engine = ChatEngine(self.memory_manager)
             self.current_user = Config.DEFAULT_USER_ID
@@ -31,6 +52,21 @@ class ChatApplication:
                 MultiAgentController(self.chat_engine)
                 if self.multi_agent_enabled else None
             )
+            self._refresh_prompt()
+            # 代理ID -> 展示名称，输出专家反馈时直接查表
+            self._agent_names = {agent_id: profile.name for agent_id, profile in Config.AGENT_PROFILES.items()}
+            # 命令分发表：精确命令与带参数的前缀命令
+            self._exact_commands = {
+                'exit': self._handle_exit,
+                'stats': self._show_stats,
+                'clear': self._clear_history,
+                'agents': self._list_agents,
+            }
+            self._prefix_commands = (
+                ('user ', self._switch_user),
+                ('agent ', self._switch_agent),
+                ('session ', self._switch_session),
+            )
             logger.info("聊天应用程序初始化完成")
         except Exception as exc:  # noqa: BLE001
             logger.critical("应用程序初始化失败: %s", exc)
@@ -39,7 +75,6 @@ class ChatApplication:
     
     def run(self):
         """运行主循环"""
-        print_banner()
         setup_signal_handlers()
         
         print("系统已就绪，请输入命令或消息...")
@@ -47,15 +82,15 @@ class ChatApplication:
         while True:
             try:
                 # 获取用户输入
-                prompt = f"\n👤 用户[{self.current_user}]｜代理[{self.current_agent}]> "
-                user_input = handle_user_input(prompt)
+                user_input = handle_user_input(self._prompt)
                 
                 if user_input is None:
                     continue
                 
-                # 处理命令
-                if self._handle_commands(user_input):
-                    if user_input.lower() == 'exit':
+                # 处理命令（小写形式只计算一次，空输入不做转换）
+                user_input_lower = user_input.lower() if user_input else user_input
+                if self._handle_commands(user_input, user_input_lower):
+                    if user_input_lower == 'exit':
                         break
                     continue
                 
@@ -69,94 +104,83 @@ class ChatApplication:
                 logger.error("主循环错误: %s", exc)
                 print("❌ 系统出现错误，请重试")
     
-    def _handle_commands(self, user_input: str) -> bool:
-        """处理特殊命令，返回是否已处理"""
-        if not user_input:
-            return True
-            
-        user_input_lower = user_input.lower()
-        
-        if user_input_lower == 'exit':
-            self._handle_exit()
-            return True
-            
-        elif user_input_lower == 'stats':
-            self._show_stats()
-            return True
-            
-        elif user_input_lower == 'clear':
-            self._clear_history()
-            return True
+    def _refresh_prompt(self):
+        """重新生成输入提示符，仅在切换用户或代理时调用"""
+        self._prompt = f"\n👤 用户[{self.current_user}]｜代理[{self.current_agent}]> "
+    
+    def _handle_commands(self, user_input: str, user_input_lower: Optional[str] = None) -> bool:
+        """处理特殊命令，返回是否已处理
         
-        elif user_input_lower == 'agents':
-            self._list_agents()
+        Args:
+            user_input: 已去除首尾空白的用户输入
+            user_input_lower: 输入的小写形式，调用方已计算时传入以免重复转换
+        """
+        if not user_input:
             return True
             
-        elif user_input.startswith('user '):
-            self._switch_user(user_input)
-            return True
-        
-        elif user_input.startswith('agent '):
-            self._switch_agent(user_input)
+        # 精确命令一次字典查找，带参数的命令再按前缀匹配
+        if user_input_lower is None:
+            user_input_lower = user_input.lower()
+        handler = self._exact_commands.get(user_input_lower)
+        if handler is not None:
+            handler()
             return True
         
-        elif user_input.startswith('session '):
-            self._switch_session(user_input)
-            return True
+        for prefix, prefix_handler in self._prefix_commands:
+            if user_input.startswith(prefix):
+                prefix_handler(user_input)
+                return True
             
         return False
     
     def _handle_chat(self, message: str):
-        """处理聊天消息"""
-        if not message.strip():
-            return
-            
-        print("🤔 思考中...", end="", flush=True)
-        
+        """处理聊天消息（输入已由 handle_user_input 去除首尾空白，空输入已按命令处理）"""
         try:
             multi_agent_details = None
-            if self.multi_agent_enabled and self.agent_controller:
-                ma_result = self.agent_controller.process_user_message(
-                    message,
-                    self.current_user,
-                    self.current_session
-                )
-                response = ma_result.final_response
-                multi_agent_details = ma_result
-            else:
-                response = self.chat_engine.generate_response(
-                    message,
-                    self.current_user,
-                    self.current_agent,
-                    self.current_session
-                )
-            
-            print("\r" + " " * 20 + "\r", end="")  # 清除"思考中"提示
+            # 等待期间显示动画提示，结束（含异常）时自动清除
+            with spinner("🤔 思考中..."):
+                if self.multi_agent_enabled and self.agent_controller:
+                    ma_result = self.agent_controller.process_user_message(
+                        message,
+                        self.current_user,
+                        self.current_session
+                    )
+                    response = ma_result.final_response
+                    multi_agent_details = ma_result
+                else:
+                    response = self.chat_engine.generate_response(
+                        message,
+                        self.current_user,
+                        self.current_agent,
+                        self.current_session
+                    )
             
             if response.error:
                 print(f"❌ 错误: {response.content}")
             else:
-                if multi_agent_details:
-                    self._print_multi_agent_details(multi_agent_details)
-                print(f"🤖 助手: {response.content}")
+                # 整段输出先拼接再一次写出，输出重定向到管道时避免逐行写入
+                lines = self._format_multi_agent_details(multi_agent_details) if multi_agent_details else []
+                lines.append(f"🤖 助手: {response.content}")
                 
                 # 显示记忆使用信息
                 if response.memory_used:
-                    print(f"💡 参考了 {response.memories_count} 条记忆（协作代理: {', '.join(response.collaborators) or '无'}）")
+                    lines.append(f"💡 参考了 {response.memories_count} 条记忆（协作代理: {', '.join(response.collaborators) or '无'}）")
+                print("\n".join(lines), flush=True)
                     
         except Exception as exc:  # noqa: BLE001
-            print("\r" + " " * 20 + "\r", end="")  # 清除"思考中"提示
             print(f"❌ 生成回复时出错: {exc}")
     
     def _show_stats(self):
         """显示统计信息"""
         try:
             stats = self.chat_engine.get_conversation_stats(self.current_user)
-            print("📊 对话统计:")
-            print(f"  用户ID: {stats['user_id']}")
-            print(f"  缓存对话数: {stats['cached_conversations']}/{stats['cache_max_size']}")
-            print(f"  当前代理: {self.current_agent}")
-            print(f"  当前会话: {self.current_session}")
+            print("\n".join((
+                "📊 对话统计:",
+                f"  用户ID: {stats['user_id']}",
+                f"  缓存对话数: {stats['cached_conversations']}/{stats['cache_max_size']}",
+                f"  当前代理: {self.current_agent}",
+                f"  当前会话: {self.current_session}",
+            )))
         except Exception as exc:  # noqa: BLE001
             print(f"❌ 获取统计信息失败: {exc}")
     
@@ -174,6 +198,7 @@ class ChatApplication:
             new_user = user_input[5:].strip()
             if new_user:
                 self.current_user = new_user
+                self._refresh_prompt()
                 print(f"✅ 已切换到用户: {self.current_user}")
             else:
                 print("❌ 请输入有效的用户ID")
@@ -186,6 +211,7 @@ class ChatApplication:
             new_agent = user_input[6:].strip()
             if new_agent in Config.AGENT_PROFILES:
                 self.current_agent = new_agent
+                self._refresh_prompt()
                 print(f"✅ 已切换到代理: {self.current_agent}")
             else:
                 print("❌ 未找到该代理，请先使用 'agents' 查看列表")
@@ -207,23 +233,25 @@ class ChatApplication:
     
     def _list_agents(self):
         """列出可用代理，展示各自擅长领域"""
-        print("🧑‍🤝‍🧑 可用代理列表：")
+        lines = ["🧑‍🤝‍🧑 可用代理列表："]
         for agent_id, profile in Config.AGENT_PROFILES.items():
-            collaborators = ", ".join(profile.get("collaborators", [])) or "无"
-            print(f"- {agent_id}: {profile.get('description', '')}")
-            print(f"  协作代理: {collaborators}")
-            print(f"  表达风格: {profile.get('style', '未设置')}")
+            collaborators = ", ".join(profile.collaborators) or "无"
+            lines.append(f"- {agent_id}: {profile.description}")
+            lines.append(f"  协作代理: {collaborators}")
+            lines.append(f"  表达风格: {profile.style or '未设置'}")
+        print("\n".join(lines))
     
-    def _print_multi_agent_details(self, ma_result: MultiAgentResult):
-        """输出项目大脑与专家大脑的协作过程。"""
-        print("🧠 项目大脑摘要:")
-        print(f"  {ma_result.project_summary}")
+    def _format_multi_agent_details(self, ma_result: "MultiAgentResult") -> List[str]:
+        """整理项目大脑与专家大脑的协作过程，返回待输出的文本行。"""
+        lines = ["🧠 项目大脑摘要:", f"  {ma_result.project_summary}"]
         if ma_result.specialist_outputs:
-            print("👥 专家大脑反馈:")
-            for specialist in ma_result.specialist_outputs:
-                profile = Config.AGENT_PROFILES.get(specialist.agent_id, {})
-                name = profile.get("name", specialist.agent_id)
-                print(f"  - {name}: {specialist.content}")
+            lines.append("👥 专家大脑反馈:")
+            names = self._agent_names
+            lines.extend(
+                f"  - {names.get(specialist.agent_id, specialist.agent_id)}: {specialist.content}"
+                for specialist in ma_result.specialist_outputs
+            )
+        return lines
     
     def _handle_exit(self):
         """处理退出"""
@@ -232,6 +260,11 @@ class ChatApplication:
 
 def main():
     """主函数"""
+    # 初始化期间的键盘输入先缓存起来，首次提示时再交给 input()
+    start_capturing_early_input()
+    # 先开始后台导入，再打印横幅，横幅在导入完成前即可显示
+    threading.Thread(target=_preload_modules, name="preload", daemon=True).start()
+    print_banner()
     try:
         app = ChatApplication()
         app.run()
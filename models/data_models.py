@@ -11,43 +11,119 @@
 5. 专家结果模型
 6. 多代理结果模型
 7. 对话缓存管理类
+8. 轻量消息元组
+9. 记忆元数据模型
+10. LLM 消息字典类型
 """
 
 # 导入必要的类型和工具
-from typing import Dict, List, Optional, Any
+import sys
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Any, TypedDict
 from dataclasses import dataclass, field
-from collections import deque
+from collections import OrderedDict, deque
+from itertools import islice
 
-@dataclass
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数。
+    
+    中日韩字符约 1 字 1 token，其余字符约 4 个字符 1 token；
+    只用于历史裁剪的预算控制，不追求与具体分词器完全一致。
+    
+    Args:
+        text: 待估算的文本
+        
+    Returns:
+        估算的 token 数
+    """
+    if not text:
+        return 0
+    wide = sum(1 for ch in text if ch >= "\u2e80")
+    return wide + (len(text) - wide + 3) // 4
+
+
+class WireMessage(TypedDict):
+    """发送给 LLM 接口的消息格式（OpenAI 兼容），仅用于类型标注，运行时就是普通字典。"""
+    role: str
+    content: str
+
+
+class Msg(NamedTuple):
+    """不可变的轻量消息，在对话缓存、上下文构建和LLM调用之间传递。
+    
+    创建时即已是合法的 (role, content)，下游直接按属性读取，只在发送请求时编码。
+    """
+    role: str      # 角色，如 user, assistant, system
+    content: str   # 消息内容
+    
+    def to_dict(self) -> WireMessage:
+        """转换为字典格式。"""
+        return {"role": self.role, "content": self.content}
+
+
+@dataclass(slots=True, frozen=True)
 class ChatMessage:
     """聊天消息数据模型
     
     表示对话中的一条消息，包含角色、内容和可选的时间戳。
+    创建时即完成格式校验，下游无需再逐条检查 role/content。
     """
     role: str                      # 角色，如 user, assistant, system
     content: str                   # 消息内容
     timestamp: Optional[str] = None  # 时间戳，可选
+    token_count: int = field(init=False, repr=False, compare=False)  # 估算的 token 数，创建时计算
+    _msg: Msg = field(init=False, repr=False, compare=False)  # 对应的轻量消息，创建时构建一次
     
-    def to_dict(self) -> Dict[str, str]:
+    def __post_init__(self):
+        """校验消息字段，驻留角色字符串，估算 token 数并构建轻量消息。
+        
+        Raises:
+            ValueError: 当 role 为空或 content 不是字符串时抛出
+        """
+        if not isinstance(self.role, str) or not self.role:
+            raise ValueError(f"无效的消息角色: {self.role!r}")
+        if not isinstance(self.content, str):
+            raise ValueError(f"消息内容必须是字符串: {type(self.content)}")
+        # 角色只有少数几种取值，驻留后所有消息共享同一个字符串对象
+        object.__setattr__(self, "role", sys.intern(self.role))
+        object.__setattr__(self, "token_count", estimate_tokens(self.content))
+        object.__setattr__(self, "_msg", Msg(self.role, self.content))
+    
+    def to_dict(self) -> WireMessage:
         """将消息转换为字典格式
         
         用于序列化或与其他系统交互。
         
         Returns:
-            Dict[str, str]: 包含角色和内容的字典
+            WireMessage: 包含角色和内容的字典
         """
-        return {"role": self.role, "content": self.content}
+        return self._msg.to_dict()
+    
+    def to_msg(self) -> Msg:
+        """返回创建时构建的轻量消息元组（不可变，可直接共享）。"""
+        return self._msg
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ConversationStats:
     """对话统计信息
     
     包含对话的统计数据，如缓存的对话数量、缓存最大大小等。
+    实例不可变，缓存未变化时可被重复返回。
     """
     user_id: str                    # 用户ID
     cached_conversations: int       # 缓存的对话数量
     cache_max_size: int             # 缓存的最大大小
     total_memories: Optional[int] = None  # 总记忆数量，可选
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式。"""
+        return {
+            "user_id": self.user_id,
+            "cached_conversations": self.cached_conversations,
+            "cache_max_size": self.cache_max_size,
+            "total_memories": self.total_memories
+        }
 
 @dataclass
 class ChatResponse:
@@ -71,13 +147,51 @@ class ContextPayload:
     
     为LLM提供完整的上下文信息，包括消息历史、记忆使用情况等。
     """
-    messages: List[Dict[str, str]]   # 消息列表，包含系统提示和对话历史
+    messages: List[Msg]              # 消息列表，包含系统提示和对话历史
     memory_used: bool                # 是否使用了记忆
     memories_count: int              # 使用的记忆数量
     agent_id: str                    # 智能体ID
     session_id: str                  # 会话ID
     collaborators: List[str]         # 协作的智能体列表
 
+@dataclass(slots=True)
+class MemoryMeta:
+    """写入长期记忆时附带的元数据。
+    
+    使用紧凑的 slots 对象保存，只在调用 mem0 前通过 ``to_dict`` 转换为字典。
+    """
+    memory_type: str                     # 记忆类型（user/expert/project/general）
+    user_id: str                         # 用户ID
+    agent_id: Optional[str] = None       # 代理ID
+    session_id: Optional[str] = None     # 会话ID
+    is_project_memory: bool = False      # 是否为项目记忆
+    is_expert_memory: bool = False       # 是否为专家记忆
+    expert_domain: Optional[str] = None  # 专家领域
+    
+    def to_dict(self, role: str = "user") -> Dict[str, Any]:
+        """转换为 mem0 使用的元数据字典，未设置的标识与领域字段不输出。
+        
+        Args:
+            role: 消息角色
+            
+        Returns:
+            元数据字典
+        """
+        data: Dict[str, Any] = {
+            "role": role,
+            "user_id": self.user_id,
+            "agent_id": self.agent_id,
+            "session_id": self.session_id,
+            "memory_type": self.memory_type
+        }
+        if self.is_project_memory:
+            data["is_project_memory"] = True
+        if self.is_expert_memory:
+            data["is_expert_memory"] = True
+        if self.expert_domain:
+            data["expert_domain"] = self.expert_domain
+        return data
+
 @dataclass
 class SpecialistResult:
     """单个专家代理在某次项目任务中的输出。
@@ -98,21 +212,156 @@ class MultiAgentResult:
     specialist_outputs: List[SpecialistResult]  # 专家智能体的输出列表
     final_response: ChatResponse      # 最终响应
 
+class _UserHistory:
+    """单个用户的对话缓存：消息队列与对应的 token 数并行存放，并维护 token 总数。
+    
+    开启压缩时，被淘汰的消息暂存在 evicted 中，等待合并进滚动摘要 summary。
+    lock 保护该用户的全部字段，不同用户之间互不阻塞。
+    """
+    
+    __slots__ = ("messages", "tokens", "total_tokens", "summary", "evicted", "compacting", "generation", "lock", "stats")
+    
+    def __init__(self):
+        self.messages: deque = deque()  # Msg 消息，最旧到最新
+        self.tokens: deque = deque()    # 与 messages 一一对应的 token 数
+        self.total_tokens = 0           # 当前缓存的 token 总数
+        self.summary: Optional[str] = None  # 已淘汰消息的滚动摘要
+        self.evicted: List[Msg] = []    # 尚未合并进摘要的已淘汰消息
+        self.compacting = False         # 是否正在压缩
+        self.generation = 0             # 清空代数，每次 clear 递增；压缩结果只写回开始时的同一代
+        self.lock = threading.Lock()    # 用户级锁
+        self.stats: Optional[ConversationStats] = None  # 缓存的统计信息，消息变化时置空
+    
+    def append(
+        self,
+        message: Msg,
+        token_count: int,
+        max_size: int,
+        max_tokens: Optional[int],
+        max_evicted: int = 0
+    ) -> int:
+        """追加消息，并从最旧的一端淘汰，直到条数与 token 数都在预算内（最新一条始终保留）。
+        
+        Args:
+            message: 新消息
+            token_count: 新消息的 token 数
+            max_size: 最大消息条数
+            max_tokens: 最大 token 数，None 表示不限制
+            max_evicted: 最多暂存多少条待压缩的淘汰消息，0 表示直接丢弃
+        
+        Returns:
+            消息条数的净变化（新增 1 条减去淘汰条数）
+        """
+        self.messages.append(message)
+        self.tokens.append(token_count)
+        self.total_tokens += token_count
+        self.stats = None
+        evicted = 0
+        while len(self.messages) > 1 and (
+            len(self.messages) > max_size
+            or (max_tokens is not None and self.total_tokens > max_tokens)
+        ):
+            dropped = self.messages.popleft()
+            self.total_tokens -= self.tokens.popleft()
+            evicted += 1
+            if max_evicted > 0:
+                self.evicted.append(dropped)
+        # 摘要迟迟未能生成时，待压缩消息也有上限，超出部分从最旧的开始丢弃
+        if len(self.evicted) > max_evicted:
+            del self.evicted[:len(self.evicted) - max_evicted]
+        return 1 - evicted
+    
+    def clear(self):
+        """清空缓存。"""
+        self.messages.clear()
+        self.tokens.clear()
+        self.total_tokens = 0
+        self.stats = None
+        self.summary = None
+        self.evicted.clear()
+        self.compacting = False
+        self.generation += 1  # 进行中的压缩结果将被丢弃
+
+
 class ConversationCache:
     """对话缓存管理
     
     用于管理和存储用户对话的缓存系统，支持按用户ID隔离缓存，
-    使用双端队列实现，支持固定大小和自动淘汰最旧消息。
+    使用双端队列实现，同时按消息条数和估算 token 数淘汰最旧消息。
+    用户维度按 LRU 管理：用户数或全局消息总数超过上限时，整体淘汰最久未访问用户的缓存。
+    线程安全：全局锁只保护用户表与消息总数，单个用户的读写由用户级锁保护；
+    锁的获取顺序固定为先全局后用户，持有用户锁时不再获取全局锁。
+    开启增量压缩后，被淘汰的消息攒满一批即可通过 ``compact`` 合并进该用户的滚动摘要，
+    每次只处理新淘汰的一批消息，以上一次的摘要为基础。
     """
     
-    def __init__(self, max_size: int = 5):
+    def __init__(
+        self,
+        max_size: int = 5,
+        max_tokens: Optional[int] = None,
+        max_users: Optional[int] = None,
+        max_total_messages: Optional[int] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+        compaction_batch: Optional[int] = None
+    ):
         """初始化对话缓存
         
         Args:
             max_size: 每个用户缓存的最大消息数，超过此大小会自动淘汰最旧的消息
+            max_tokens: 每个用户缓存的最大估算 token 数，None 表示不限制
+            max_users: 最多缓存的用户数，None 表示不限制
+            max_total_messages: 所有用户缓存的消息总数上限，None 表示不限制
+            on_evict: 用户缓存被整体淘汰时的回调，参数为用户ID
+            compaction_batch: 每攒满多少条淘汰消息压缩一次，None 表示不压缩（直接丢弃）
         """
-        self._cache = {}  # 存储用户ID到其消息队列的映射
         self.max_size = max_size  # 每个用户的最大缓存大小
+        self.max_tokens = max_tokens  # 每个用户的最大 token 预算
+        self.max_users = max_users  # 最大用户数
+        self.max_total_messages = max_total_messages  # 全局消息预算
+        self.on_evict = on_evict  # 用户淘汰回调
+        self.compaction_batch = compaction_batch  # 压缩批大小
+        # 待压缩消息的暂存上限：允许积压几批，避免摘要持续失败时无限增长
+        self._max_evicted = compaction_batch * 4 if compaction_batch else 0
+        # 用户ID -> 对话缓存，按最近访问顺序排列（最久未访问在前）
+        self._cache: "OrderedDict[str, _UserHistory]" = OrderedDict()
+        self._total_messages = 0  # 所有用户缓存的消息总数
+        self._lock = threading.Lock()
+    
+    def _history(self, user_id: str, create: bool = True) -> Optional[_UserHistory]:
+        """取用户缓存并标记为最近访问；不存在时按需创建（创建时可能淘汰其他用户）。"""
+        with self._lock:
+            history = self._cache.get(user_id)
+            if history is not None:
+                self._cache.move_to_end(user_id)
+                return history
+            if not create:
+                return None
+            history = self._cache[user_id] = _UserHistory()
+            evicted = self._evict_locked()
+        self._notify_evicted(evicted)
+        return history
+    
+    def _evict_locked(self) -> List[str]:
+        """淘汰最久未访问的用户，直到用户数与消息总数都在上限内（当前用户始终保留）；调用方需持有锁。"""
+        evicted: List[str] = []
+        while len(self._cache) > 1 and (
+            (self.max_users is not None and len(self._cache) > self.max_users)
+            or (self.max_total_messages is not None and self._total_messages > self.max_total_messages)
+        ):
+            user_id, history = self._cache.popitem(last=False)
+            self._total_messages -= len(history.messages)
+            evicted.append(user_id)
+        return evicted
+    
+    def _notify_evicted(self, evicted: List[str]):
+        """在锁外通知被淘汰的用户，回调异常不影响缓存本身。"""
+        if self.on_evict is None:
+            return
+        for user_id in evicted:
+            try:
+                self.on_evict(user_id)
+            except Exception:  # noqa: BLE001 - 回调由调用方提供
+                pass
     
     def get_user_cache(self, user_id: str) -> deque:
         """获取用户对话缓存
@@ -125,10 +374,7 @@ class ConversationCache:
         Returns:
             deque: 用户的消息队列，包含该用户的对话历史
         """
-        if user_id not in self._cache:
-            # 如果用户缓存不存在，创建新的双端队列
-            self._cache[user_id] = deque(maxlen=self.max_size)
-        return self._cache[user_id]
+        return self._history(user_id).messages
     
     def add_message(self, user_id: str, message: ChatMessage):
         """添加消息到缓存
@@ -139,11 +385,18 @@ class ConversationCache:
             user_id: 用户ID，用于标识唯一用户
             message: 要添加的聊天消息对象
         """
-        cache = self.get_user_cache(user_id)
-        # 将消息转换为字典格式后添加到队列
-        cache.append(message.to_dict())
+        # 转换为不可变的 Msg 后添加到队列，超出条数或 token 预算时自动淘汰最旧消息
+        history = self._history(user_id)
+        with history.lock:
+            delta = history.append(
+                message.to_msg(), message.token_count, self.max_size, self.max_tokens, self._max_evicted
+            )
+        with self._lock:
+            self._total_messages += delta
+            evicted = self._evict_locked() if self.max_total_messages is not None else []
+        self._notify_evicted(evicted)
     
-    def get_messages(self, user_id: str) -> List[Dict[str, str]]:
+    def get_messages(self, user_id: str) -> List[Msg]:
         """获取用户所有缓存消息
         
         获取用户缓存中的所有消息，按时间顺序排列（最旧到最新）。
@@ -152,11 +405,15 @@ class ConversationCache:
             user_id: 用户ID，用于标识唯一用户
             
         Returns:
-            List[Dict[str, str]]: 用户的所有缓存消息列表
+            List[Msg]: 用户的所有缓存消息列表
         """
-        return list(self.get_user_cache(user_id))
+        history = self._history(user_id, create=False)
+        if history is None:
+            return []
+        with history.lock:
+            return list(history.messages)
     
-    def get_recent_messages(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    def get_recent_messages(self, user_id: str, limit: Optional[int] = None) -> List[Msg]:
         """获取指定数量的最新消息，用于构建上下文窗口。
         
         根据指定的限制获取用户最近的消息，常用于构建LLM的上下文窗口。
@@ -166,12 +423,33 @@ class ConversationCache:
             limit: 要获取的最新消息数量，如果为None或<=0则返回所有消息
             
         Returns:
-            List[Dict[str, str]]: 用户的最新消息列表，按时间顺序排列（最旧到最新）
+            List[Msg]: 用户的最新消息列表，按时间顺序排列（最旧到最新）
+        """
+        history = self._history(user_id, create=False)
+        if history is None:
+            return []
+        with history.lock:
+            cache = history.messages
+            if limit is None or limit <= 0 or limit >= len(cache):
+                return list(cache)
+            # 从队列尾部反向只遍历最后N条，再翻转回时间顺序；不逐个跳过前面的消息
+            recent = list(islice(reversed(cache), limit))
+        recent.reverse()
+        return recent
+    
+    def to_openai_messages(self, user_id: str, limit: Optional[int] = None) -> List[WireMessage]:
+        """以 OpenAI 兼容的 role/content 字典列表返回最新消息
+        
+        缓存内部只存放 Msg 元组，需要字典的外部接口在边界处一次性转换。
+        
+        Args:
+            user_id: 用户ID，用于标识唯一用户
+            limit: 要获取的最新消息数量，如果为None或<=0则返回所有消息
+            
+        Returns:
+            List[WireMessage]: 消息字典列表，按时间顺序排列（最旧到最新）
         """
-        messages = self.get_messages(user_id)
-        if limit is None or limit <= 0:
-            return messages
-        return messages[-limit:]  # 返回最后N条消息
+        return [{"role": role, "content": content} for role, content in self.get_recent_messages(user_id, limit)]
     
     def clear(self, user_id: str):
         """清空用户缓存
@@ -181,8 +459,90 @@ class ConversationCache:
         Args:
             user_id: 用户ID，用于标识唯一用户
         """
-        if user_id in self._cache:
-            self._cache[user_id].clear()
+        history = self._history(user_id, create=False)
+        if history is None:
+            return
+        with history.lock:
+            removed = len(history.messages)
+            history.clear()
+        with self._lock:
+            self._total_messages -= removed
+    
+    def get_summary(self, user_id: str) -> Optional[str]:
+        """获取用户已淘汰消息的滚动摘要
+        
+        Args:
+            user_id: 用户ID，用于标识唯一用户
+            
+        Returns:
+            Optional[str]: 摘要文本，尚未压缩过时返回None
+        """
+        history = self._history(user_id, create=False)
+        if history is None:
+            return None
+        with history.lock:
+            return history.summary
+    
+    def needs_compaction(self, user_id: str) -> bool:
+        """判断用户的待压缩消息是否已攒满一批
+        
+        Args:
+            user_id: 用户ID，用于标识唯一用户
+            
+        Returns:
+            bool: 需要压缩且当前没有进行中的压缩时返回True
+        """
+        if not self.compaction_batch:
+            return False
+        history = self._history(user_id, create=False)
+        if history is None:
+            return False
+        with history.lock:
+            return not history.compacting and len(history.evicted) >= self.compaction_batch
+    
+    def compact(
+        self,
+        user_id: str,
+        summarizer_fn: Callable[[Optional[str], List[Msg]], str]
+    ) -> bool:
+        """把待压缩的淘汰消息合并进用户的滚动摘要
+        
+        summarizer_fn 只接收上一次的摘要和本批新淘汰的消息，单次压缩的开销与历史总长度无关。
+        摘要生成失败时消息放回待压缩队列，异常向上抛出。
+        
+        Args:
+            user_id: 用户ID，用于标识唯一用户
+            summarizer_fn: 摘要函数，参数为 (上一次的摘要, 本批消息)，返回新摘要
+            
+        Returns:
+            bool: 是否执行了压缩
+        """
+        history = self._history(user_id, create=False)
+        if history is None:
+            return False
+        # 摘要函数（通常是一次LLM调用）在锁外执行，只在交换待压缩消息与写回摘要时持锁
+        with history.lock:
+            if history.compacting or not history.evicted:
+                return False
+            history.compacting = True
+            generation = history.generation
+            batch, history.evicted = history.evicted, []
+            previous = history.summary
+        try:
+            summary = summarizer_fn(previous, batch)
+        except Exception:
+            with history.lock:
+                if history.generation == generation:
+                    history.evicted[:0] = batch
+                    del history.evicted[:max(0, len(history.evicted) - self._max_evicted)]
+                    history.compacting = False
+            raise
+        with history.lock:
+            # 压缩期间用户缓存被清空（代数已变化）时丢弃结果，也不影响清空后开始的新一轮压缩
+            if history.generation == generation:
+                history.summary = summary
+                history.compacting = False
+        return True
     
     def get_stats(self, user_id: str) -> ConversationStats:
         """获取缓存统计
@@ -195,9 +555,15 @@ class ConversationCache:
         Returns:
             ConversationStats: 包含用户缓存统计信息的对象
         """
-        cache = self.get_user_cache(user_id)
-        return ConversationStats(
-            user_id=user_id,
-            cached_conversations=len(cache),  # 当前缓存的消息数量
-            cache_max_size=self.max_size  # 缓存的最大大小
-        )
\ No newline at end of file
+        history = self._history(user_id, create=False)
+        if history is None:
+            return ConversationStats(user_id=user_id, cached_conversations=0, cache_max_size=self.max_size)
+        with history.lock:
+            # 缓存未变化时直接返回上一次构建的不可变统计对象
+            if history.stats is None:
+                history.stats = ConversationStats(
+                    user_id=user_id,
+                    cached_conversations=len(history.messages),  # 当前缓存的消息数量
+                    cache_max_size=self.max_size  # 缓存的最大大小
+                )
+            return history.stats
\ No newline at end of file
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多代理控制器项目摘要缓存测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.agent_controller import MultiAgentController
+from core.chat_engine import ChatEngine
+from core.memory_manager import MemoryManager
+from test_memory_manager import FakeMemory
+
+# 项目大脑摘要提示中的固定文字，用于区分摘要调用与其他 LLM 调用
+_SUMMARY_MARKER = "3. 需要协调的专家领域"
+# 命中算法专家关键词的提问
+_QUESTION = "推荐模型怎么训练？"
+
+
+def _controller():
+    """构造使用替身记忆后端、LLM 调用被替换的控制器，返回 (控制器, 摘要调用计数, 记忆写入记录)"""
+    memory_manager = MemoryManager()
+    memory_manager._memory = FakeMemory()
+    memory_manager._capabilities = memory_manager._detect_capabilities(memory_manager._memory)
+    engine = ChatEngine(memory_manager)
+    summary_calls = []
+    writes = []
+
+    def fake_llm(messages):
+        if any(_SUMMARY_MARKER in message.content for message in messages):
+            summary_calls.append(messages)
+            return f"摘要 {len(summary_calls)}"
+        return "回复"
+
+    engine._call_llm = fake_llm
+    engine.submit_memory_write = lambda **kwargs: writes.append(kwargs)
+    return MultiAgentController(engine), summary_calls, writes
+
+
+def _project_brain_writes(writes):
+    """项目大脑摘要调用写入的记忆"""
+    return [write for write in writes if _SUMMARY_MARKER in write["content"]]
+
+
+def test_summary_cache_reused_within_session():
+    """同一会话重复提问复用摘要，且照常写入项目大脑记忆"""
+    controller, summary_calls, writes = _controller()
+    first = controller.process_user_message(_QUESTION, "u1", "s1")
+    second = controller.process_user_message(_QUESTION, "u1", "s1")
+
+    assert len(summary_calls) == 1
+    assert second.project_summary == first.project_summary
+    assert len(_project_brain_writes(writes)) == 2
+
+
+def test_summary_cache_is_per_session():
+    """不同会话不共享摘要"""
+    controller, summary_calls, _ = _controller()
+    controller.process_user_message(_QUESTION, "u1", "s1")
+    controller.process_user_message(_QUESTION, "u1", "s2")
+
+    assert len(summary_calls) == 2
+
+
+def test_summary_cache_invalidated_by_clear():
+    """清空对话缓存后不再复用旧历史生成的摘要"""
+    controller, summary_calls, _ = _controller()
+    controller.process_user_message(_QUESTION, "u1", "s1")
+    controller.chat_engine.clear_conversation_cache("u1")
+    result = controller.process_user_message(_QUESTION, "u1", "s1")
+
+    assert len(summary_calls) == 2
+    assert result.project_summary == "摘要 2"
+
+
+if __name__ == "__main__":
+    test_summary_cache_reused_within_session()
+    test_summary_cache_is_per_session()
+    test_summary_cache_invalidated_by_clear()
+    print("项目摘要缓存测试通过")
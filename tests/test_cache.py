@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TTL 缓存测试
+"""
+
+import sys
+import os
+import time
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache import TTLCache
+
+
+def test_entries_expire_after_ttl():
+    """条目在 ttl 秒后过期，过期条目读取时被移除"""
+    cache = TTLCache(maxsize=4, ttl=0.05)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+    time.sleep(0.08)
+    assert cache.get("k") is None
+    assert cache.get("k", "default") == "default"
+    assert len(cache) == 0
+
+
+def test_rewrite_refreshes_expiry():
+    """重新写入会刷新过期时间"""
+    cache = TTLCache(maxsize=4, ttl=0.1)
+    cache.set("k", 1)
+    time.sleep(0.06)
+    cache.set("k", 2)
+    time.sleep(0.06)
+    assert cache.get("k") == 2
+
+
+def test_evicts_least_recently_used():
+    """超过 maxsize 时淘汰最久未使用的条目"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_zero_maxsize_disables_cache():
+    """maxsize 为 0 时不缓存任何条目"""
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.set("k", "v")
+    assert cache.get("k") is None
+
+
+if __name__ == "__main__":
+    test_entries_expire_after_ttl()
+    test_rewrite_refreshes_expiry()
+    test_evicts_least_recently_used()
+    test_zero_maxsize_disables_cache()
+    print("TTL 缓存测试通过")
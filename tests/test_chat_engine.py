@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天引擎 LLM 请求测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from core.chat_engine import ChatEngine
+from core.memory_manager import MemoryManager
+from models.data_models import Msg
+from test_memory_manager import FakeMemory
+
+_MESSAGES = [Msg(role="user", content="你好")]
+
+
+def _engine(handler, retries=2):
+    """构造 LLM 请求经 handler 响应、退避等待为 0 的聊天引擎"""
+    memory_manager = MemoryManager()
+    memory_manager._memory = FakeMemory()
+    memory_manager._capabilities = memory_manager._detect_capabilities(memory_manager._memory)
+    engine = ChatEngine(memory_manager)
+    engine._llm_client = httpx.Client(base_url="http://llm.test/v1/", transport=httpx.MockTransport(handler))
+    engine._throttle_retries = retries
+    engine._backoff_base = 0
+    return engine
+
+
+def _completion(content):
+    """OpenAI 兼容的非流式回复"""
+    return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+
+def test_transport_errors_are_retried():
+    """连接失败、读超时按退避重试，恢复后正常返回"""
+    errors = [httpx.ConnectError("连接被拒绝"), httpx.ReadTimeout("读取超时")]
+
+    def handler(request):
+        if errors:
+            raise errors.pop(0)
+        return _completion("好的")
+
+    response = _engine(handler)._send_llm_request(_MESSAGES)
+    assert response.json()["choices"][0]["message"]["content"] == "好的"
+
+
+def test_transport_error_raised_after_retries():
+    """传输错误重试耗尽后抛出原异常"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("连接被拒绝")
+
+    try:
+        _engine(handler, retries=2)._send_llm_request(_MESSAGES)
+    except httpx.ConnectError:
+        assert len(calls) == 3
+        return
+    raise AssertionError("重试耗尽后应抛出 ConnectError")
+
+
+def test_null_content_becomes_empty_reply():
+    """LLM 返回 content 为 null 时按空回复处理，不会因消息校验失败"""
+    engine = _engine(lambda request: _completion(None))
+
+    assert engine._call_llm(_MESSAGES) == ""
+    response = engine.generate_response("你好", "u1")
+    assert response.content == ""
+    assert [message.content for message in engine.conversation_cache.get_messages("u1")] == ["你好", ""]
+
+
+def test_stream_skips_null_deltas():
+    """流式回复中 content 为 null 的片段被跳过，回复正常入缓存"""
+    body = (
+        'data: {"choices": [{"delta": {"role": "assistant", "content": null}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "好"}}]}\n\n'
+        "data: [DONE]\n\n"
+    )
+    engine = _engine(lambda request: httpx.Response(200, text=body))
+    stream = engine.generate_response_stream("你好", "u1")
+    deltas = []
+    try:
+        while True:
+            deltas.append(next(stream))
+    except StopIteration as stop:
+        response = stop.value
+
+    assert deltas == ["好"]
+    assert response.content == "好"
+
+
+if __name__ == "__main__":
+    test_transport_errors_are_retried()
+    test_transport_error_raised_after_retries()
+    test_null_content_becomes_empty_reply()
+    test_stream_skips_null_deltas()
+    print("聊天引擎 LLM 请求测试通过")
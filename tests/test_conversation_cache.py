@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话缓存测试
+"""
+
+import sys
+import os
+import threading
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.data_models import ChatMessage, ConversationCache
+
+
+def _fill(cache, user_id, count, content="m"):
+    """向用户缓存追加 count 条消息"""
+    for i in range(count):
+        cache.add_message(user_id, ChatMessage(role="user", content=f"{content}{i}"))
+
+
+def _contents(cache, user_id):
+    """返回用户缓存中的消息内容，最旧到最新"""
+    return [message.content for message in cache.get_messages(user_id)]
+
+
+def test_evicts_oldest_messages_by_count():
+    """超过条数上限时淘汰最旧的消息"""
+    cache = ConversationCache(max_size=3)
+    _fill(cache, "u", 5)
+
+    assert _contents(cache, "u") == ["m2", "m3", "m4"]
+
+
+def test_evicts_oldest_messages_by_tokens():
+    """超过 token 预算时淘汰最旧的消息，最新一条始终保留"""
+    cache = ConversationCache(max_size=100, max_tokens=4)
+    for content in ("aaaaaaaa", "bbbbbbbb", "cccccccc"):  # 每条约 2 token
+        cache.add_message("u", ChatMessage(role="user", content=content))
+
+    assert _contents(cache, "u") == ["bbbbbbbb", "cccccccc"]
+
+    cache.add_message("u", ChatMessage(role="user", content="d" * 40))  # 单条即超出预算
+    assert _contents(cache, "u") == ["d" * 40]
+
+
+def test_evicts_least_recently_used_user():
+    """用户数超过上限时整体淘汰最久未访问的用户，并回调通知"""
+    evicted = []
+    cache = ConversationCache(max_size=5, max_users=2, on_evict=evicted.append)
+    _fill(cache, "alice", 1)
+    _fill(cache, "bob", 1)
+    cache.get_messages("alice")  # 访问后 alice 成为最近使用
+    _fill(cache, "carol", 1)
+
+    assert evicted == ["bob"]
+    assert _contents(cache, "bob") == []
+    assert _contents(cache, "alice") == ["m0"]
+    assert _contents(cache, "carol") == ["m0"]
+
+
+def test_evicts_users_over_total_message_limit():
+    """全局消息总数超限时淘汰最久未访问的用户，当前用户始终保留"""
+    evicted = []
+    cache = ConversationCache(max_size=10, max_total_messages=4, on_evict=evicted.append)
+    _fill(cache, "alice", 3)
+    _fill(cache, "bob", 2)
+
+    assert evicted == ["alice"]
+    _fill(cache, "bob", 5)
+    assert len(_contents(cache, "bob")) == 7
+
+
+def test_stale_compaction_after_clear_is_dropped():
+    """压缩期间清空缓存并开始新一轮压缩时，旧压缩的摘要不会写回，也不打断新一轮压缩"""
+    cache = ConversationCache(max_size=2, compaction_batch=2)
+
+    def blocking_summarizer(result):
+        started, release = threading.Event(), threading.Event()
+
+        def summarize(previous, batch):
+            started.set()
+            release.wait(5)
+            return result
+        return summarize, started, release
+
+    _fill(cache, "u", 4, "old")
+    stale_fn, stale_started, stale_release = blocking_summarizer("stale")
+    stale_worker = threading.Thread(target=cache.compact, args=("u", stale_fn))
+    stale_worker.start()
+    stale_started.wait(5)
+
+    cache.clear("u")
+    _fill(cache, "u", 4, "new")
+    fresh_fn, fresh_started, fresh_release = blocking_summarizer("fresh")
+    fresh_worker = threading.Thread(target=cache.compact, args=("u", fresh_fn))
+    fresh_worker.start()
+    fresh_started.wait(5)
+
+    # 旧压缩先于新压缩完成
+    stale_release.set()
+    stale_worker.join(5)
+    assert cache.get_summary("u") is None
+    fresh_release.set()
+    fresh_worker.join(5)
+    assert cache.get_summary("u") == "fresh"
+
+
+if __name__ == "__main__":
+    test_evicts_oldest_messages_by_count()
+    test_evicts_oldest_messages_by_tokens()
+    test_evicts_least_recently_used_user()
+    test_evicts_users_over_total_message_limit()
+    test_stale_compaction_after_clear_is_dropped()
+    print("对话缓存测试通过")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化微批处理测试
+"""
+
+import sys
+import os
+import threading
+from types import SimpleNamespace
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.embeddings import EmbeddingBatcher
+
+
+class _FakeEmbeddingsAPI:
+    """记录 ``embeddings.create`` 调用的 OpenAI 兼容客户端"""
+
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(kwargs["input"])]
+        # 乱序返回，批处理器需按 index 还原顺序
+        return SimpleNamespace(data=data[::-1])
+
+
+class HuggingFaceEmbedding:
+    """模拟 mem0 1.x 中连接 TEI 服务的 HuggingFaceEmbedding（无 embed_batch）"""
+
+    def __init__(self):
+        self.config = SimpleNamespace(model="tei", model_kwargs={}, huggingface_base_url="http://tei", embedding_dims=None)
+        self.api = _FakeEmbeddingsAPI()
+        self.client = SimpleNamespace(embeddings=self.api)
+
+    def embed(self, text, memory_action=None):
+        return self.client.embeddings.create(
+            input=text, model=self.config.model, **self.config.model_kwargs
+        ).data[0].embedding
+
+
+def _embed_concurrently(batcher, texts):
+    """并发提交多条文本，返回 文本 -> 向量"""
+    results = {}
+    threads = [
+        threading.Thread(target=lambda text=text: results.__setitem__(text, batcher.embed(text, "search")))
+        for text in texts
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_tei_batch_issues_single_create_call():
+    """同一窗口内的多条文本合并为一次 create(input=[...])，参数与单条调用一致"""
+    embedder = HuggingFaceEmbedding()
+    batcher = EmbeddingBatcher(embedder, window_ms=200, cache_size=0)
+    texts = ["a", "bb", "ccc", "dddd"]
+
+    results = _embed_concurrently(batcher, texts)
+
+    assert results == {text: [float(len(text))] for text in texts}
+    assert len(embedder.api.calls) == 1
+    call = embedder.api.calls[0]
+    assert sorted(call["input"]) == sorted(texts)
+    assert call["model"] == "tei"
+
+
+def test_unknown_embedder_is_not_batched():
+    """无法复现单条调用参数的 embedder 不做批量合并，逐条调用 embed"""
+    calls = []
+
+    class CustomEmbedding:
+        config = SimpleNamespace(model=None)
+        client = SimpleNamespace(embeddings=_FakeEmbeddingsAPI())
+
+        def embed(self, text, memory_action=None):
+            calls.append(text)
+            return [1.0]
+
+    embedder = CustomEmbedding()
+    batcher = EmbeddingBatcher(embedder, window_ms=50, cache_size=0)
+
+    _embed_concurrently(batcher, ["x", "y", "z"])
+
+    assert sorted(calls) == ["x", "y", "z"]
+    assert embedder.client.embeddings.calls == []
+
+
+if __name__ == "__main__":
+    test_tei_batch_issues_single_create_call()
+    test_unknown_embedder_is_not_batched()
+    print("向量化微批处理测试通过")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+记忆管理器多范围检索测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mem0.memory.main import Memory
+from mem0.vector_stores.qdrant import Qdrant
+from pydantic import ValidationError
+
+from core.memory_manager import MemoryManager
+
+_ENTRIES = [
+    {"memory": "喜欢简洁的回答", "metadata": {"memory_type": "user"}},
+    {"memory": "推荐用 Transformer", "agent_id": "algo_scientist", "metadata": {"memory_type": "expert"}},
+    {"memory": "其他专家的记忆", "agent_id": "product_lead", "metadata": {"memory_type": "expert"}},
+    {"memory": "用户偏好中文", "metadata": {"memory_type": "user"}},
+]
+
+_SCOPES = {
+    "user": {"memory_type": "user"},
+    "expert": {"memory_type": "expert", "agent_id": "algo_scientist", "expert_domain": None},
+}
+
+
+def _field(entry, key):
+    """按 Qdrant 载荷路径读取字段（如 metadata.memory_type）"""
+    value = entry
+    for part in key.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+class FakeMemory:
+    """mem0 Memory 替身：过滤条件经过 mem0 与 Qdrant 后端的真实转换，再在内存中匹配"""
+
+    def __init__(self):
+        self.calls = []
+
+    def search(self, query, *, user_id=None, agent_id=None, run_id=None, limit=100, filters=None, threshold=None):
+        self.calls.append({"query": query, "agent_id": agent_id, "limit": limit, "filters": filters})
+        effective_filters = {"user_id": user_id}
+        if agent_id:
+            effective_filters["agent_id"] = agent_id
+        if filters and Memory._has_advanced_operators(None, filters):
+            effective_filters.update(Memory._process_metadata_filters(None, filters))
+        elif filters:
+            effective_filters.update(filters)
+        # 与真实后端一致：Qdrant 无法表达的过滤条件在这里抛出 ValidationError
+        Qdrant._create_filter(None, effective_filters)
+        conditions = {key: value for key, value in effective_filters.items() if key != "user_id"}
+        results = [
+            entry for entry in _ENTRIES
+            if all(_field(entry, key) == value for key, value in conditions.items())
+        ]
+        return {"results": results[:limit]}
+
+    def add(self, messages, *, user_id=None, agent_id=None, run_id=None, metadata=None, infer=True):
+        return {"results": []}
+
+    def get_all(self, *, user_id=None, agent_id=None, run_id=None, filters=None, limit=100):
+        return {"results": []}
+
+
+def _manager(memory):
+    """构造使用替身后端的记忆管理器（不初始化真实的 mem0）"""
+    manager = MemoryManager()
+    manager._memory = memory
+    manager._capabilities = manager._detect_capabilities(memory)
+    return manager
+
+
+def test_or_filter_is_rejected_by_qdrant_backend():
+    """mem0 的 OR 组合过滤无法转换为 Qdrant 过滤条件，multi_search 不能依赖它"""
+    try:
+        FakeMemory().search("推荐", user_id="u1", filters={"OR": [{"agent_id": "a"}, {"agent_id": "b"}]})
+    except ValidationError:
+        return
+    raise AssertionError("OR 过滤应当被 Qdrant 后端拒绝")
+
+
+def test_multi_search_groups_per_scope():
+    """每个范围各检索一次，结果按范围返回"""
+    memory = FakeMemory()
+    grouped = _manager(memory).multi_search("推荐", "u1", _SCOPES, limit_per=5)
+
+    assert len(memory.calls) == len(_SCOPES)
+    assert [entry["memory"] for entry in grouped["user"]] == ["喜欢简洁的回答", "用户偏好中文"]
+    assert [entry["memory"] for entry in grouped["expert"]] == ["推荐用 Transformer"]
+
+
+def test_multi_search_respects_limit_per_scope():
+    """每个范围最多返回 limit_per 条结果"""
+    grouped = _manager(FakeMemory()).multi_search("推荐", "u1", _SCOPES, limit_per=1)
+
+    assert [entry["memory"] for entry in grouped["user"]] == ["喜欢简洁的回答"]
+    assert len(grouped["expert"]) == 1
+
+
+def test_multi_search_uses_retrieval_cache():
+    """逐范围检索经过 search_memories，重复查询命中检索缓存"""
+    memory = FakeMemory()
+    manager = _manager(memory)
+    first = manager.multi_search("推荐", "u1", _SCOPES, limit_per=5)
+    second = manager.multi_search("推荐", "u1", _SCOPES, limit_per=5)
+
+    assert second == first
+    assert len(memory.calls) == len(_SCOPES)
+
+
+def test_collaborative_context_searches_each_collaborator():
+    """每个协作者各检索一次，结果按专家领域分组展示"""
+    memory = FakeMemory()
+    context = _manager(memory).get_collaborative_context(
+        "推荐", "u1", "project_brain", None, ["algo_scientist", "product_lead", "algo_scientist"], 5
+    )
+
+    searched_agents = sorted(call["agent_id"] for call in memory.calls if call["agent_id"])
+    assert searched_agents == ["algo_scientist", "product_lead", "project_brain"]
+    formatted = context["formatted"]
+    assert "### 算法专家 的记忆片段：\n- [expert] 推荐用 Transformer" in formatted
+    assert "### 产品专家 的记忆片段：\n- [expert] 其他专家的记忆" in formatted
+
+
+def test_client_errors_do_not_arm_cooldown():
+    """确定性的客户端错误走备选检索且不开启冷却；连接错误才开启冷却"""
+    memory = FakeMemory()
+    manager = _manager(memory)
+    search = memory.search
+
+    def failing_search(error):
+        def search_once(query, **kwargs):
+            if kwargs.get("filters"):
+                raise error
+            return search(query, **kwargs)
+        return search_once
+
+    memory.search = failing_search(ValueError("非法过滤条件"))
+    assert manager.search_memories("推荐", "u1", memory_type="user")["results"]
+    assert not manager._backend_recently_failed()
+
+    memory.search = failing_search(ConnectionError("连接被拒绝"))
+    manager.search_memories("推荐", "u1", memory_type="expert")
+    assert manager._backend_recently_failed()
+    assert not manager._backend_recently_failed("write")
+
+
+if __name__ == "__main__":
+    test_or_filter_is_rejected_by_qdrant_backend()
+    test_multi_search_groups_per_scope()
+    test_multi_search_respects_limit_per_scope()
+    test_multi_search_uses_retrieval_cache()
+    test_collaborative_context_searches_each_collaborator()
+    test_client_errors_do_not_arm_cooldown()
+    print("多范围检索测试通过")
@@ -15,6 +15,14 @@ from core.memory_manager import MemoryManager
 from core.agent_controller import MultiAgentController
 from core.chat_engine import ChatEngine
 from config.settings import Config
+from utils.helpers import format_memory
+
+def _print_memories(label: str, memories):
+    """打印记忆数量及前 3 条记忆；返回值为字典时按其值处理"""
+    mem_values = list(memories.values() if isinstance(memories, dict) else memories)
+    print(f"{label}记忆数量: {len(mem_values)}")
+    for mem in mem_values[:3]:
+        print(f"  - {format_memory(mem)[:50]}...")
 
 def test_expert_memory_isolation():
     """测试专家大脑的记忆隔离功能"""
@@ -66,110 +74,24 @@ def test_expert_memory_isolation():
     
     # 4. 验证记忆隔离
     print("\n4. 验证记忆隔离...")
+    # 等待后台记忆写入完成
+    chat_engine.flush_memory_writes()
     
     # 获取产品专家的记忆
     product_memories = memory_manager.get_all_memories(test_user_id, agent_id="product_lead", memory_type="expert")
-    # 检查返回值类型并正确处理
-    if isinstance(product_memories, dict):
-        # 提取字典中的值部分
-        mem_values = list(product_memories.values())
-        print(f"产品专家记忆数量: {len(mem_values)}")
-        for i, mem in enumerate(mem_values[:3]):
-            # 根据不同类型进行处理
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
-    else:
-        # 假设是列表的情况
-        print(f"产品专家记忆数量: {len(product_memories)}")
-        for i, mem in enumerate(product_memories[:3]):
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
+    _print_memories("产品专家", product_memories)
     
     # 获取算法专家的记忆
     algo_memories = memory_manager.get_all_memories(test_user_id, agent_id="algo_scientist", memory_type="expert")
-    # 检查返回值类型并正确处理
-    if isinstance(algo_memories, dict):
-        # 提取字典中的值部分
-        mem_values = list(algo_memories.values())
-        print(f"算法专家记忆数量: {len(mem_values)}")
-        for i, mem in enumerate(mem_values[:3]):
-            # 根据不同类型进行处理
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
-    else:
-        # 假设是列表的情况
-        print(f"算法专家记忆数量: {len(algo_memories)}")
-        for i, mem in enumerate(algo_memories[:3]):
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
+    _print_memories("算法专家", algo_memories)
     
     # 获取架构专家记忆
     arch_memories = memory_manager.get_all_memories(test_user_id, agent_id="solution_architect", memory_type="expert")
-    # 检查返回值类型并正确处理
-    if isinstance(arch_memories, dict):
-        # 提取字典中的值部分
-        mem_values = list(arch_memories.values())
-        print(f"架构专家记忆数量: {len(mem_values)}")
-        for i, mem in enumerate(mem_values[:3]):
-            # 根据不同类型进行处理
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
-    else:
-        # 假设是列表的情况
-        print(f"架构专家记忆数量: {len(arch_memories)}")
-        for i, mem in enumerate(arch_memories[:3]):
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
+    _print_memories("架构专家", arch_memories)
     
     # 获取用户记忆
     user_memories = memory_manager.get_all_memories(test_user_id)
-    # 检查返回值类型并正确处理
-    if isinstance(user_memories, dict):
-        # 提取字典中的值部分
-        mem_values = list(user_memories.values())
-        print(f"用户记忆数量: {len(mem_values)}")
-        for i, mem in enumerate(mem_values[:3]):
-            # 根据不同类型进行处理
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
-    else:
-        # 假设是列表的情况
-        print(f"用户记忆数量: {len(user_memories)}")
-        for i, mem in enumerate(user_memories[:3]):
-            if isinstance(mem, str):
-                print(f"  - {mem[:50]}...")
-            elif isinstance(mem, dict):
-                print(f"  - {mem.get('content', '')[:50]}...")
-            else:
-                print(f"  - {str(mem)[:50]}...")
+    _print_memories("用户", user_memories)
 
 def test_project_brain_integration():
     """测试项目大脑的整合功能"""
@@ -201,6 +123,7 @@ def test_project_brain_integration():
     
     # 获取项目大脑的协作上下文
     print("\n2. 获取项目协作上下文...")
+    chat_engine.flush_memory_writes()
     collaborative_context = memory_manager.get_collaborative_context(
         query="推荐系统",
         user_id=test_user_id,
@@ -234,6 +157,8 @@ def test_memory_persistence_across_interactions():
         target_agent="solution_architect"
     )
     
+    chat_engine.flush_memory_writes()
+    
     # 第二次交互 - 检查记忆是否保留
     print("\n2. 第二次交互 - 引用之前的信息...")
     second_result = agent_controller.process_user_message(
@@ -251,6 +176,8 @@ def test_memory_persistence_across_interactions():
     else:
         print("✗ 失败: 架构师未能引用之前提供的系统规模信息")
     
+    chat_engine.flush_memory_writes()
+    
     # 3. 切换到项目大脑，检查是否能访问专家记忆
     print("\n3. 切换到项目大脑，检查记忆共享...")
     project_result = agent_controller.process_user_message(
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web 服务中间件与接口测试
+"""
+
+import sys
+import os
+import asyncio
+import json
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from models.data_models import ChatResponse
+from web.server import (
+    BodySizeLimitMiddleware,
+    PureCORSMiddleware,
+    app,
+    get_chat_engine,
+    get_multi_agent_controller,
+)
+
+
+def _http_scope(method="GET", headers=()):
+    """构造最小的 HTTP ASGI scope"""
+    return {"type": "http", "method": method, "path": "/api/chat", "headers": list(headers)}
+
+
+def _run_asgi(app, scope, bodies=(b"",)):
+    """驱动一个 ASGI 应用，返回其发送的消息列表
+
+    bodies 为请求体分块，最后一块之外都标记 more_body。
+    """
+    chunks = list(bodies)
+    sent = []
+
+    async def receive():
+        if chunks:
+            body = chunks.pop(0)
+            return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+class _EchoApp:
+    """读取全部请求体后返回 200 的下游应用"""
+
+    def __init__(self):
+        self.called = False
+        self.body = b""
+
+    async def __call__(self, scope, receive, send):
+        self.called = True
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            self.body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_cors_preflight_short_circuits():
+    """预检请求直接返回 204，并回显声明的请求头"""
+    downstream = _EchoApp()
+    sent = _run_asgi(PureCORSMiddleware(downstream), _http_scope("OPTIONS", [
+        (b"origin", b"http://example.com"),
+        (b"access-control-request-method", b"POST"),
+        (b"access-control-request-headers", b"content-type"),
+    ]))
+
+    assert not downstream.called
+    start = sent[0]
+    assert start["status"] == 204
+    headers = dict(start["headers"])
+    assert headers[b"access-control-allow-origin"] == b"*"
+    assert b"POST" in headers[b"access-control-allow-methods"]
+    assert headers[b"access-control-allow-headers"] == b"content-type"
+
+
+def test_cors_simple_request_adds_allow_origin():
+    """普通请求透传给应用，并在响应头中追加 allow-origin"""
+    downstream = _EchoApp()
+    sent = _run_asgi(PureCORSMiddleware(downstream), _http_scope("GET", [(b"origin", b"http://example.com")]))
+
+    assert downstream.called
+    start = sent[0]
+    assert start["status"] == 200
+    assert (b"access-control-allow-origin", b"*") in start["headers"]
+    assert sent[1]["body"] == b"ok"
+
+
+def test_cors_plain_options_is_not_preflight():
+    """不带 access-control-request-method 的 OPTIONS 不是预检，交给应用处理"""
+    downstream = _EchoApp()
+    sent = _run_asgi(PureCORSMiddleware(downstream), _http_scope("OPTIONS"))
+
+    assert downstream.called
+    assert sent[0]["status"] == 200
+
+
+def test_body_limit_rejects_oversized_content_length():
+    """声明的 Content-Length 超限时直接返回 413，不调用应用"""
+    downstream = _EchoApp()
+    middleware = BodySizeLimitMiddleware(downstream, max_bytes=16)
+    sent = _run_asgi(middleware, _http_scope("POST", [(b"content-length", b"17")]), [b"x" * 17])
+
+    assert not downstream.called
+    assert sent[0]["status"] == 413
+    assert sent[1]["body"] == b"payload too large"
+
+
+def test_body_limit_rejects_oversized_chunked_body():
+    """未声明长度的分块请求体在累计超限时返回 413，应用收到断开消息且输出被丢弃"""
+    downstream = _EchoApp()
+    middleware = BodySizeLimitMiddleware(downstream, max_bytes=16)
+    sent = _run_asgi(middleware, _http_scope("POST", [(b"transfer-encoding", b"chunked")]), [b"x" * 10, b"x" * 10])
+
+    assert downstream.called
+    assert [message["type"] for message in sent] == ["http.response.start", "http.response.body"]
+    assert sent[0]["status"] == 413
+    assert downstream.body == b"x" * 10
+
+
+def test_body_limit_passes_body_within_limit():
+    """未超限的分块请求体完整交给应用"""
+    downstream = _EchoApp()
+    middleware = BodySizeLimitMiddleware(downstream, max_bytes=16)
+    sent = _run_asgi(middleware, _http_scope("POST"), [b"x" * 8, b"x" * 8])
+
+    assert downstream.body == b"x" * 16
+    assert sent[0]["status"] == 200
+
+
+class _StreamingEngine:
+    """逐片段产出回复的聊天引擎替身"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = []
+
+    def generate_response_stream(self, message, user_id, agent_id=None, session_id=None):
+        self.calls.append((message, user_id, agent_id, session_id))
+        for chunk in self.chunks:
+            yield chunk
+        return ChatResponse(content="".join(self.chunks), user_id=user_id, agent_id=agent_id, session_id=session_id)
+
+
+def _parse_sse(text):
+    """把 text/event-stream 响应解析为 [(事件名, 数据)]"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def test_chat_stream_emits_deltas_then_done():
+    """流式接口逐片段发送 delta 事件，最后发送与 /api/chat 结构相同的 done 事件"""
+    engine = _StreamingEngine(["你好", "，世界"])
+    app.dependency_overrides[get_chat_engine] = lambda: engine
+    app.dependency_overrides[get_multi_agent_controller] = lambda: None
+    try:
+        # 不进入 with 块，不触发 lifespan 中真实引擎的初始化
+        response = TestClient(app).post("/api/chat/stream", json={"message": "hi", "user_id": "u1"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    assert events[:2] == [("message", {"delta": "你好"}), ("message", {"delta": "，世界"})]
+    event, done = events[2]
+    assert event == "done"
+    assert done["content"] == "你好，世界"
+    assert done["metadata"]["user_id"] == "u1"
+    assert engine.calls[0][:2] == ("hi", "u1")
+
+
+def test_invalid_chat_request_returns_fastapi_error_list():
+    """请求体校验失败时返回 FastAPI 默认的 422 结构 {"detail": [{loc, msg, type}]}"""
+    client = TestClient(app)
+    for body in (b'{"message": 3}', b"not json"):
+        response = client.post("/api/chat", content=body, headers={"content-type": "application/json"})
+
+        assert response.status_code == 422
+        detail = response.json()["detail"]
+        assert isinstance(detail, list) and detail
+        assert {"loc", "msg", "type"} <= set(detail[0])
+        assert detail[0]["loc"][0] == "body"
+
+    wrong_type = client.post("/api/chat", json={"message": 3}).json()["detail"][0]
+    assert wrong_type["loc"] == ["body", "message"]
+    assert wrong_type["type"] == "string_type"
+
+    missing = client.post("/api/chat", json={"user_id": "u1"}).json()["detail"][0]
+    assert missing["loc"] == ["body", "message"]
+    assert missing["type"] == "missing"
+
+
+if __name__ == "__main__":
+    test_cors_preflight_short_circuits()
+    test_cors_simple_request_adds_allow_origin()
+    test_cors_plain_options_is_not_preflight()
+    test_body_limit_rejects_oversized_content_length()
+    test_body_limit_rejects_oversized_chunked_body()
+    test_body_limit_passes_body_within_limit()
+    test_chat_stream_emits_deltas_then_done()
+    test_invalid_chat_request_returns_fastapi_error_list()
+    print("Web 服务测试通过")
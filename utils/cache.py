@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缓存工具模块
+
+提供线程安全的带过期时间（TTL）的 LRU 缓存，用于对重复请求去重。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """线程安全的 TTL + LRU 缓存。
+
+    条目在写入 ``ttl`` 秒后过期；超过 ``maxsize`` 时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 300.0):
+        """初始化缓存。
+
+        Args:
+            maxsize: 最大条目数
+            ttl: 条目存活时间（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # 键 -> (过期时间, 值)，按最近使用顺序排列
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """读取缓存，未命中或已过期时返回默认值。
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值
+
+        Returns:
+            缓存的值或默认值
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """写入缓存。
+
+        Args:
+            key: 缓存键
+            value: 缓存的值
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """清空缓存。"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动期输入捕获模块
+
+应用初始化（加载记忆系统、建立连接）期间用户已经开始输入，
+阻塞式 input() 尚未调用，这些按键会被终端回显打乱或丢失。
+该模块在 main() 开始时把终端切换为 cbreak 模式，由后台线程通过
+selectors 读取 stdin 到缓冲区；首次提示输入时取出缓冲内容并恢复终端设置。
+仅在 POSIX 终端上启用，其他环境下所有函数均为空操作。
+"""
+
+import atexit
+import os
+import selectors
+import sys
+import threading
+from typing import List, Optional, Tuple
+
+try:
+    import termios
+    import tty
+except ImportError:  # 非 POSIX 平台
+    termios = None
+    tty = None
+
+_buffer = bytearray()              # 捕获到的原始输入
+_stop = threading.Event()          # 通知读取线程退出
+_reader: Optional[threading.Thread] = None
+_saved_attrs: Optional[list] = None  # 捕获前的终端属性
+_lock = threading.Lock()
+_pending_lines: List[str] = []     # 已取出但尚未消费的完整输入行
+_pending_partial = ""              # 最后一段未按回车的输入
+_drained = False
+
+
+def _read_loop(fd: int):
+    """后台读取 stdin，直到收到停止信号或输入结束。"""
+    with selectors.DefaultSelector() as selector:
+        selector.register(fd, selectors.EVENT_READ)
+        while not _stop.is_set():
+            if not selector.select(timeout=0.05):
+                continue
+            try:
+                data = os.read(fd, 1024)
+            except OSError:
+                break
+            if not data:
+                break
+            with _lock:
+                _buffer.extend(data)
+
+
+def _restore_terminal():
+    """恢复捕获前的终端属性。"""
+    global _saved_attrs
+    if _saved_attrs is not None and termios is not None:
+        try:
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, _saved_attrs)
+        except (termios.error, OSError, ValueError):
+            pass
+        _saved_attrs = None
+
+
+def start_capturing_early_input() -> bool:
+    """开始捕获启动期输入，应在 main() 最开始调用。
+
+    Returns:
+        bool: 是否已开始捕获（stdin 不是终端或平台不支持时返回 False）
+    """
+    global _reader, _saved_attrs
+    if _reader is not None or termios is None:
+        return False
+    try:
+        if not sys.stdin.isatty():
+            return False
+        fd = sys.stdin.fileno()
+        _saved_attrs = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+    except (termios.error, OSError, ValueError):
+        _saved_attrs = None
+        return False
+    # 异常退出时也要恢复终端，否则 shell 会停留在 cbreak 模式
+    atexit.register(_restore_terminal)
+    _reader = threading.Thread(target=_read_loop, args=(fd,), name="early-input", daemon=True)
+    _reader.start()
+    return True
+
+
+def drain_early_input() -> str:
+    """停止捕获、恢复终端并返回启动期间输入的文本（退格已生效）。
+
+    只有第一次调用会返回内容，之后返回空字符串。
+
+    Returns:
+        str: 捕获到的输入文本
+    """
+    global _drained
+    if _drained or _reader is None:
+        return ""
+    _drained = True
+    _stop.set()
+    _reader.join()
+    _restore_terminal()
+    with _lock:
+        raw = bytes(_buffer)
+        _buffer.clear()
+
+    # cbreak 模式下终端不处理退格，这里按字符回放
+    chars: List[str] = []
+    for char in raw.decode("utf-8", errors="replace").replace("\r", "\n"):
+        if char in ("\x7f", "\b"):
+            if chars and chars[-1] != "\n":
+                chars.pop()
+        else:
+            chars.append(char)
+    return "".join(chars)
+
+
+def pop_early_input() -> Tuple[str, bool]:
+    """取出一段启动期输入，供下一次提示使用。
+
+    Returns:
+        Tuple[str, bool]: (文本, 是否为已按回车的完整行)；没有待处理输入时返回 ("", False)
+    """
+    global _pending_partial
+    text = drain_early_input()
+    if text:
+        *lines, partial = text.split("\n")
+        _pending_lines.extend(lines)
+        _pending_partial = partial
+    if _pending_lines:
+        return _pending_lines.pop(0), True
+    partial, _pending_partial = _pending_partial, ""
+    return partial, False
@@ -8,18 +8,36 @@
 2. 系统横幅打印
 3. 信号处理器设置
 4. 用户输入处理
+5. 等待提示动画
+6. 记忆条目格式化
 """
 
 # 导入必要的模块
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 import signal
-from typing import Any, Optional
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Iterator, Optional, Tuple
+
+from utils.early_input import pop_early_input
+
+# 记忆条目类型 -> 取文本的函数；未列出的类型统一按 str() 处理
+_MEMORY_FORMATTERS = {
+    dict: lambda mem: mem.get('content', ''),
+    str: lambda mem: mem,
+}
 
 def setup_logging(level: int = logging.INFO) -> logging.Logger:
     """设置日志配置
     
     配置应用程序的日志记录，包括日志级别、格式和输出位置。
+    日志记录经队列交给后台监听线程写入控制台和文件，调用方不会阻塞在磁盘 I/O 上。
     
     Args:
         level: 日志级别，默认值为logging.INFO
@@ -27,13 +45,25 @@ def setup_logging(level: int = logging.INFO) -> logging.Logger:
     Returns:
         logging.Logger: 配置好的日志记录器实例
     """
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')  # 日志格式
+    handlers = [
+        logging.StreamHandler(sys.stdout),  # 输出到标准输出
+        logging.FileHandler('mem0_chat.log', encoding='utf-8')  # 输出到日志文件
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    # 根日志器只挂队列处理器，实际输出由监听线程完成
+    log_queue: queue.Queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # 退出时写完队列中剩余的日志
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # 入队时只合并消息参数，时间、级别等前缀由下游处理器的格式统一添加
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
     logging.basicConfig(
         level=level,                         # 设置日志级别
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # 日志格式
-        handlers=[
-            logging.StreamHandler(sys.stdout),  # 输出到标准输出
-            logging.FileHandler('mem0_chat.log', encoding='utf-8')  # 输出到日志文件
-        ]
+        handlers=[queue_handler]
     )
     return logging.getLogger(__name__)  # 返回当前模块的日志记录器
 
@@ -83,10 +113,41 @@ def setup_signal_handlers():
     
     signal.signal(signal.SIGINT, signal_handler)  # 设置SIGINT信号处理器
 
+def _input_with_prefill(prompt: str, text: str) -> str:
+    """调用 input()，并把 text 作为已输入的内容
+    
+    有 readline 时预填到可编辑的输入行中，否则回显后拼接到本次输入之前。
+    
+    Args:
+        prompt: 输入提示字符串
+        text: 预填文本
+        
+    Returns:
+        str: 完整的输入内容
+    """
+    if not text:
+        return input(prompt)
+    try:
+        import readline
+    except ImportError:
+        print(f"{prompt}{text}", end="", flush=True)
+        return text + input()
+    
+    def insert_text():
+        readline.insert_text(text)
+        readline.redisplay()
+    
+    readline.set_pre_input_hook(insert_text)
+    try:
+        return input(prompt)
+    finally:
+        readline.set_pre_input_hook()
+
 def handle_user_input(prompt: str) -> Optional[str]:
     """处理用户输入，支持中文和Ctrl+C
     
     安全地获取用户输入，处理各种可能的异常情况。
+    启动期间已捕获的输入会先被使用：完整的行直接作为本次输入，未完成的部分预填到输入框。
     
     Args:
         prompt: 输入提示字符串
@@ -95,7 +156,12 @@ def handle_user_input(prompt: str) -> Optional[str]:
         Optional[str]: 用户输入的内容，如果发生错误则返回None
     """
     try:
-        user_input = input(prompt).strip()  # 获取用户输入并去除首尾空白
+        early_text, complete = pop_early_input()
+        if complete:
+            # 启动期间已按回车的输入：回显后直接使用
+            print(f"{prompt}{early_text}")
+            return early_text.strip()
+        user_input = _input_with_prefill(prompt, early_text).strip()  # 获取用户输入并去除首尾空白
         return user_input
     except (KeyboardInterrupt, EOFError):
         # 处理Ctrl+C和文件结束符
@@ -108,4 +174,78 @@ def handle_user_input(prompt: str) -> Optional[str]:
     except Exception as e:
         # 处理其他未知错误
         logging.error(f"输入处理错误: {e}")
-        return None
\ No newline at end of file
+        return None
+
+_SPINNER_FRAMES = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+
+@lru_cache(maxsize=16)
+def _spinner_sequences(message: str) -> Tuple[Tuple[bytes, ...], bytes]:
+    """预编码提示的各动画帧与清除提示行的控制序列（宽字符按 2 列估算）
+    
+    Args:
+        message: 提示文本
+        
+    Returns:
+        Tuple[Tuple[bytes, ...], bytes]: (各动画帧, 清除序列)，均为 UTF-8 字节
+    """
+    frames = tuple(f"\r{frame} {message}".encode("utf-8") for frame in _SPINNER_FRAMES)
+    clear_line = ("\r" + " " * (len(message) * 2 + 4) + "\r").encode("utf-8")
+    return frames, clear_line
+
+@contextmanager
+def spinner(message: str, interval: float = 0.1) -> Iterator[None]:
+    """在等待耗时操作时显示旋转提示，退出时清除提示行
+    
+    动画在后台线程中刷新，不阻塞被包裹的操作；输出不是终端时只打印一次静态提示。
+    终端上的动画帧与清除序列预先编码，直接写入 stdout 文件描述符。
+    
+    Args:
+        message: 提示文本
+        interval: 动画刷新间隔（秒）
+    """
+    frames, clear_line = _spinner_sequences(message)
+    stop = threading.Event()
+    fd: Optional[int] = None
+    if sys.stdout.isatty():
+        try:
+            fd = sys.stdout.fileno()
+        except (AttributeError, OSError, ValueError):
+            fd = None
+    
+    def spin():
+        """后台刷新动画帧，直到收到停止信号"""
+        index = 0
+        while not stop.is_set():
+            os.write(fd, frames[index % len(frames)])
+            index += 1
+            stop.wait(interval)
+    
+    worker: Optional[threading.Thread] = None
+    if fd is not None:
+        # 先写出 print 缓冲中的内容，保证与直接写描述符的输出顺序一致
+        sys.stdout.flush()
+        worker = threading.Thread(target=spin, name="spinner", daemon=True)
+        worker.start()
+    else:
+        print(message, end="", flush=True)
+    try:
+        yield
+    finally:
+        stop.set()
+        # 清除提示行
+        if worker is not None:
+            worker.join()
+            os.write(fd, clear_line)
+        else:
+            print(clear_line.decode("utf-8"), end="", flush=True)
+
+def format_memory(mem: Any) -> str:
+    """将一条记忆（字典、字符串或其他对象）转换为展示文本
+    
+    Args:
+        mem: 记忆条目
+        
+    Returns:
+        str: 字典取 content 字段，字符串原样返回，其他类型取 str()
+    """
+    return _MEMORY_FORMATTERS.get(type(mem), str)(mem)
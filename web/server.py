@@ -6,25 +6,52 @@ FastAPI Web 服务：提供响应式多代理控制台与 REST API。
 该模块实现了：
 1. FastAPI Web服务器的配置和初始化
 2. 响应式前端页面的渲染
-3. 聊天API端点的实现
+3. 聊天API端点的实现（含 Server-Sent Events 流式接口）
 4. 多代理系统的集成
-5. CORS中间件配置
+5. CORS与请求体大小限制中间件配置
 6. 静态文件服务
 """
 
+# 导入异步支持模块
+import asyncio
+# 导入JSON模块（未安装 orjson 时编码流式事件）
+import json
+# 导入日志模块
+import logging
+# 导入哈希模块（静态资源版本号）
+import hashlib
+# 导入操作系统模块（读取 DEV 环境变量）
+import os
+# 导入异步上下文管理器
+from contextlib import asynccontextmanager
 # 导入路径处理模块
 from pathlib import Path
 # 导入类型提示
-from typing import Optional, List, Dict
+from typing import Any, AsyncIterator, Dict, Generator, List, Optional, Tuple
+
+# 导入ASGI类型定义
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 # 导入FastAPI相关模块
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+# 导入Jinja2模板字节码缓存
+from jinja2 import FileSystemBytecodeCache
+try:
+    # orjson 为可选依赖，安装后 API 响应与流式事件以 C 实现序列化
+    import orjson
+    from fastapi.responses import ORJSONResponse as _DefaultResponse
+    _json_bytes = orjson.dumps
+except ImportError:  # 未安装 orjson 时使用标准库
+    _DefaultResponse = JSONResponse
+
+    def _json_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 # 导入Pydantic用于数据验证
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 # 导入配置模块
 from config.settings import Config
@@ -35,6 +62,8 @@ from core.chat_engine import ChatEngine
 # 导入多代理控制器
 from core.agent_controller import MultiAgentController
 
+logger = logging.getLogger(__name__)
+
 # 定义基础目录
 BASE_DIR = Path(__file__).resolve().parent
 # 定义静态文件目录
@@ -42,6 +71,112 @@ STATIC_DIR = BASE_DIR / "static"
 # 定义模板文件目录
 TEMPLATE_DIR = BASE_DIR / "templates"
 
+# CORS 响应头：导入时预先编码，请求路径上不再做字符串编码
+_CORS_ALLOW_ORIGIN = (b"access-control-allow-origin", b"*")
+_CORS_PREFLIGHT_HEADERS = [
+    _CORS_ALLOW_ORIGIN,
+    (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+    (b"access-control-max-age", b"600"),
+    (b"vary", b"Origin"),
+    (b"content-length", b"0"),
+]
+
+
+class PureCORSMiddleware:
+    """纯 ASGI 实现的 CORS 中间件（允许所有来源、方法与请求头）。
+    
+    直接处理 ASGI 消息：在 http.response.start 消息中追加响应头，
+    预检请求直接返回 204，不为每个请求构造 Request/Response 对象。
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # 非 HTTP 请求（lifespan、websocket）直接透传
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        if scope["method"] == "OPTIONS":
+            request_headers = dict(scope["headers"])
+            if b"access-control-request-method" in request_headers:
+                # 预检请求：允许的请求头原样回显请求中声明的请求头
+                headers = list(_CORS_PREFLIGHT_HEADERS)
+                requested_headers = request_headers.get(b"access-control-request-headers")
+                if requested_headers:
+                    headers.append((b"access-control-allow-headers", requested_headers))
+                await send({"type": "http.response.start", "status": 204, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+        
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append(_CORS_ALLOW_ORIGIN)
+            await send(message)
+        
+        await self.app(scope, receive, send_wrapper)
+
+
+# 请求体超限时的响应
+_PAYLOAD_TOO_LARGE_HEADERS = [(b"content-type", b"text/plain; charset=utf-8")]
+_PAYLOAD_TOO_LARGE_BODY = b"payload too large"
+
+
+class BodySizeLimitMiddleware:
+    """纯 ASGI 实现的请求体大小限制。
+    
+    Content-Length 超过上限时直接返回 413，不读取请求体；未声明长度（分块传输）时
+    在读取过程中累计字节数，超限后返回 413 并通知应用连接已断开。
+    """
+    
+    def __init__(self, app: ASGIApp, max_bytes: int = 1 << 20):
+        self.app = app
+        self.max_bytes = max_bytes
+    
+    async def _reject(self, send: Send):
+        await send({"type": "http.response.start", "status": 413, "headers": _PAYLOAD_TOO_LARGE_HEADERS})
+        await send({"type": "http.response.body", "body": _PAYLOAD_TOO_LARGE_BODY})
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_bytes:
+                    await self._reject(send)
+                    return
+                break
+        
+        received = 0
+        rejected = False
+        
+        async def receive_wrapper() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    rejected = True
+                    await self._reject(send)
+                    return {"type": "http.disconnect"}
+            return message
+        
+        async def send_wrapper(message: Message):
+            # 已经返回 413 时丢弃应用后续的输出
+            if not rejected:
+                await send(message)
+        
+        await self.app(scope, receive_wrapper, send_wrapper)
+
 
 class ChatRequest(BaseModel):
     """聊天请求数据模型。
@@ -55,6 +190,39 @@ class ChatRequest(BaseModel):
     target_agent: Optional[str] = None   # 允许用户直接指定与特定专家大脑交互
 
 
+def _request_errors(exc: ValidationError) -> List[Dict[str, Any]]:
+    """把 pydantic 校验错误转换为 FastAPI 校验错误列表，loc 与其默认格式一致以 body 开头。"""
+    return [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+
+
+# 请求体手动解析后 FastAPI 无法推断其结构，在 OpenAPI 文档中显式声明
+_CHAT_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": ChatRequest.model_json_schema()}},
+    }
+}
+
+
+async def parse_chat_request(request: Request):
+    """依赖项：读取聊天请求体，由 pydantic-core 一次完成 JSON 解析与校验，跳过 FastAPI 的逐字段校验流程。
+    
+    Args:
+        request: FastAPI请求对象
+        
+    Returns:
+        ChatRequest: 解析后的请求对象
+        
+    Raises:
+        RequestValidationError: 请求体不是合法的聊天请求 JSON 时抛出，由 FastAPI 返回 422
+    """
+    body = await request.body()
+    try:
+        return ChatRequest.model_validate_json(body)
+    except ValidationError as exc:
+        raise RequestValidationError(_request_errors(exc), body=body) from exc
+
+
 class ChatResponsePayload(BaseModel):
     """聊天响应数据模型。
     
@@ -66,69 +234,173 @@ class ChatResponsePayload(BaseModel):
     metadata: Dict[str, Optional[str]]        # 元数据信息
 
 
-# 初始化记忆管理器
-memory_manager = MemoryManager()
-# 初始化聊天引擎
-chat_engine = ChatEngine(memory_manager)
-# 根据配置初始化多代理控制器（如果启用）
-multi_agent_controller = (
-    MultiAgentController(chat_engine) if Config.ENABLE_MULTI_AGENT else None
-)
+
+# 分离项目大脑和专家大脑：智能体配置是静态的，导入时计算一次
+_PROJECT_BRAIN = {agent_id: profile for agent_id, profile in Config.AGENT_PROFILES.items()
+                  if profile.type == 'orchestrator'}
+_SPECIALIST_AGENTS = {agent_id: profile for agent_id, profile in Config.AGENT_PROFILES.items()
+                      if profile.type == 'specialist'}
+# 元数据中布尔值的字符串形式，按 bool 下标取值
+_BOOL_STR = ("false", "true")
+
+
+def _static_version(path: Path) -> str:
+    """静态文件内容摘要，作为资源 URL 的版本号；文件内容变化时 URL 随之变化。"""
+    return hashlib.blake2b(path.read_bytes(), digest_size=6).hexdigest()
+
+
+# 静态资源文件名 -> 带版本号的 URL，导入时计算一次
+_STATIC_URLS: Dict[str, str] = {
+    path.relative_to(STATIC_DIR).as_posix(): f"/static/{path.relative_to(STATIC_DIR).as_posix()}?v={_static_version(path)}"
+    for path in (STATIC_DIR.rglob("*") if STATIC_DIR.exists() else ())
+    if path.is_file()
+}
+
+
+def static_url(name: str) -> str:
+    """模板中引用静态资源的 URL：存在的文件附带内容版本号，可被浏览器长期缓存。"""
+    return _STATIC_URLS.get(name, f"/static/{name}")
+
+
+# 带版本号的静态资源响应：URL 随内容变化，浏览器可永久缓存；未带版本号时每次向服务器确认
+_STATIC_IMMUTABLE = "public, max-age=31536000, immutable"
+_STATIC_REVALIDATE = "no-cache"
+
+
+class CachingStaticFiles(StaticFiles):
+    """为静态资源响应追加 Cache-Control 头的 StaticFiles。
+    
+    带 ``?v=`` 版本号的请求标记为 immutable，重复访问页面时浏览器直接使用本地缓存、
+    不再发出请求；其余请求仍由 StaticFiles 按 ETag / Last-Modified 返回 304。
+    """
+    
+    async def get_response(self, path: str, scope: Scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            versioned = b"v=" in scope.get("query_string", b"")
+            response.headers["cache-control"] = _STATIC_IMMUTABLE if versioned else _STATIC_REVALIDATE
+        return response
+
+
+# 智能体ID -> 展示名称，构建专家列表时直接查表
+_AGENT_NAMES = {agent_id: profile.name for agent_id, profile in Config.AGENT_PROFILES.items()}
+# 首页模板中与请求无关的变量
+_INDEX_CONTEXT_BASE = {
+    "default_user": Config.DEFAULT_USER_ID,  # 默认用户ID
+    "default_session": Config.DEFAULT_SESSION_ID,  # 默认会话ID
+    "agents": Config.AGENT_PROFILES,  # 所有智能体配置
+    "project_brain": _PROJECT_BRAIN,   # 项目大脑配置
+    "specialist_agents": _SPECIALIST_AGENTS,  # 专家智能体配置
+    "multi_agent": Config.ENABLE_MULTI_AGENT,  # 是否启用多代理
+    "static_url": static_url,  # 静态资源 URL（带版本号）
+}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """应用生命周期：每个工作进程启动时构建并预热引擎，退出时等待后台记忆写入完成。
+    
+    构建与预热都在线程中执行，不阻塞事件循环。
+    
+    Args:
+        app: FastAPI应用实例，引擎挂在 app.state 上
+    """
+    # 初始化记忆管理器
+    memory_manager = await asyncio.to_thread(MemoryManager)
+    # 初始化聊天引擎
+    chat_engine = await asyncio.to_thread(ChatEngine, memory_manager)
+    app.state.memory_manager = memory_manager
+    app.state.chat_engine = chat_engine
+    # 根据配置初始化多代理控制器（如果启用）
+    app.state.multi_agent_controller = (
+        MultiAgentController(chat_engine) if Config.ENABLE_MULTI_AGENT else None
+    )
+    try:
+        # 预热：提前完成 mem0 实例的延迟初始化，首个请求不再承担该开销
+        await asyncio.to_thread(lambda: memory_manager.memory)
+    except Exception as exc:  # noqa: BLE001
+        # 记忆后端暂不可用时照常启动，首次使用时会再次尝试初始化
+        logger.warning("记忆系统预热失败: %s", exc)
+    yield
+    # 等待后台记忆写入完成并释放线程池
+    await asyncio.to_thread(chat_engine.shutdown)
+
+
+async def get_chat_engine(request: Request) -> ChatEngine:
+    """依赖项：当前工作进程共享的聊天引擎（async 依赖不经过线程池调度）。"""
+    return request.app.state.chat_engine
+
+
+async def get_multi_agent_controller(request: Request) -> Optional[MultiAgentController]:
+    """依赖项：当前工作进程共享的多代理控制器，未启用多代理时为 None。"""
+    return request.app.state.multi_agent_controller
+
 
 # 创建FastAPI应用实例
 app = FastAPI(
     title="mem0 Project Brain Web",        # API标题
     description="多代理项目大脑控制台",    # API描述
     version="0.2.0",                       # API版本
+    lifespan=lifespan,                     # 引擎随工作进程启动与关闭
+    default_response_class=_DefaultResponse,  # 返回字典的端点默认经 orjson 序列化（已安装时）
 )
 
-# 添加CORS中间件，允许跨域请求
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # 允许所有来源
-    allow_headers=["*"],  # 允许所有头
-    allow_methods=["*"],  # 允许所有方法
-)
+# 限制请求体大小，避免超大请求占满内存、阻塞事件循环
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=Config.WEB_MAX_BODY_BYTES)
+# 添加CORS中间件，允许跨域请求（允许所有来源、方法和请求头）；最后添加的在最外层，413 响应同样带 CORS 头
+app.add_middleware(PureCORSMiddleware)
 
 # 挂载静态文件目录（如果存在）
 if STATIC_DIR.exists():
-    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+    app.mount("/static", CachingStaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
 
 # 初始化Jinja2模板引擎
 templates = Jinja2Templates(directory=TEMPLATE_DIR)
+# 模板字节码缓存：编译结果写入磁盘，重启后首次渲染不再重新编译
+_template_cache_config = Config.WEB_TEMPLATE_CACHE
+if _template_cache_config.get("bytecode_cache", False):
+    try:
+        template_cache_dir = BASE_DIR / _template_cache_config.get("directory", ".jinja_cache")
+        template_cache_dir.mkdir(parents=True, exist_ok=True)
+        templates.env.bytecode_cache = FileSystemBytecodeCache(
+            directory=str(template_cache_dir), pattern="%s.cache"
+        )
+    except OSError:
+        # 缓存目录不可写时按默认方式编译模板
+        pass
+# 设置环境变量 DEV 时（热重载开发模式）始终检测模板文件变更
+templates.env.auto_reload = bool(os.getenv("DEV")) or _template_cache_config.get("auto_reload", False)
+
+
+# 首页渲染结果：模板变量全部来自静态配置且模板不使用 request，渲染一次后复用
+_index_html: Optional[bytes] = None
+
+
+def _render_index() -> bytes:
+    """渲染首页模板为 UTF-8 字节。"""
+    return templates.get_template("index.html").render(_INDEX_CONTEXT_BASE).encode("utf-8")
 
 
 @app.get("/", response_class=HTMLResponse)
-async def index(request: Request):
+async def index():
     """渲染响应式页面。
     
-    渲染前端页面，传递配置参数和智能体信息。
+    渲染前端页面，传递配置参数和智能体信息。首次请求时渲染并缓存结果；
+    开启模板 auto_reload 时每次重新渲染，以便开发时看到模板修改。
     
-    Args:
-        request: FastAPI请求对象
-        
     Returns:
         HTMLResponse: 渲染后的前端页面
     """
-    # 分离项目大脑和专家大脑
-    project_brain = {agent_id: profile for agent_id, profile in Config.AGENT_PROFILES.items() 
-                    if profile.get('type') == 'orchestrator'}
-    specialist_agents = {agent_id: profile for agent_id, profile in Config.AGENT_PROFILES.items() 
-                        if profile.get('type') == 'specialist'}
-    
-    # 渲染模板并返回响应
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,               # 请求对象
-            "default_user": Config.DEFAULT_USER_ID,  # 默认用户ID
-            "default_session": Config.DEFAULT_SESSION_ID,  # 默认会话ID
-            "agents": Config.AGENT_PROFILES,  # 所有智能体配置
-            "project_brain": project_brain,   # 项目大脑配置
-            "specialist_agents": specialist_agents,  # 专家智能体配置
-            "multi_agent": Config.ENABLE_MULTI_AGENT,  # 是否启用多代理
-        },
-    )
+    global _index_html
+    html = _index_html
+    if html is None:
+        html = _render_index()
+        if not templates.env.auto_reload:
+            _index_html = html
+    return HTMLResponse(html)
+
+
+# 健康检查响应体固定不变，导入时序列化一次
+_HEALTH_BODY = b'{"status":"ok"}'
 
 
 @app.get("/health")
@@ -138,96 +410,258 @@ async def health():
     用于检查服务是否正常运行。
     
     Returns:
-        dict: 包含服务状态的字典
+        Response: 预先序列化的服务状态 JSON
     """
-    return {"status": "ok"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 
-@app.post("/api/chat", response_model=ChatResponsePayload)
-async def chat_endpoint(payload: ChatRequest):
-    """统一 API，返回结构化结果供前端动态展示。
-    
-    处理前端的聊天请求，调用相应的服务生成响应，并返回结构化结果。
+def _resolve_request(payload: ChatRequest) -> Tuple[str, str, str, str, Optional[str]]:
+    """校验聊天请求并补全默认值。
     
     Args:
         payload: ChatRequest对象，包含聊天请求数据
         
     Returns:
-        ChatResponsePayload: 结构化的聊天响应数据
+        Tuple: (消息, 用户ID, 会话ID, 智能体ID, 目标专家ID)
         
     Raises:
-        HTTPException: 当请求参数无效或处理过程中出错时
+        HTTPException: 当消息为空时
     """
-    # 去除消息前后的空格
-    message = payload.message.strip()
-    # 验证消息是否为空
-    if not message:
+    # 验证消息是否为空（含只有空白字符的情况）
+    message = payload.message
+    if not message or message.isspace():
         raise HTTPException(status_code=400, detail="消息不能为空")
+    # 去除消息前后的空格；首尾本来没有空白时（常见情况）跳过
+    if message[0].isspace() or message[-1].isspace():
+        message = message.strip()
     
     # 设置默认值
     user_id = payload.user_id or Config.DEFAULT_USER_ID
     session_id = payload.session_id or Config.DEFAULT_SESSION_ID
     agent_id = payload.agent_id or Config.DEFAULT_AGENT_ID
     target_agent = payload.target_agent  # 用户直接指定的专家大脑
+    return message, user_id, session_id, agent_id, target_agent
+
+
+def _build_specialists(ma_result) -> List[Dict[str, str]]:
+    """由多代理结果构建专家列表。"""
+    return [
+        {
+            "agent_id": specialist.agent_id,
+            "agent_name": _AGENT_NAMES.get(specialist.agent_id, specialist.agent_id),
+            "content": specialist.content,
+        }
+        for specialist in ma_result.specialist_outputs
+    ]
+
+
+def _build_payload(
+    response,
+    project_summary: Optional[str],
+    specialists: List[Dict[str, str]],
+    target_agent: Optional[str]
+) -> Dict[str, Any]:
+    """构建结构化响应（结构见 ChatResponsePayload）。"""
+    collaborators = response.collaborators
+    return {
+        "content": response.content,
+        "project_summary": project_summary,
+        "specialists": specialists,
+        "metadata": {
+            "user_id": response.user_id,
+            "agent_id": response.agent_id,
+            "session_id": response.session_id,
+            "memories_count": str(response.memories_count),
+            "memory_used": _BOOL_STR[bool(response.memory_used)],
+            "collaborators": ", ".join(collaborators) if collaborators else "",
+            "target_agent": target_agent or "",
+            # ChatResponse 目前没有 expert_domain 字段，保留兼容读取
+            "expert_domain": getattr(response, "expert_domain", None) or "",
+        }
+    }
+
+
+# 响应由内部数据直接构建，不经过 response_model 校验；模型只用于生成 OpenAPI 文档
+@app.post(
+    "/api/chat",
+    response_class=_DefaultResponse,
+    responses={200: {"model": ChatResponsePayload}},
+    openapi_extra=_CHAT_REQUEST_OPENAPI
+)
+async def chat_endpoint(
+    payload: ChatRequest = Depends(parse_chat_request),
+    chat_engine: ChatEngine = Depends(get_chat_engine),
+    multi_agent_controller: Optional[MultiAgentController] = Depends(get_multi_agent_controller)
+):
+    """统一 API，返回结构化结果供前端动态展示。
+    
+    处理前端的聊天请求，调用相应的服务生成响应，并返回结构化结果。
+    
+    Args:
+        payload: ChatRequest对象，包含聊天请求数据
+        chat_engine: 聊天引擎（依赖注入）
+        multi_agent_controller: 多代理控制器（依赖注入）
+        
+    Returns:
+        Response: 结构化的聊天响应数据（JSON），结构见 ChatResponsePayload
+        
+    Raises:
+        HTTPException: 当请求参数无效或处理过程中出错时
+    """
+    message, user_id, session_id, agent_id, target_agent = _resolve_request(payload)
     
     try:
-        # 初始化变量
-        project_summary = None
-        specialists: List[Dict[str, str]] = []
-        
-        # 如果启用了多代理功能且多代理控制器已初始化
-        if Config.ENABLE_MULTI_AGENT and multi_agent_controller:
-            # 如果用户指定了目标专家，直接与该专家交互；否则使用项目大脑的多代理流程
-            ma_result = multi_agent_controller.process_user_message(
-                message,
-                user_id,
-                session_id,
-                target_agent=target_agent
-            )
-            response = ma_result.final_response
-            project_summary = ma_result.project_summary
-            # 构建专家列表
-            specialists = [
-                {
-                    "agent_id": specialist.agent_id,
-                    "agent_name": Config.AGENT_PROFILES.get(
-                        specialist.agent_id, {}
-                    ).get("name", specialist.agent_id),
-                    "content": specialist.content,
-                }
-                for specialist in ma_result.specialist_outputs
-            ]
-        else:
-            # 使用单代理模式生成响应
-            response = chat_engine.generate_response(
-                message,
-                user_id=user_id,
-                agent_id=agent_id,
-                session_id=session_id
-            )
-        
-        # 返回结构化响应
-        return ChatResponsePayload(
-            content=response.content,
-            project_summary=project_summary,
-            specialists=specialists,
-            metadata={
-                "user_id": response.user_id,
-                "agent_id": response.agent_id,
-                "session_id": response.session_id,
-                "memories_count": str(response.memories_count),
-                "memory_used": "true" if response.memory_used else "false",
-                "collaborators": ", ".join(response.collaborators) if response.collaborators else "",
-                "target_agent": target_agent or "",
-                "expert_domain": response.expert_domain or "" if hasattr(response, 'expert_domain') else "",
-            }
+        body = await _run_chat(
+            chat_engine, multi_agent_controller, message, user_id, session_id, agent_id, target_agent
         )
-    except HTTPException:
-        # 重新抛出HTTP异常
-        raise
     except Exception as exc:  # noqa: BLE001
         # 捕获其他异常并返回500错误
         raise HTTPException(status_code=500, detail=str(exc)) from exc
+    
+    # 返回结构化响应（已序列化的 JSON 字节）
+    return Response(content=body, media_type="application/json")
+
+
+async def _run_chat(
+    chat_engine: ChatEngine,
+    multi_agent_controller: Optional[MultiAgentController],
+    message: str,
+    user_id: str,
+    session_id: str,
+    agent_id: str,
+    target_agent: Optional[str]
+) -> bytes:
+    """执行一次聊天请求。
+    
+    Returns:
+        bytes: 序列化后的结构化响应
+    """
+    # 初始化变量
+    project_summary = None
+    specialists: List[Dict[str, str]] = []
+    
+    # 如果启用了多代理功能且多代理控制器已初始化
+    if Config.ENABLE_MULTI_AGENT and multi_agent_controller:
+        # 如果用户指定了目标专家，直接与该专家交互；否则使用项目大脑的多代理流程
+        # 引擎调用是同步阻塞的，放到线程中执行，等待 LLM 期间事件循环可处理其他请求
+        ma_result = await asyncio.to_thread(
+            multi_agent_controller.process_user_message,
+            message,
+            user_id,
+            session_id,
+            target_agent=target_agent
+        )
+        response = ma_result.final_response
+        project_summary = ma_result.project_summary
+        # 构建专家列表
+        specialists = _build_specialists(ma_result)
+    else:
+        # 使用单代理模式生成响应
+        response = await asyncio.to_thread(
+            chat_engine.generate_response,
+            message,
+            user_id=user_id,
+            agent_id=agent_id,
+            session_id=session_id
+        )
+    
+    response_payload = _build_payload(response, project_summary, specialists, target_agent)
+    # 文本量大时序列化本身会占用可观的 CPU，放到线程中执行，避免拖慢同一事件循环上的其他请求
+    text_size = len(response.content) + len(project_summary or "") + sum(
+        len(specialist["content"]) for specialist in specialists
+    )
+    if text_size > Config.WEB_SERIALIZE_OFFLOAD_CHARS:
+        body = await asyncio.to_thread(_json_bytes, response_payload)
+    else:
+        body = _json_bytes(response_payload)
+    return body
+
+
+# 流结束标记：生成器耗尽时与其返回值一起交回事件循环
+_STREAM_DONE = object()
+# 流式响应头：禁止缓存与反向代理缓冲，片段到达即发送
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _next_chunk(stream: Generator[str, None, Any]) -> Tuple[Any, Any]:
+    """在工作线程中取下一个片段；StopIteration 不能穿过 Future，这里转换为结束标记。
+    
+    Returns:
+        Tuple: (片段, None) 或 (_STREAM_DONE, 生成器返回值)
+    """
+    try:
+        return next(stream), None
+    except StopIteration as stop:
+        return _STREAM_DONE, stop.value
+
+
+def _sse_event(data: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    """编码一条 Server-Sent Events 事件。"""
+    head = b"event: " + event.encode("utf-8") + b"\n" if event else b""
+    return head + b"data: " + _json_bytes(data) + b"\n\n"
+
+
+@app.post("/api/chat/stream", openapi_extra=_CHAT_REQUEST_OPENAPI)
+async def chat_stream_endpoint(
+    payload: ChatRequest = Depends(parse_chat_request),
+    chat_engine: ChatEngine = Depends(get_chat_engine),
+    multi_agent_controller: Optional[MultiAgentController] = Depends(get_multi_agent_controller)
+):
+    """流式 API：以 Server-Sent Events 逐片段返回回复。
+    
+    每个回复片段以 ``data: {"delta": ...}`` 事件发送；结束时发送一条 ``event: done`` 事件，
+    数据与 ``/api/chat`` 的结构化响应相同。
+    
+    Args:
+        payload: ChatRequest对象，包含聊天请求数据
+        chat_engine: 聊天引擎（依赖注入）
+        multi_agent_controller: 多代理控制器（依赖注入）
+        
+    Returns:
+        StreamingResponse: text/event-stream 响应
+        
+    Raises:
+        HTTPException: 当请求参数无效时
+    """
+    message, user_id, session_id, agent_id, target_agent = _resolve_request(payload)
+    multi_agent = bool(Config.ENABLE_MULTI_AGENT and multi_agent_controller)
+    if multi_agent:
+        # 项目摘要与专家意见照常生成，只有最终回复逐片段产出
+        stream = multi_agent_controller.process_user_message_stream(
+            message, user_id, session_id, target_agent=target_agent
+        )
+    else:
+        stream = chat_engine.generate_response_stream(
+            message, user_id=user_id, agent_id=agent_id, session_id=session_id
+        )
+    
+    async def event_stream():
+        try:
+            while True:
+                # 生成器内部是同步阻塞调用，每个片段都在线程中获取，不阻塞事件循环
+                chunk, result = await asyncio.to_thread(_next_chunk, stream)
+                if chunk is _STREAM_DONE:
+                    break
+                yield _sse_event({"delta": chunk})
+            if multi_agent:
+                done = _build_payload(
+                    result.final_response, result.project_summary, _build_specialists(result), target_agent
+                )
+            else:
+                done = _build_payload(result, None, [], target_agent)
+            yield _sse_event(done, event="done")
+        except Exception as exc:  # noqa: BLE001
+            # 响应头已发送，错误只能以事件形式告知前端
+            yield _sse_event({"detail": str(exc)}, event="error")
+        finally:
+            # 客户端提前断开时关闭生成器，不再继续调用 LLM
+            try:
+                stream.close()
+            except ValueError:
+                # 工作线程仍在取片段（请求被取消），该片段取完后生成器不会再被恢复
+                pass
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=_SSE_HEADERS)
 
 
 def get_app() -> FastAPI:
@@ -248,6 +682,17 @@ if __name__ == "__main__":
     """
     import uvicorn
     
-    # 启动Uvicorn服务器
-    uvicorn.run("web.server:app", host="0.0.0.0", port=8000, reload=True)
-
+    server_config = dict(Config.WEB_SERVER)
+    workers = server_config.pop("workers", None)
+    if os.getenv("DEV"):
+        # 开发模式：单进程 + 文件变更热重载
+        uvicorn.run("web.server:app", host=server_config["host"], port=server_config["port"], reload=True)
+    else:
+        # 生产模式：uvloop 事件循环 + httptools 解析器；默认单进程。
+        # 每个进程各自持有引擎实例和进程内状态，只有在按用户粘性路由时才应通过 WEB_WORKERS 开启多进程
+        uvicorn.run(
+            "web.server:app",
+            workers=int(os.getenv("WEB_WORKERS") or workers or 1),
+            reload=False,
+            **server_config
+        )